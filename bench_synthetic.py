@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+合成コーパスによるベクトルストアのスケーリングベンチマーク
+
+埋め込みモデルを使わず、固定シードで生成した2048次元の合成ベクトルを
+vec0テーブルに直接挿入し、行数を変えながら以下を測定します:
+1. 構築時間（生成・挿入）とDBサイズ
+2. kごとのKNN検索レイテンシ（ベクトル列ごと）
+3. 行数に対するKNN検索レイテンシの変化
+4. ページキャッシュとmmapの効果（OSのキャッシュから追い出した直後と温まった状態の比較）
+
+使用方法:
+    python bench_synthetic.py                                # 1万行・10万行
+    python bench_synthetic.py --rows 10000,100000,1000000    # 100万行まで
+    python bench_synthetic.py --quantization int8 --k 1,10,100
+    python bench_synthetic.py --output synthetic.json       # 結果をJSONで保存
+
+同じシードからは同じベクトルとクエリが生成されるため、結果は再現可能です。
+"""
+
+import os
+import json
+import time
+import shutil
+import tempfile
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+import click
+
+from lib.evaluation import percentile
+from lib.quantization import QUANTIZATION_METHODS
+from lib.projection import PROJECTION_METHODS
+from lib.synthetic import SyntheticCorpus, build_synthetic_database, evict_page_cache
+from lib.vector_utils import SqliteVecDatabase, VEC0_MAX_K
+
+
+def parse_int_list(value: str) -> List[int]:
+    """カンマ区切りの整数リストを解析する"""
+    try:
+        return [int(item) for item in value.split(",") if item.strip()]
+    except ValueError:
+        raise click.BadParameter(f"カンマ区切りの整数を指定してください: {value}")
+
+
+def latency_stats(latencies: List[float]) -> Dict[str, float]:
+    """秒単位のレイテンシをミリ秒のp50/p95/平均に集計する"""
+    values = sorted(latency * 1000 for latency in latencies)
+    return {
+        "mean": sum(values) / len(values) if values else 0.0,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95)
+    }
+
+
+def measure_knn(
+    database: SqliteVecDatabase,
+    queries: List[List[float]],
+    vector_index: str,
+    top_k: int
+) -> Dict[str, float]:
+    """全クエリでKNN検索を実行し、1クエリあたりのレイテンシを集計する"""
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        database.search_vectors(query, top_k=top_k, vector_index=vector_index)
+        latencies.append(time.perf_counter() - start)
+    return latency_stats(latencies)
+
+
+def measure_page_cache(
+    db_path: str,
+    queries: List[List[float]],
+    mmap_sizes: List[int],
+    top_k: int
+) -> List[Dict[str, Any]]:
+    """
+    mmapの大きさごとに、キャッシュを追い出した直後の初回検索と温まった状態の検索を比較する
+    
+    初回検索ではDB全体を読み込むため、ディスクからの読み込み速度が支配的になる。
+    """
+    results = []
+    for mmap_size in mmap_sizes:
+        evicted = evict_page_cache(db_path)
+        database = SqliteVecDatabase(db_path, pool_size=1, mmap_size=mmap_size)
+        try:
+            start = time.perf_counter()
+            database.search_vectors(queries[0], top_k=top_k, vector_index="float")
+            first = time.perf_counter() - start
+            warm = measure_knn(database, queries, "float", top_k)
+        finally:
+            database.close()
+        
+        results.append({
+            "mmap_bytes": mmap_size,
+            "evicted": evicted,
+            "first_query_ms": first * 1000,
+            "warm_ms": warm
+        })
+    return results
+
+
+def run_rows(
+    db_path: str,
+    corpus: SyntheticCorpus,
+    rows: int,
+    queries: List[List[float]],
+    ks: List[int],
+    quantization: str,
+    reduced_dimension: int,
+    projection: str,
+    mmap_mb: List[int],
+    cache_k: int
+) -> Dict[str, Any]:
+    """1つの行数でDBを構築し、KNN検索とページキャッシュの効果を測定する"""
+    print(f"\n🏗️  {rows:,}行のDBを構築中...")
+    build = build_synthetic_database(
+        db_path, corpus, rows, quantization, reduced_dimension, projection
+    )
+    build_seconds = build["generate_seconds"] + build["insert_seconds"]
+    print(
+        f"✅ 構築完了: 生成 {build['generate_seconds']:.1f}秒, 挿入 {build['insert_seconds']:.1f}秒 "
+        f"({rows / build['insert_seconds']:,.0f}行/秒), DBサイズ {build['db_bytes'] / 1024 ** 2:,.1f}MB"
+    )
+    
+    database = SqliteVecDatabase(db_path, pool_size=1)
+    knn: Dict[str, Dict[int, Dict[str, float]]] = {}
+    try:
+        print(f"{'ベクトル列':10} | {'k':>5} | {'平均(ms)':>9} | {'p50(ms)':>9} | {'p95(ms)':>9}")
+        print("-" * 55)
+        for vector_index in build["vector_indexes"]:
+            # 1回目はページの読み込みを含むため計測から除く
+            database.search_vectors(queries[0], top_k=1, vector_index=vector_index)
+            knn[vector_index] = {}
+            for k in ks:
+                stats = measure_knn(database, queries, vector_index, k)
+                knn[vector_index][k] = stats
+                print(
+                    f"{vector_index:10} | {k:5d} | {stats['mean']:9.2f} | "
+                    f"{stats['p50']:9.2f} | {stats['p95']:9.2f}"
+                )
+    finally:
+        database.close()
+    
+    # DB全体を覆う大きさのmmapも比較する
+    mmap_sizes = sorted({mb * 1024 * 1024 for mb in mmap_mb} | {build["db_bytes"]})
+    page_cache = measure_page_cache(db_path, queries, mmap_sizes, cache_k)
+    print(f"\n💾 ページキャッシュ・mmapの効果 (float列, k={cache_k})")
+    print(f"{'mmap':>10} | {'初回(ms)':>10} | {'温まった状態 p50(ms)':>20}")
+    print("-" * 48)
+    for result in page_cache:
+        note = "" if result["evicted"] else "  (キャッシュ追い出し非対応)"
+        print(
+            f"{result['mmap_bytes'] / 1024 ** 2:8.0f}MB | {result['first_query_ms']:10.1f} | "
+            f"{result['warm_ms']['p50']:20.2f}{note}"
+        )
+    
+    return {
+        "rows": rows,
+        "build_seconds": build_seconds,
+        "generate_seconds": build["generate_seconds"],
+        "insert_seconds": build["insert_seconds"],
+        "db_bytes": build["db_bytes"],
+        "knn_ms": knn,
+        "page_cache": page_cache
+    }
+
+
+def print_scaling(results: List[Dict[str, Any]], ks: List[int]):
+    """行数に対するKNN検索レイテンシ（p50）の変化を表示する"""
+    print("\n📈 行数に対するKNN検索レイテンシ (p50, ms)")
+    header = " | ".join(f"{f'k={k}':>8}" for k in ks)
+    print(f"{'ベクトル列':10} | {'行数':>10} | {'DBサイズ':>10} | {header}")
+    print("-" * (40 + 11 * len(ks)))
+    for vector_index in results[0]["knn_ms"]:
+        for result in results:
+            latencies = " | ".join(
+                f"{result['knn_ms'][vector_index][k]['p50']:8.2f}" for k in ks
+            )
+            print(
+                f"{vector_index:10} | {result['rows']:10,} | "
+                f"{result['db_bytes'] / 1024 ** 2:8.1f}MB | {latencies}"
+            )
+
+
+@click.command()
+@click.option("--rows", default="10000,100000", help="Comma-separated corpus sizes, e.g. 10000,100000,1000000")
+@click.option("--k", "k_values", default="1,10,100,1000", help="Comma-separated k values for KNN latency")
+@click.option("--queries", "query_count", default=50, help="Number of query vectors per measurement")
+@click.option("--seed", default=0, help="Random seed for the corpus and queries")
+@click.option("--quantization", type=click.Choice(QUANTIZATION_METHODS), default="none", help="Additional quantized vector column")
+@click.option("--reduced-dimension", default=0, help="Additional reduced-dimension column (0 = disabled)")
+@click.option("--projection", type=click.Choice(PROJECTION_METHODS), default="pca", help="Projection method for --reduced-dimension")
+@click.option("--mmap-mb", default="0,256", help="Comma-separated mmap sizes in MB (the DB size is always added)")
+@click.option("--cache-k", default=10, help="k used for the page cache / mmap measurements")
+@click.option("--work-dir", default=None, help="Directory for the synthetic databases (default: temporary)")
+@click.option("--keep", is_flag=True, help="Keep the synthetic databases after the run")
+@click.option("--output", default=None, help="Write the JSON report to this file")
+def main(
+    rows: str,
+    k_values: str,
+    query_count: int,
+    seed: int,
+    quantization: str,
+    reduced_dimension: int,
+    projection: str,
+    mmap_mb: str,
+    cache_k: int,
+    work_dir: Optional[str],
+    keep: bool,
+    output: Optional[str]
+):
+    """合成ベクトルでsqlite-vecの構築・検索性能を行数ごとに測定する"""
+    row_counts = parse_int_list(rows)
+    ks = parse_int_list(k_values)
+    if any(k > VEC0_MAX_K for k in ks):
+        raise click.BadParameter(f"kは{VEC0_MAX_K}以下にしてください")
+    
+    corpus = SyntheticCorpus(seed)
+    queries = corpus.queries(query_count).tolist()
+    
+    print("🧪 合成コーパスベンチマーク")
+    print("=" * 60)
+    print(f"行数: {', '.join(f'{count:,}' for count in row_counts)}, 次元数: {corpus.dimension}, シード: {seed}")
+    print(f"クエリ数: {query_count}, k: {ks}, 量子化: {quantization}, 次元削減: {reduced_dimension or 'なし'}")
+    
+    temporary = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="synthetic-")
+    os.makedirs(work_dir, exist_ok=True)
+    results = []
+    try:
+        for count in row_counts:
+            db_path = os.path.join(work_dir, f"synthetic-{count}.db")
+            results.append(run_rows(
+                db_path, corpus, count, queries, ks, quantization,
+                reduced_dimension, projection, parse_int_list(mmap_mb), cache_k
+            ))
+            if not keep:
+                os.remove(db_path)
+    finally:
+        if temporary and not keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    
+    print_scaling(results, ks)
+    if keep:
+        print(f"\n📁 合成DB: {work_dir}")
+    
+    if output:
+        report = {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "config": {
+                "seed": seed,
+                "dimension": corpus.dimension,
+                "queries": query_count,
+                "k": ks,
+                "quantization": quantization,
+                "reduced_dimension": reduced_dimension,
+                "projection": projection
+            },
+            "results": results
+        }
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"📝 レポートを保存しました: {output}")
+
+
+if __name__ == "__main__":
+    main()
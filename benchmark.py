@@ -6,13 +6,24 @@
     python benchmark.py                      # 基本ベンチマーク
     python benchmark.py --detailed           # 詳細分析
     python benchmark.py --queries "クエリ1" "クエリ2"  # カスタムクエリ
+    python benchmark.py --embedding [件数]    # 埋め込み生成スループット（逐次 vs バッチ）
+    python benchmark.py --quantization [k]   # 量子化・次元削減インデックスのrecall@kと検索時間
+    python benchmark.py --batch [件数]        # 複数クエリの逐次検索 vs search_many
+    python benchmark.py --import-time [回数]  # モジュールのimport時間とメモリ使用量
+    python benchmark.py --chunker [ファイル数] # 文字数 vs トークン数によるチャンク化
 """
 
 import sys
+import json
 import time
 import statistics
+import subprocess
 from typing import List
-from lib.vector_utils import get_vector_search_service
+from lib.vector_utils import (
+    get_vector_search_service,
+    EmbeddingModelManager,
+    ConfigManager
+)
 
 
 # デフォルトテストクエリ
@@ -86,7 +97,13 @@ def run_detailed_analysis():
     stats = service.analyze_performance()
     print(f"💾 DBサイズ: {stats['db_size_mb']:.1f}MB")
     print(f"🖥️  デバイス: {stats.get('device', 'Unknown')}")
-    print(f"🗄️  キャッシュ: {stats['embedding_cache_size']}/{stats['embedding_cache_limit']}")
+    print(f"⚙️  推論バックエンド: {stats.get('inference_backend', 'Unknown')}")
+    cache = stats['embedding_cache']
+    print(
+        f"🗄️  キャッシュ: {cache['entries']}件 "
+        f"({cache['bytes'] / (1024 * 1024):.1f}MB/{cache['max_bytes'] / (1024 * 1024):.0f}MB), "
+        f"ヒット率 {cache['hit_rate']:.1%} (退避 {cache['evictions']}件)"
+    )
     
     # SQLite設定
     print(f"\n⚙️  SQLite設定:")
@@ -139,11 +156,299 @@ def run_custom_queries(queries: List[str]):
         print(f"{query:15} | {result['avg']:.3f}s | {result['results_count']}件")
 
 
+def load_sample_chunks(limit: int) -> List[str]:
+    """ローカルデータソースからベンチマーク用のチャンクを読み込む"""
+    from lib.data_processing import LocalDataSource, TextChunker
+    
+    config = ConfigManager.get_data_source_config()
+    chunker = TextChunker()
+    chunks = []
+    
+    for _, body, _ in LocalDataSource(config['local_dir']).get_markdown_files():
+        chunks.extend(chunker.chunk_text(body))
+        if len(chunks) >= limit:
+            break
+    
+    return chunks[:limit]
+
+
+def run_embedding_benchmark(limit: int = 256):
+    """逐次処理とバッチ処理の埋め込み生成スループットを比較"""
+    print("⚡ 埋め込み生成スループット測定")
+    print("=" * 50)
+    
+    chunks = load_sample_chunks(limit)
+    if not chunks:
+        print("❌ チャンクが見つかりませんでした（LOCAL_DIRを確認してください）")
+        return
+    
+    manager = EmbeddingModelManager()
+    manager.load_model()
+    manager.get_embeddings(chunks[:2])  # ウォームアップ
+    
+    # 逐次処理（キャッシュを無効化して1件ずつ）
+    start = time.time()
+    for chunk in chunks:
+        manager._embedding_cache.clear()
+        manager.get_embedding(chunk)
+    sequential_time = time.time() - start
+    sequential_rate = len(chunks) / sequential_time
+    print(f"逐次処理        | {sequential_time:7.2f}s | {sequential_rate:7.1f}チャンク/秒")
+    
+    batch_size = ConfigManager.get_build_config()["embedding_batch_size"]
+    for size in sorted({8, batch_size, 32}):
+        start = time.time()
+        manager.get_embeddings(chunks, batch_size=size)
+        batch_time = time.time() - start
+        batch_rate = len(chunks) / batch_time
+        print(
+            f"バッチ (size={size:3d}) | {batch_time:7.2f}s | {batch_rate:7.1f}チャンク/秒 "
+            f"(x{batch_rate / sequential_rate:.1f})"
+        )
+    
+    print("-" * 50)
+    print(f"チャンク数: {len(chunks)}件, デバイス: {manager.device}, バックエンド: {manager.backend_name}")
+
+
+def run_quantization_benchmark(top_k: int = 10):
+    """量子化・次元削減インデックスのrecall@kと検索時間をfloatインデックスと比較"""
+    from lib.evaluation import recall_at_k, mean
+    
+    print(f"🧮 量子化・次元削減インデックス比較 (recall@{top_k})")
+    print("=" * 50)
+    
+    service = get_vector_search_service()
+    database = service.database
+    if "float" not in database.vector_indexes:
+        print("❌ 正解の計算にはfloatインデックスが必要です")
+        return
+    
+    embeddings = service.embed_queries(DEFAULT_QUERIES)
+    truths = [
+        [row[0] for row in database.search_vectors(embedding, top_k, "float")]
+        for embedding in embeddings
+    ]
+    
+    sizes = database.vector_index_sizes()
+    modes = [("float", "float", True)]
+    for index in database.vector_indexes:
+        if index != "float":
+            modes.append((f"{index}", index, False))
+            modes.append((f"{index}+rescore", index, True))
+    
+    print(f"{'モード':16} | {'recall':>6} | {'平均時間':>9} | {'サイズ':>9}")
+    print("-" * 50)
+    for label, index, rescore in modes:
+        recalls = []
+        times = []
+        for embedding, truth in zip(embeddings, truths):
+            start = time.time()
+            rows = database.search_vectors(embedding, top_k, index, rescore=rescore)
+            times.append(time.time() - start)
+            recalls.append(recall_at_k(truth, [row[0] for row in rows], top_k))
+        
+        print(
+            f"{label:16} | {mean(recalls):6.3f} | {mean(times) * 1000:7.2f}ms | "
+            f"{sizes[index] / (1024 * 1024):7.1f}MB"
+        )
+
+
+def run_batch_benchmark(count: int = 32):
+    """複数クエリの逐次検索とsearch_manyの処理時間を比較"""
+    print(f"📦 バッチ検索ベンチマーク ({count}クエリ)")
+    print("=" * 50)
+    
+    service = get_vector_search_service()
+    service.search("test", top_k=1)
+    
+    # 埋め込みキャッシュに当たらないよう、各方式で異なるクエリを使う
+    def make_queries(offset: int) -> List[str]:
+        return [
+            f"{DEFAULT_QUERIES[i % len(DEFAULT_QUERIES)]} {offset + i}"
+            for i in range(count)
+        ]
+    
+    start = time.time()
+    for query in make_queries(0):
+        service.search(query, top_k=5)
+    sequential_time = time.time() - start
+    
+    start = time.time()
+    service.search_many(make_queries(count), top_k=5)
+    batch_time = time.time() - start
+    
+    print(f"逐次検索      | {sequential_time:.3f}s ({count / sequential_time:.1f}クエリ/秒)")
+    print(
+        f"search_many   | {batch_time:.3f}s ({count / batch_time:.1f}クエリ/秒, "
+        f"x{sequential_time / batch_time:.1f})"
+    )
+
+
+def run_chunker_benchmark(limit: int = 20):
+    """
+    文字数とトークン数によるチャンク化を、チャンク数・チャンクあたりのトークン数・
+    切り詰められるチャンク・構築時間（チャンク化＋トークン化・順伝播）で比較
+    """
+    from lib.data_processing import LocalDataSource, TextChunker, TokenChunker
+    from lib.evaluation import mean, percentile
+    from lib.vector_utils import EMBEDDING_MAX_LENGTH, load_tokenizer
+    
+    print(f"✂️  チャンク化方式の比較 (最大{limit}ファイル)")
+    print("=" * 50)
+    
+    config = ConfigManager.get_data_source_config()
+    build_config = ConfigManager.get_build_config()
+    bodies = [
+        body for _, body, _ in LocalDataSource(config['local_dir']).get_markdown_files()
+    ][:limit]
+    if not bodies:
+        print("❌ ファイルが見つかりませんでした（LOCAL_DIRを確認してください）")
+        return
+    
+    manager = EmbeddingModelManager()
+    tokenizer, _, _ = manager.load_model()
+    chunkers = [
+        (f"chars ({build_config['chunk_size']}文字)", TextChunker(build_config["chunk_size"])),
+        (
+            f"tokens ({build_config['chunk_tokens']}, 重なり{build_config['chunk_overlap']})",
+            TokenChunker(load_tokenizer(), build_config["chunk_tokens"], build_config["chunk_overlap"])
+        )
+    ]
+    batch_size = build_config["embedding_batch_size"]
+    # ウォームアップ
+    for indices, inputs in manager.tokenize_batches(["ウォームアップ"], batch_size):
+        manager.embed_tokenized(inputs)
+    
+    print(
+        f"{'方式':24} | {'チャンク':>7} | {'平均tok':>7} | {'p50':>5} | {'p95':>5} | {'最大':>5} | "
+        f"{'切り詰め':>7} | {'分割(s)':>7} | {'埋め込み(s)':>10}"
+    )
+    print("-" * 108)
+    for label, chunker in chunkers:
+        start = time.time()
+        chunks = [chunk for body in bodies for chunk in chunker.chunk_text(body)]
+        chunk_time = time.time() - start
+        
+        # 特殊トークンを含めた、切り詰め前のトークン数
+        lengths = sorted(len(ids) for ids in tokenizer(chunks)["input_ids"])
+        truncated = sum(1 for length in lengths if length > EMBEDDING_MAX_LENGTH)
+        lost = sum(length - EMBEDDING_MAX_LENGTH for length in lengths if length > EMBEDDING_MAX_LENGTH)
+        
+        start = time.time()
+        for indices, inputs in manager.tokenize_batches(chunks, batch_size):
+            manager.embed_tokenized(inputs)
+        embed_time = time.time() - start
+        
+        print(
+            f"{label:24} | {len(chunks):7d} | {mean(lengths):7.1f} | {percentile(lengths, 50):5.0f} | "
+            f"{percentile(lengths, 95):5.0f} | {lengths[-1]:5d} | {truncated:7d} | "
+            f"{chunk_time:7.2f} | {embed_time:10.2f}"
+        )
+        if lost:
+            print(f"   ⚠️  切り詰めで失われるトークン: {lost}")
+    
+    print("-" * 108)
+    print(f"ファイル数: {len(bodies)}件, 入力上限: {EMBEDDING_MAX_LENGTH}トークン, バッチサイズ: {batch_size}")
+
+
+# import時間の測定対象（新しいプロセスで実行するコード）
+IMPORT_PROBES = [
+    ("import lib.vector_utils", "import lib.vector_utils"),
+    (
+        "DB情報取得",
+        "from lib.vector_utils import get_vector_search_service\n"
+        "get_vector_search_service().get_database_info()"
+    ),
+    (
+        "全文検索",
+        "from lib.vector_utils import get_vector_search_service\n"
+        "get_vector_search_service().search('大学', top_k=5, mode='lexical')"
+    ),
+    ("import torch, transformers", "import torch, transformers")
+]
+
+# 測定用プロセスで実行するコード（経過時間・最大RSS・重いモジュールの読み込み有無を出力）
+IMPORT_PROBE_TEMPLATE = '''
+import json, resource, sys, time
+start = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    "elapsed": elapsed,
+    "max_rss_mb": rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024,
+    "torch": "torch" in sys.modules,
+    "transformers": "transformers" in sys.modules
+}}))
+'''
+
+
+def run_import_benchmark(runs: int = 3):
+    """埋め込みを使わない処理の起動時間とメモリ使用量を新しいプロセスで測定"""
+    print(f"📥 import時間測定 ({runs}回の最小値)")
+    print("=" * 70)
+    print(f"{'処理':28} | {'時間':>8} | {'最大RSS':>9} | torch | transformers")
+    print("-" * 70)
+    
+    for label, code in IMPORT_PROBES:
+        measurements = []
+        for _ in range(runs):
+            completed = subprocess.run(
+                [sys.executable, "-c", IMPORT_PROBE_TEMPLATE.format(code=code)],
+                capture_output=True,
+                text=True
+            )
+            if completed.returncode != 0:
+                break
+            measurements.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+        
+        if not measurements:
+            print(f"{label:28} | 失敗: {completed.stderr.strip().splitlines()[-1]}")
+            continue
+        
+        best = min(measurements, key=lambda m: m["elapsed"])
+        print(
+            f"{label:28} | {best['elapsed'] * 1000:6.0f}ms | "
+            f"{best['max_rss_mb']:7.1f}MB | {'yes' if best['torch'] else 'no':5} | "
+            f"{'yes' if best['transformers'] else 'no'}"
+        )
+
+
 def main():
     if len(sys.argv) == 1:
         run_basic_benchmark()
     elif "--detailed" in sys.argv:
         run_detailed_analysis()
+    elif "--embedding" in sys.argv:
+        idx = sys.argv.index("--embedding")
+        if len(sys.argv) > idx + 1:
+            run_embedding_benchmark(int(sys.argv[idx + 1]))
+        else:
+            run_embedding_benchmark()
+    elif "--quantization" in sys.argv:
+        idx = sys.argv.index("--quantization")
+        if len(sys.argv) > idx + 1:
+            run_quantization_benchmark(int(sys.argv[idx + 1]))
+        else:
+            run_quantization_benchmark()
+    elif "--batch" in sys.argv:
+        idx = sys.argv.index("--batch")
+        if len(sys.argv) > idx + 1:
+            run_batch_benchmark(int(sys.argv[idx + 1]))
+        else:
+            run_batch_benchmark()
+    elif "--import-time" in sys.argv:
+        idx = sys.argv.index("--import-time")
+        if len(sys.argv) > idx + 1:
+            run_import_benchmark(int(sys.argv[idx + 1]))
+        else:
+            run_import_benchmark()
+    elif "--chunker" in sys.argv:
+        idx = sys.argv.index("--chunker")
+        if len(sys.argv) > idx + 1:
+            run_chunker_benchmark(int(sys.argv[idx + 1]))
+        else:
+            run_chunker_benchmark()
     elif "--queries" in sys.argv:
         idx = sys.argv.index("--queries")
         queries = sys.argv[idx+1:]
@@ -153,7 +458,7 @@ def main():
             print("❌ --queriesの後にクエリを指定してください")
     else:
         print("❌ 不明なオプション")
-        print("使用方法: python benchmark.py [--detailed] [--queries クエリ1 クエリ2 ...]")
+        print("使用方法: python benchmark.py [--detailed] [--embedding [件数]] [--quantization [k]] [--batch [件数]] [--import-time [回数]] [--chunker [ファイル数]] [--queries クエリ1 クエリ2 ...]")
 
 
 if __name__ == "__main__":
@@ -9,17 +9,115 @@ sqlite-vecデータベース構築スクリプト
 4. sqlite-vecデータベースに格納
 
 使用方法:
-    python build_db.py
+    python build_db.py [オプション]
+
+オプション:
+    --batch-size: 埋め込み生成のバッチサイズ（デフォルト: EMBEDDING_BATCH_SIZE または 16）
+    --incremental: 追加・変更されたファイルだけを再埋め込みする差分構築
+    --quantization: 量子化ベクトルも保存する（none/int8/bit、デフォルト: VECTOR_QUANTIZATION）
+    --no-float: floatベクトルを保存せず量子化ベクトルのみとする
+    --reduced-dim: 次元削減列の次元数（0で無効、デフォルト: REDUCED_DIMENSION）
+    --projection: 次元削減方式（pca/truncate、デフォルト: PROJECTION_METHOD）
+    --shards: シャード数（1で単一DB、デフォルト: INDEX_SHARDS）
+    --shard-by: シャードの分割方式（hash/site、デフォルト: SHARD_BY）
+    --chunker: チャンク化方式（chars: 文字数 / tokens: トークン数、デフォルト: CHUNKER）
+    --chunk-tokens: tokens方式のチャンクのトークン数上限（デフォルト: CHUNK_TOKENS または 512）
+    --chunk-overlap: tokens方式で前のチャンクから引き継ぐトークン数（デフォルト: CHUNK_OVERLAP_TOKENS または 0）
+    --profile: 処理段階ごとの壁時計時間・CPU時間と遅いファイルを記録し、要約表とJSONレポートを出力する
+    --profile-output: プロファイルのJSONレポートの保存先（デフォルト: build_profile.json）
+    --profile-outliers: 記録する遅いファイルの件数（デフォルト: 10）
+    --cprofile-dir: パイプラインのスレッドごとのcProfile結果（.prof）の保存先
+    --torch-trace: 順伝播のtorch.profilerトレース（Chrome trace形式）の保存先（torchバックエンドのみ）
 """
 
+from typing import Optional
+
+import click
+
+from lib.build_profiler import BuildProfiler
 from lib.data_processing import DatabaseBuilder
 
 
-def main():
+@click.command()
+@click.option("--batch-size", type=int, default=None, help="Embedding batch size")
+@click.option("--incremental", is_flag=True, help="Only re-embed new or changed files")
+@click.option(
+    "--quantization",
+    type=click.Choice(["none", "int8", "bit"]),
+    default=None,
+    help="Also store quantized vectors"
+)
+@click.option("--no-float", is_flag=True, help="Store only the quantized vectors")
+@click.option("--reduced-dim", type=int, default=None, help="Dimension of the reduced vector index")
+@click.option(
+    "--projection",
+    type=click.Choice(["pca", "truncate"]),
+    default=None,
+    help="Projection used for the reduced vector index"
+)
+@click.option("--shards", type=int, default=None, help="Number of shard database files")
+@click.option(
+    "--shard-by",
+    type=click.Choice(["hash", "site"]),
+    default=None,
+    help="Assign files to shards by path hash or by site"
+)
+@click.option(
+    "--chunker",
+    type=click.Choice(["chars", "tokens"]),
+    default=None,
+    help="Split chunks by character count or by embedding-model tokens"
+)
+@click.option("--chunk-tokens", type=int, default=None, help="Token budget per chunk for --chunker tokens")
+@click.option("--chunk-overlap", type=int, default=None, help="Tokens carried over from the previous chunk for --chunker tokens")
+@click.option("--profile", is_flag=True, help="Record wall/CPU time per build stage and the slowest files")
+@click.option("--profile-output", default="build_profile.json", help="JSON report written by --profile")
+@click.option("--profile-outliers", default=10, help="Number of slowest files kept by --profile")
+@click.option("--cprofile-dir", default=None, help="Write a cProfile .prof file per pipeline thread (implies --profile)")
+@click.option("--torch-trace", default=None, help="Write a torch.profiler Chrome trace of the forward passes (implies --profile)")
+def main(
+    batch_size: int,
+    incremental: bool,
+    quantization: str,
+    no_float: bool,
+    reduced_dim: int,
+    projection: str,
+    shards: int,
+    shard_by: str,
+    chunker: Optional[str],
+    chunk_tokens: Optional[int],
+    chunk_overlap: Optional[int],
+    profile: bool,
+    profile_output: str,
+    profile_outliers: int,
+    cprofile_dir: Optional[str],
+    torch_trace: Optional[str]
+):
     """メイン関数"""
+    profiler = None
+    if profile or cprofile_dir or torch_trace:
+        profiler = BuildProfiler(
+            report_path=profile_output,
+            outliers=profile_outliers,
+            cprofile_dir=cprofile_dir,
+            torch_trace=torch_trace
+        )
+    
     try:
-        builder = DatabaseBuilder()
-        builder.build_database()
+        builder = DatabaseBuilder(
+            batch_size=batch_size,
+            quantization=quantization,
+            store_float=False if no_float else None,
+            reduced_dimension=reduced_dim,
+            projection=projection,
+            shards=shards,
+            shard_by=shard_by,
+            profiler=profiler,
+            chunker=chunker,
+            chunk_tokens=chunk_tokens,
+            chunk_overlap=chunk_overlap
+        )
+        builder.build_database(incremental=incremental)
     except KeyboardInterrupt:
         print("\n⚠️  処理が中断されました")
     except Exception as e:
@@ -28,4 +126,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+永続埋め込みキャッシュ管理スクリプト
+
+使用方法:
+    python cache_admin.py stats              # 統計情報を表示
+    python cache_admin.py evict [--max-mb N] # 容量上限まで古いエントリを削除
+    python cache_admin.py clear              # 全エントリを削除
+"""
+
+from datetime import datetime
+from typing import Optional
+
+import click
+
+from lib.vector_utils import open_persistent_cache
+
+
+def format_time(timestamp: Optional[float]) -> str:
+    """UNIX時刻を表示用の文字列にする"""
+    if timestamp is None:
+        return "-"
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+
+@click.group()
+def main():
+    """永続埋め込みキャッシュを管理する"""
+
+
+@main.command()
+def stats():
+    """キャッシュの統計情報を表示する"""
+    cache = open_persistent_cache(force=True)
+    info = cache.stats()
+    cache.close()
+    
+    print("🗄️  永続埋め込みキャッシュ:")
+    print("=" * 40)
+    print(f"   ファイル: {info['path']} ({info['file_bytes'] / (1024 * 1024):.1f}MB)")
+    print(f"   エントリ数: {info['entries']}")
+    print(f"   使用容量: {info['bytes'] / (1024 * 1024):.1f}MB / {info['max_bytes'] / (1024 * 1024):.0f}MB")
+    print(f"   最古アクセス: {format_time(info['oldest_access'])}")
+    print(f"   最新アクセス: {format_time(info['newest_access'])}")
+    for model in info["models"]:
+        print(
+            f"   - {model['model']}@{model['revision']}: "
+            f"{model['entries']}件 ({model['bytes'] / (1024 * 1024):.1f}MB)"
+        )
+
+
+@main.command()
+@click.option("--max-mb", type=int, default=None, help="Target cache size in MB")
+def evict(max_mb: Optional[int]):
+    """最終アクセスの古い順に削除して容量を上限以下にする"""
+    cache = open_persistent_cache(force=True)
+    max_bytes = max_mb * 1024 * 1024 if max_mb is not None else None
+    removed = cache.evict(max_bytes)
+    cache.close()
+    print(f"✅ {removed}件のエントリを削除しました")
+
+
+@main.command()
+def clear():
+    """全エントリを削除する"""
+    cache = open_persistent_cache(force=True)
+    removed = cache.clear()
+    cache.close()
+    print(f"✅ {removed}件のエントリを削除しました")
+
+
+if __name__ == "__main__":
+    main()
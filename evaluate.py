@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+検索品質・速度評価プログラム
+
+現在のインデックスのfloatベクトルを総当たりして各クエリの厳密な近傍（正解）を求め、
+検索モード・ベクトル列・再スコアリング・候補倍率の組み合わせごとに
+recall@k・MRR・検索レイテンシを並べて表示します。
+
+使用方法:
+    python evaluate.py                                  # 既定のクエリで評価
+    python evaluate.py --sample-chunks 200              # DBのチャンク200件の冒頭をクエリにする
+    python evaluate.py --query-log query_log.jsonl      # サーバーのクエリログを使う
+    python evaluate.py --k 1,10,50 --oversample 2,4,8,16
+    python evaluate.py --output evaluation.json         # 結果をJSONで保存
+
+レイテンシはDB検索（hybridでは全文検索と統合を含む）のみで、クエリ埋め込みの生成時間は含みません。
+lexicalモードとhybridモードの正解もベクトル空間の厳密な近傍のため、意味的な近さとの一致度を表します。
+"""
+
+import sys
+import json
+import time
+import random
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+
+import click
+
+from lib.evaluation import (
+    exact_neighbors, mean, percentile, reciprocal_rank, tied_neighbors, tied_recall_at_k
+)
+from lib.query_log import read_query_log
+from lib.vector_utils import get_vector_search_service, VectorSearchService
+
+
+# デフォルトテストクエリ
+DEFAULT_QUERIES = [
+    "大学", "授業", "履修", "成績", "卒業",
+    "学生証", "図書館", "研究室", "試験", "単位"
+]
+# 正解として求める近傍の数（最大のkに対する倍率）
+TRUTH_DEPTH = 4
+
+
+def parse_int_list(value: str) -> List[int]:
+    """カンマ区切りの整数リストを解析する"""
+    try:
+        return [int(item) for item in value.split(",") if item.strip()]
+    except ValueError:
+        raise click.BadParameter(f"カンマ区切りの整数を指定してください: {value}")
+
+
+def sample_chunk_queries(service: VectorSearchService, count: int, seed: int, length: int = 64) -> List[str]:
+    """DBのチャンクを無作為に選び、冒頭length文字をクエリとする"""
+    database = service.database
+    chunk_ids = database.chunk_ids()
+    selected = random.Random(seed).sample(chunk_ids, min(count, len(chunk_ids)))
+    texts = database.chunk_texts(selected)
+    return [
+        texts[chunk_id].strip()[:length]
+        for chunk_id in selected
+        if texts.get(chunk_id, "").strip()
+    ]
+
+
+def build_configurations(
+    service: VectorSearchService,
+    oversamples: List[int],
+    modes: List[str]
+) -> List[Dict[str, Any]]:
+    """評価する検索設定の一覧を作る"""
+    database = service.database
+    configurations = []
+    
+    if "vector" in modes:
+        configurations.append({
+            "label": "float", "mode": "vector", "vector_index": "float",
+            "rescore": False, "oversample": None
+        })
+        for index in database.vector_indexes:
+            if index == "float":
+                continue
+            configurations.append({
+                "label": index, "mode": "vector", "vector_index": index,
+                "rescore": False, "oversample": None
+            })
+            # 再スコアリングにはfloat列が必要（厳密な正解の計算にも必要なため常にある）
+            for oversample in oversamples:
+                configurations.append({
+                    "label": f"{index}+rescore x{oversample}", "mode": "vector",
+                    "vector_index": index, "rescore": True, "oversample": oversample
+                })
+    
+    if database.has_lexical_index:
+        if "hybrid" in modes:
+            configurations.append({
+                "label": f"hybrid ({database.resolve_vector_index(service.vector_index)})",
+                "mode": "hybrid", "vector_index": service.vector_index,
+                "rescore": service.rescore, "oversample": None
+            })
+        if "lexical" in modes:
+            configurations.append({
+                "label": "lexical", "mode": "lexical", "vector_index": None,
+                "rescore": False, "oversample": None
+            })
+    elif "hybrid" in modes or "lexical" in modes:
+        print("⚠️  全文検索インデックスがないため、hybrid・lexicalモードは評価しません")
+    
+    return configurations
+
+
+def run_configuration(
+    service: VectorSearchService,
+    configuration: Dict[str, Any],
+    queries: List[str],
+    embeddings: List[List[float]],
+    top_k: int
+) -> Tuple[List[List[int]], List[float]]:
+    """1つの検索設定で全クエリを検索し、(結果IDのリスト, レイテンシ) を返す"""
+    database = service.database
+    
+    def search(query: str, embedding: List[float]) -> List[int]:
+        if configuration["mode"] == "lexical":
+            return [row[0] for row in database.search_lexical(query, top_k)]
+        if configuration["mode"] == "hybrid":
+            results = service.search_by_embedding(
+                embedding, top_k, configuration["vector_index"], query=query, mode="hybrid"
+            )
+            return [result["id"] for result in results]
+        rows = database.search_vectors(
+            embedding, top_k, configuration["vector_index"],
+            oversample=configuration["oversample"], rescore=configuration["rescore"]
+        )
+        return [row[0] for row in rows]
+    
+    # 1回目はページの読み込みを含むため計測から除く
+    search(queries[0], embeddings[0])
+    
+    result_ids = []
+    latencies = []
+    for query, embedding in zip(queries, embeddings):
+        start = time.perf_counter()
+        result_ids.append(search(query, embedding))
+        latencies.append(time.perf_counter() - start)
+    return result_ids, latencies
+
+
+def score_configuration(
+    truths: List[List[int]],
+    truth_distances: List[List[float]],
+    result_ids: List[List[int]],
+    latencies: List[float],
+    ks: List[int]
+) -> Dict[str, Any]:
+    """recall@k・MRR・レイテンシを集計する（同距離の近傍はどれも正解とみなす）"""
+    sorted_latencies = sorted(latency * 1000 for latency in latencies)
+    return {
+        "recall": {
+            k: mean([
+                tied_recall_at_k(truth, distances, ids, k)
+                for truth, distances, ids in zip(truths, truth_distances, result_ids)
+            ])
+            for k in ks
+        },
+        "mrr": mean([
+            reciprocal_rank(set(tied_neighbors(truth, distances, 1)), ids)
+            for truth, distances, ids in zip(truths, truth_distances, result_ids) if truth
+        ]),
+        "latency_ms": {
+            "mean": mean(sorted_latencies),
+            "p50": percentile(sorted_latencies, 50),
+            "p95": percentile(sorted_latencies, 95)
+        }
+    }
+
+
+def print_table(results: List[Dict[str, Any]], ks: List[int], sizes: Dict[str, int]):
+    """検索設定ごとの評価結果を表形式で表示する"""
+    recall_header = " | ".join(f"{f'R@{k}':>6}" for k in ks)
+    print(f"{'設定':24} | {recall_header} | {'MRR':>6} | {'p50(ms)':>8} | {'p95(ms)':>8} | {'サイズ':>9}")
+    print("-" * (80 + 9 * len(ks)))
+    for result in results:
+        configuration = result["configuration"]
+        scores = result["scores"]
+        recalls = " | ".join(f"{scores['recall'][k]:6.3f}" for k in ks)
+        size = sizes.get(configuration["vector_index"] or "")
+        size_text = f"{size / (1024 * 1024):7.1f}MB" if size is not None else f"{'-':>9}"
+        print(
+            f"{configuration['label']:24} | {recalls} | {scores['mrr']:6.3f} | "
+            f"{scores['latency_ms']['p50']:8.2f} | {scores['latency_ms']['p95']:8.2f} | {size_text}"
+        )
+
+
+@click.command()
+@click.option("--query", "queries", multiple=True, help="Query to evaluate (repeatable)")
+@click.option("--query-file", default=None, help="File with one query per line")
+@click.option("--query-log", default=None, help="Use the queries of a server query log (JSON Lines)")
+@click.option("--sample-chunks", default=0, help="Use the beginning of N randomly sampled chunks as queries")
+@click.option("--seed", default=0, help="Random seed for --sample-chunks")
+@click.option("--k", "k_values", default="1,5,10", help="Comma-separated k values for recall@k")
+@click.option("--oversample", "oversamples", default="2,4,8", help="Comma-separated oversample factors for rescoring")
+@click.option("--modes", default="vector,hybrid,lexical", help="Comma-separated search modes to evaluate")
+@click.option("--output", default=None, help="Write the JSON report to this file")
+def main(
+    queries: Tuple[str, ...],
+    query_file: Optional[str],
+    query_log: Optional[str],
+    sample_chunks: int,
+    seed: int,
+    k_values: str,
+    oversamples: str,
+    modes: str,
+    output: Optional[str]
+):
+    """厳密な近傍を正解として、検索設定ごとのrecall@k・MRR・レイテンシを比較する"""
+    ks = sorted(set(parse_int_list(k_values)))
+    top_k = ks[-1]
+    mode_list = [mode.strip() for mode in modes.split(",") if mode.strip()]
+    
+    service = get_vector_search_service()
+    database = service.database
+    if "float" not in database.vector_indexes:
+        print("❌ 正解の計算にはfloatインデックスが必要です")
+        sys.exit(1)
+    
+    query_list = list(queries)
+    if query_file:
+        with open(query_file, encoding="utf-8") as f:
+            query_list.extend(line.strip() for line in f if line.strip())
+    if query_log:
+        query_list.extend(entry["query"] for entry in read_query_log(query_log))
+    if sample_chunks:
+        query_list.extend(sample_chunk_queries(service, sample_chunks, seed))
+    # 重複を除いて入力順を保つ
+    query_list = list(dict.fromkeys(query_list)) or DEFAULT_QUERIES
+    
+    print("🎯 検索品質・速度評価")
+    print("=" * 60)
+    info = database.get_database_info()
+    print(f"チャンク数: {info['doc_count']}, ベクトル列: {', '.join(database.vector_indexes)}")
+    print(f"クエリ数: {len(query_list)}, k: {ks}")
+    
+    start = time.time()
+    embeddings = service.embed_queries(query_list)
+    print(f"📦 クエリ埋め込み: {time.time() - start:.2f}秒")
+    
+    start = time.time()
+    # k番目と同距離の近傍も正解とみなすため、多めに求めておく
+    truths, truth_distances = exact_neighbors(
+        database.iter_float_vectors(), embeddings, top_k * TRUTH_DEPTH
+    )
+    print(f"🧮 厳密な近傍（総当たり）: {time.time() - start:.2f}秒")
+    
+    results = []
+    for configuration in build_configurations(service, parse_int_list(oversamples), mode_list):
+        result_ids, latencies = run_configuration(
+            service, configuration, query_list, embeddings, top_k
+        )
+        results.append({
+            "configuration": configuration,
+            "scores": score_configuration(truths, truth_distances, result_ids, latencies, ks)
+        })
+    
+    print()
+    print_table(results, ks, database.vector_index_sizes())
+    
+    if output:
+        report = {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "doc_count": info["doc_count"],
+            "queries": len(query_list),
+            "k": ks,
+            "results": results
+        }
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"📝 レポートを保存しました: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+埋め込みモデルのONNX変換スクリプト
+
+このスクリプトは以下の処理を行います:
+1. 埋め込みモデルをONNX形式に変換（last_hidden_stateを出力）
+2. int8動的量子化したモデルを作成
+3. PyTorch（float32）の出力とのコサイン類似度で各バックエンドを検証
+
+使用方法:
+    python export_onnx.py [オプション]
+
+オプション:
+    --output-dir: 出力先ディレクトリ（デフォルト: ONNX_MODEL_DIR または onnx_model）
+    --opset: ONNXのopsetバージョン（デフォルト: 17）
+    --no-quantize: int8量子化モデルを作成しない
+    --skip-export: 変換せず既存モデルの検証のみ行う
+    --check: 検証するバックエンド（複数指定可、デフォルト: onnx, onnx-int8）
+    --min-cosine: 合格とするコサイン類似度の最小値（デフォルト: 0.99）
+"""
+
+import os
+import sys
+import time
+import tempfile
+from typing import List, Tuple
+
+import click
+import onnx
+import torch
+
+from lib.evaluation import cosine_similarity, mean
+from lib.inference_backends import INFERENCE_BACKENDS, ONNX_MODEL_FILES
+from lib.vector_utils import EmbeddingModelManager, ConfigManager
+
+
+# 検証用テキスト（長さの異なる文を含める）
+VALIDATION_TEXTS = [
+    "大学",
+    "履修登録の締め切りはいつですか",
+    "図書館の開館時間と休館日について教えてください。",
+    "電波時計は標準電波を受信して時刻を自動的に合わせる時計である。",
+    "研究室に配属された学生は、指導教員と相談しながら卒業研究のテーマを決定し、"
+    "中間発表と最終発表を経て卒業論文を提出する。",
+    "南極観測隊は毎年夏に出発し、昭和基地で気象・オーロラ・雪氷などの観測を行う。"
+    "越冬隊は約1年間基地に滞在し、観測と設備の維持管理を担当する。" * 3
+]
+
+
+class HiddenStateModule(torch.nn.Module):
+    """ONNX変換用にlast_hidden_stateだけを返すラッパー"""
+    
+    def __init__(self, model: torch.nn.Module):
+        super().__init__()
+        self.model = model
+    
+    def forward(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        return self.model(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+
+
+def save_with_external_data(model: "onnx.ModelProto", output_path: str):
+    """重みを <モデル名>.data の1ファイルに格納してONNXモデルを保存する"""
+    onnx.save_model(
+        model,
+        output_path,
+        save_as_external_data=True,
+        all_tensors_to_one_file=True,
+        location=f"{os.path.basename(output_path)}.data"
+    )
+
+
+def export_model(output_path: str, opset: int):
+    """float32のPyTorchモデルをONNX形式に変換する"""
+    manager = EmbeddingModelManager(backend="torch")
+    tokenizer, backend, _ = manager.load_model()
+    module = HiddenStateModule(backend.model.to("cpu").float()).eval()
+    
+    sample = tokenizer(VALIDATION_TEXTS[:2], return_tensors="pt", padding=True)
+    dynamic_axes = {
+        "input_ids": {0: "batch", 1: "sequence"},
+        "attention_mask": {0: "batch", 1: "sequence"},
+        "last_hidden_state": {0: "batch", 1: "sequence"}
+    }
+    
+    print(f"🔄 ONNX変換中: {output_path} (opset {opset})")
+    start = time.time()
+    with tempfile.TemporaryDirectory() as work_dir, torch.no_grad():
+        # 2GBを超えるモデルは重みがテンソルごとの外部データファイルに分かれるため、
+        # 作業ディレクトリに書き出してから1つのデータファイルにまとめる
+        work_path = os.path.join(work_dir, "model.onnx")
+        torch.onnx.export(
+            module,
+            (sample["input_ids"], sample["attention_mask"]),
+            work_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            do_constant_folding=True,
+            dynamo=False
+        )
+        save_with_external_data(onnx.load(work_path), output_path)
+    print(f"✅ ONNX変換完了: {time.time() - start:.1f}秒")
+
+
+def quantize_model(source_path: str, output_path: str):
+    """MatMulの重みをint8に動的量子化する"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    
+    print(f"🔄 int8動的量子化中: {output_path}")
+    start = time.time()
+    # 活性値は推論時に動的に量子化されるため、キャリブレーションデータは不要
+    quantize_dynamic(
+        source_path,
+        output_path,
+        op_types_to_quantize=["MatMul"],
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+        use_external_data_format=True
+    )
+    print(f"✅ 量子化完了: {time.time() - start:.1f}秒")
+
+
+def file_size_mb(path: str) -> float:
+    """ONNXモデルと外部データファイルの合計サイズ（MB）"""
+    directory = os.path.dirname(path) or "."
+    prefix = os.path.basename(path)
+    total = sum(
+        os.path.getsize(os.path.join(directory, name))
+        for name in os.listdir(directory)
+        if name.startswith(prefix)
+    )
+    return total / (1024 * 1024)
+
+
+def embed_with(backend: str, texts: List[str]) -> Tuple[List[List[float]], float]:
+    """指定したバックエンドで埋め込みを計算し、(埋め込み, 1件あたりの秒数) を返す"""
+    manager = EmbeddingModelManager(backend=backend)
+    manager.load_model()
+    manager.get_embeddings(texts[:1])  # ウォームアップ
+    
+    start = time.time()
+    embeddings = [manager.get_embeddings([text])[0] for text in texts]
+    return embeddings, (time.time() - start) / len(texts)
+
+
+def validate_backends(backends: List[str], min_cosine: float) -> bool:
+    """各バックエンドの出力をPyTorch（float32）と比較する"""
+    print(f"🔍 PyTorch（float32）の出力との比較 (合格: コサイン類似度 >= {min_cosine})")
+    reference, reference_time = embed_with("torch", VALIDATION_TEXTS)
+    
+    print(f"{'バックエンド':12} | {'最小':>6} | {'平均':>6} | {'1件あたり':>9} | 判定")
+    print("-" * 50)
+    print(f"{'torch':12} | {1.0:6.4f} | {1.0:6.4f} | {reference_time * 1000:7.1f}ms | 基準")
+    
+    passed = True
+    for backend in backends:
+        embeddings, elapsed = embed_with(backend, VALIDATION_TEXTS)
+        similarities = [
+            cosine_similarity(expected, actual)
+            for expected, actual in zip(reference, embeddings)
+        ]
+        ok = min(similarities) >= min_cosine
+        passed = passed and ok
+        print(
+            f"{backend:12} | {min(similarities):6.4f} | {mean(similarities):6.4f} | "
+            f"{elapsed * 1000:7.1f}ms | {'✅' if ok else '❌'}"
+        )
+    
+    return passed
+
+
+@click.command()
+@click.option("--output-dir", default=None, help="Directory for the exported ONNX models")
+@click.option("--opset", type=int, default=17, help="ONNX opset version")
+@click.option("--no-quantize", is_flag=True, help="Do not create the int8 quantized model")
+@click.option("--skip-export", is_flag=True, help="Only validate existing models")
+@click.option(
+    "--check",
+    type=click.Choice([name for name in INFERENCE_BACKENDS if name != "torch"]),
+    multiple=True,
+    help="Backends to validate against the torch reference"
+)
+@click.option("--min-cosine", type=float, default=0.99, help="Minimum cosine similarity to pass")
+def main(
+    output_dir: str,
+    opset: int,
+    no_quantize: bool,
+    skip_export: bool,
+    check: Tuple[str, ...],
+    min_cosine: float
+):
+    """埋め込みモデルをONNX形式に変換し、出力を検証する"""
+    config = ConfigManager.get_inference_config()
+    output_dir = output_dir or config["onnx_dir"]
+    # 検証するモデルを指定したディレクトリから読み込む
+    os.environ["ONNX_MODEL_DIR"] = output_dir
+    os.makedirs(output_dir, exist_ok=True)
+    
+    onnx_path = os.path.join(output_dir, ONNX_MODEL_FILES["onnx"])
+    int8_path = os.path.join(output_dir, ONNX_MODEL_FILES["onnx-int8"])
+    
+    if not skip_export:
+        export_model(onnx_path, opset)
+        if not no_quantize:
+            quantize_model(onnx_path, int8_path)
+    
+    for path in (onnx_path, int8_path):
+        if os.path.exists(path):
+            print(f"📁 {path}: {file_size_mb(path):.1f}MB")
+    
+    backends = list(check) or [
+        name for name in ("onnx", "onnx-int8")
+        if os.path.exists(os.path.join(output_dir, ONNX_MODEL_FILES[name]))
+    ]
+    if not validate_backends(backends, min_cosine):
+        print("❌ PyTorchの出力との差が許容範囲を超えています")
+        sys.exit(1)
+    print("✅ 検証完了")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+DB構築プロファイラモジュール
+
+このモジュールは以下の機能を提供します:
+- 構築の処理段階（読み込み・解析・チャンク化・トークン化・順伝播・シリアライズ・挿入など）ごとの
+  壁時計時間・CPU時間・処理件数の記録
+- パイプラインの各スレッドの稼働率の計算
+- 処理時間の長いファイル（外れ値）の抽出
+- cProfile・torch.profilerのトレース出力
+- 要約表の表示と、実行間で比較できるJSONレポートの保存
+"""
+
+import os
+import json
+import time
+import heapq
+import cProfile
+import threading
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Callable, Iterator
+
+
+# 要約表での処理段階の表示順（記録されなかった段階は表示しない）
+STAGE_ORDER = [
+    "read", "hash", "parse", "chunk",
+    "cache_lookup", "tokenize", "forward", "cache_store",
+    "calibrate", "delete", "serialize", "insert_metadata", "insert_vectors",
+    "manifest", "finalize"
+]
+
+
+class BuildProfiler:
+    """
+    DB構築の処理段階ごとの時間を記録するクラス
+    
+    段階はパイプラインの別々のスレッドで並行に実行されるため、CPU時間は
+    段階を実行したスレッドのCPU時間（time.thread_time）で測る。
+    無効の場合、stageは何もしないコンテキストを返すため構築速度に影響しない。
+    """
+    
+    def __init__(
+        self,
+        enabled: bool = True,
+        report_path: Optional[str] = None,
+        outliers: int = 10,
+        cprofile_dir: Optional[str] = None,
+        torch_trace: Optional[str] = None
+    ):
+        self.enabled = enabled
+        self.report_path = report_path
+        self.outliers = outliers
+        self.cprofile_dir = cprofile_dir
+        self.torch_trace = torch_trace
+        
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.threads: Dict[str, Dict[str, float]] = {}
+        self._files: List[tuple] = []  # (秒, 連番, ファイル情報) の最小ヒープ
+        self._file_count = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._null = nullcontext()
+        self.started_at = time.perf_counter()
+    
+    def stage(self, name: str, items: int = 0):
+        """処理段階の時間を記録するコンテキスト（itemsは処理件数）"""
+        if not self.enabled:
+            return self._null
+        return self._measure(name, items)
+    
+    @contextmanager
+    def _measure(self, name: str, items: int) -> Iterator[None]:
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.thread_time() - cpu_start
+            thread = getattr(self._local, "name", "main")
+            with self._lock:
+                entry = self.stages.setdefault(name, {
+                    "thread": thread, "calls": 0, "items": 0, "wall": 0.0, "cpu": 0.0, "max": 0.0
+                })
+                entry["calls"] += 1
+                entry["items"] += items
+                entry["wall"] += wall
+                entry["cpu"] += cpu
+                entry["max"] = max(entry["max"], wall)
+    
+    def record_file(self, path: str, seconds: float, size: Optional[int], chunks: int):
+        """1ファイルの読み込み〜チャンク化の時間を記録し、遅い順に上位だけを残す"""
+        if not self.enabled or self.outliers <= 0:
+            return
+        info = {"path": path, "seconds": seconds, "bytes": size, "chunks": chunks}
+        with self._lock:
+            self._file_count += 1
+            item = (seconds, self._file_count, info)
+            if len(self._files) < self.outliers:
+                heapq.heappush(self._files, item)
+            elif seconds > self._files[0][0]:
+                heapq.heapreplace(self._files, item)
+    
+    def thread(self, name: str, target: Callable[[], None]) -> Callable[[], None]:
+        """
+        パイプラインのスレッドで実行する関数を包み、稼働時間とCPU時間を記録する
+        
+        cprofile_dirを指定した場合はスレッドごとにcProfileの結果を書き出す
+        （cProfileは有効化したスレッドだけを計測するため）。
+        """
+        if not self.enabled:
+            return target
+        
+        def run():
+            # 最後のステージは呼び出し元のスレッドで実行されるため、終了後に戻す
+            previous = getattr(self._local, "name", None)
+            self._local.name = name
+            profile = cProfile.Profile() if self.cprofile_dir else None
+            wall_start = time.perf_counter()
+            cpu_start = time.thread_time()
+            if profile:
+                profile.enable()
+            try:
+                target()
+            finally:
+                if profile:
+                    profile.disable()
+                    os.makedirs(self.cprofile_dir, exist_ok=True)
+                    profile.dump_stats(os.path.join(self.cprofile_dir, f"build-{name}.prof"))
+                with self._lock:
+                    self.threads[name] = {
+                        "wall": time.perf_counter() - wall_start,
+                        "cpu": time.thread_time() - cpu_start
+                    }
+                if previous is None:
+                    del self._local.name
+                else:
+                    self._local.name = previous
+        
+        return run
+    
+    def trace_forward(self):
+        """
+        順伝播をtorch.profilerで記録するコンテキスト（torch_traceを指定した場合のみ）
+        
+        終了時にChrome trace形式（chrome://tracing や Perfetto で表示）で書き出す。
+        """
+        if not self.enabled or not self.torch_trace:
+            return self._null
+        return self._torch_trace()
+    
+    @contextmanager
+    def _torch_trace(self) -> Iterator[None]:
+        try:
+            import torch
+            from torch.profiler import profile, ProfilerActivity
+        except ImportError:
+            print("⚠️  torchがインストールされていないため、torch.profilerのトレースは出力しません")
+            yield
+            return
+        
+        activities = [ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(ProfilerActivity.CUDA)
+        with profile(activities=activities, record_shapes=True) as prof:
+            yield
+        prof.export_chrome_trace(self.torch_trace)
+        print(f"📝 torch.profilerのトレースを保存しました: {self.torch_trace}")
+    
+    def report(self, summary: Dict[str, Any]) -> Dict[str, Any]:
+        """JSONレポートを作成する（summaryには構築設定や件数を渡す）"""
+        total_wall = time.perf_counter() - self.started_at
+        stages = {}
+        for name in self._ordered_stages():
+            entry = self.stages[name]
+            stages[name] = {
+                **entry,
+                "wall_share": entry["wall"] / total_wall if total_wall else 0.0,
+                "items_per_second": entry["items"] / entry["wall"] if entry["wall"] else 0.0
+            }
+        
+        threads = {}
+        for name, entry in self.threads.items():
+            busy = sum(stage["wall"] for stage in self.stages.values() if stage["thread"] == name)
+            threads[name] = {
+                **entry,
+                "busy": busy,
+                "utilization": busy / entry["wall"] if entry["wall"] else 0.0
+            }
+        
+        return {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "wall_seconds": total_wall,
+            "summary": summary,
+            "stages": stages,
+            "threads": threads,
+            "slowest_files": [
+                info for _, _, info in sorted(self._files, key=lambda item: item[0], reverse=True)
+            ]
+        }
+    
+    def _ordered_stages(self) -> List[str]:
+        known = [name for name in STAGE_ORDER if name in self.stages]
+        return known + sorted(name for name in self.stages if name not in STAGE_ORDER)
+    
+    def finish(self, summary: Dict[str, Any]):
+        """要約表を表示し、report_pathがあればJSONレポートを保存する"""
+        if not self.enabled:
+            return
+        report = self.report(summary)
+        print_report(report)
+        if self.report_path:
+            with open(self.report_path, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            print(f"📝 プロファイルを保存しました: {self.report_path}")
+        if self.cprofile_dir:
+            print(f"📝 cProfileの結果: {self.cprofile_dir}/build-*.prof")
+
+
+def print_report(report: Dict[str, Any]):
+    """プロファイルの要約表を表示する"""
+    print(f"\n⏱️  構築プロファイル (全体 {report['wall_seconds']:.1f}秒)")
+    print(
+        f"{'段階':15} | {'スレッド':8} | {'回数':>7} | {'件数':>8} | {'壁時計(s)':>9} | "
+        f"{'CPU(s)':>8} | {'割合':>6} | {'件数/秒':>9} | {'最大(ms)':>9}"
+    )
+    print("-" * 106)
+    for name, stage in report["stages"].items():
+        rate = f"{stage['items_per_second']:9.1f}" if stage["items"] else f"{'-':>9}"
+        print(
+            f"{name:15} | {stage['thread']:8} | {stage['calls']:7d} | {stage['items']:8d} | "
+            f"{stage['wall']:9.2f} | {stage['cpu']:8.2f} | {stage['wall_share'] * 100:5.1f}% | "
+            f"{rate} | {stage['max'] * 1000:9.1f}"
+        )
+    
+    if report["threads"]:
+        print(f"\n{'スレッド':8} | {'稼働(s)':>8} | {'段階計(s)':>8} | {'CPU(s)':>8} | {'稼働率':>6}")
+        print("-" * 52)
+        for name, thread in report["threads"].items():
+            print(
+                f"{name:8} | {thread['wall']:8.2f} | {thread['busy']:8.2f} | "
+                f"{thread['cpu']:8.2f} | {thread['utilization'] * 100:5.1f}%"
+            )
+    
+    if report["slowest_files"]:
+        print("\n🐢 処理時間の長いファイル（読み込み〜チャンク化）")
+        for info in report["slowest_files"]:
+            size = f"{info['bytes'] / 1024:.1f}KB" if info["bytes"] is not None else "-"
+            print(f"   {info['seconds'] * 1000:8.1f}ms  {size:>9}  {info['chunks']:4d}チャンク  {info['path']}")
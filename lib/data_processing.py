@@ -3,28 +3,55 @@
 
 このモジュールは以下の機能を提供します:
 - Markdownファイルの解析
-- テキストのチャンク化
-- FTPとローカルファイルシステムからのデータ取得
+- テキストのチャンク化（文字数またはトークン数による）
+- FTPとローカルファイルシステムからのデータ取得（FTPは接続プールによる並行ダウンロード）
 - sqlite-vecデータベースの初期化と構築
 """
 
 import os
+import io
+import re
 import glob
+import json
+import hashlib
 import yaml
 import sqlite3
 import sqlite_vec
-import tempfile
-from typing import List, Dict, Tuple, Iterator
-from ftplib import FTP, error_perm
+import time
+import queue
+import posixpath
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from itertools import islice
+from typing import List, Dict, Tuple, Iterator, Any, Optional, Callable
+from ftplib import FTP, error_perm, error_proto, error_reply, error_temp
+from urllib.parse import urlparse
 from tqdm import tqdm
 
 from .vector_utils import (
     EmbeddingModelManager, 
+    EMBEDDING_MAX_LENGTH,
+    load_tokenizer,
     SqliteVecDatabase, 
     ConfigManager,
+    open_persistent_cache,
+    load_index_settings,
+    save_index_settings,
     SQLITE_DB_PATH,
-    EMBEDDING_DIMENSION
+    EMBEDDING_DIMENSION,
+    FILTER_COLUMNS,
+    LEGACY_FILTER_COLUMNS,
+    SHARD_KEYS,
+    shard_paths,
+    find_shard_paths,
+    shard_for_key
 )
+from .quantization import VectorQuantizer
+from .projection import VectorProjector
+from .build_profiler import BuildProfiler
 
 
 class MarkdownParser:
@@ -37,13 +64,26 @@ class MarkdownParser:
         
         Args:
             filepath: Markdownファイルのパス
-            
+        
         Returns:
             (url, body): URLと本文のタプル
         """
         with open(filepath, "r", encoding="utf-8") as f:
             content = f.read()
         
+        return MarkdownParser.parse_markdown_text(content)
+    
+    @staticmethod
+    def parse_markdown_text(content: str) -> Tuple[str, str]:
+        """
+        Markdown文字列を解析してURLと本文を取得する
+        
+        Args:
+            content: Markdownファイルの内容
+        
+        Returns:
+            (url, body): URLと本文のタプル
+        """
         if content.startswith("---"):
             end = content.find("---", 3)
             if end != -1:
@@ -57,6 +97,34 @@ class MarkdownParser:
                     pass
         
         return "", content
+    
+    @staticmethod
+    def derive_site_section(url: str, relative_path: str) -> Tuple[str, str]:
+        """
+        絞り込み用のサイト・セクションを求める
+        
+        URLがあればホスト名と先頭のパス階層を、なければデータディレクトリからの
+        相対パスの先頭2階層（例: www.muse.or.jp/dawn/dawn01.md）を使う。
+        
+        Returns:
+            (site, section): 該当しない場合は空文字列
+        """
+        if url:
+            parsed = urlparse(url)
+            segments = [segment for segment in parsed.path.split("/") if segment]
+            section = segments[0] if len(segments) > 1 else ""
+            return parsed.netloc, section
+        
+        segments = [segment for segment in relative_path.replace(os.sep, "/").split("/") if segment]
+        site = segments[0] if len(segments) > 1 else ""
+        section = segments[1] if len(segments) > 2 else ""
+        return site, section
+
+
+# 文の区切り（句点・感嘆符・疑問符・改行の直後）
+SENTENCE_BOUNDARY = re.compile(r"(?<=[。．！？!?\n])")
+# チャンク化方式（chars: 文字数 / tokens: トークン数）
+CHUNKERS = ("chars", "tokens")
 
 
 class TextChunker:
@@ -71,13 +139,11 @@ class TextChunker:
         
         Args:
             text: チャンク化するテキスト
-            
+        
         Returns:
             チャンク化されたテキストのリスト
         """
-        import re
-        
-        sentences = re.split(r"(?<=[。．！？!?\n])", text)
+        sentences = SENTENCE_BOUNDARY.split(text)
         chunks = []
         current = ""
         
@@ -94,58 +160,589 @@ class TextChunker:
         return [chunk for chunk in chunks if chunk]
 
 
-class FTPDataSource:
-    """FTPデータソースクラス"""
+class TokenChunker:
+    """
+    埋め込みモデルのトークナイザで長さを測るチャンク化クラス
+    
+    文単位で区切り、トークン数がmax_tokensに収まるまで文を詰める。文のトークン数は
+    1文書につき1回のバッチ呼び出しで求める。1文で上限を超える場合は文字位置で分割し、
+    最後にすべてのチャンクがモデルの入力上限（特殊トークンを含めてwindowトークン）に
+    収まることを確かめるため、埋め込み時に切り詰められる内容がない。
+    """
+    
+    def __init__(
+        self,
+        tokenizer: Any,
+        max_tokens: int = EMBEDDING_MAX_LENGTH,
+        overlap_tokens: int = 0,
+        window: int = EMBEDDING_MAX_LENGTH
+    ):
+        self.tokenizer = tokenizer
+        self.window = window
+        special_tokens = (
+            tokenizer.num_special_tokens_to_add()
+            if hasattr(tokenizer, "num_special_tokens_to_add") else 0
+        )
+        self.max_tokens = max(1, min(max_tokens, window - special_tokens))
+        # 引き継ぎが長すぎるとチャンク数が増えるだけなので上限の半分までとする
+        self.overlap_tokens = max(0, min(overlap_tokens, self.max_tokens // 2))
+    
+    def count_tokens(self, texts: List[str], special_tokens: bool = False) -> List[int]:
+        """テキストごとのトークン数（1回のバッチ呼び出しで求める）"""
+        if not texts:
+            return []
+        encodings = self.tokenizer(texts, add_special_tokens=special_tokens)
+        return [len(ids) for ids in encodings["input_ids"]]
+    
+    def _split_sentence(self, sentence: str, tokens: int) -> List[Tuple[str, int]]:
+        """上限を超える文をトークン数に比例した文字数で分割する（超えた断片は再分割する）"""
+        if tokens <= self.max_tokens or len(sentence) <= 1:
+            return [(sentence, tokens)]
+        step = max(1, len(sentence) * self.max_tokens // tokens)
+        parts = [sentence[i:i + step] for i in range(0, len(sentence), step)]
+        return [
+            piece
+            for part, count in zip(parts, self.count_tokens(parts))
+            for piece in self._split_sentence(part, count)
+        ]
+    
+    def _overlap(self, current: List[Tuple[str, int]], next_tokens: int) -> List[Tuple[str, int]]:
+        """次のチャンクに引き継ぐ末尾の文（次の文と合わせて上限に収まる分だけ）"""
+        carried: List[Tuple[str, int]] = []
+        total = 0
+        for sentence, tokens in reversed(current):
+            if total + tokens > self.overlap_tokens or total + tokens + next_tokens > self.max_tokens:
+                break
+            carried.insert(0, (sentence, tokens))
+            total += tokens
+        return carried
+    
+    def _fit_window(self, chunks: List[str]) -> List[str]:
+        """
+        特殊トークンを含めて入力上限を超えるチャンクを半分に分ける
+        
+        文ごとのトークン数の和は、連結したときのトークン数とわずかに異なる場合がある。
+        """
+        result = []
+        for chunk, tokens in zip(chunks, self.count_tokens(chunks, special_tokens=True)):
+            if tokens <= self.window or len(chunk) <= 1:
+                result.append(chunk)
+            else:
+                middle = len(chunk) // 2
+                result.extend(self._fit_window([chunk[:middle], chunk[middle:]]))
+        return result
     
-    def __init__(self, host: str, user: str = "anonymous", password: str = ""):
+    def chunk_text(self, text: str) -> List[str]:
+        """
+        テキストをトークン数の上限に収まるようにチャンク化する
+        
+        Args:
+            text: チャンク化するテキスト
+        
+        Returns:
+            チャンク化されたテキストのリスト
+        """
+        sentences = [sentence for sentence in SENTENCE_BOUNDARY.split(text) if sentence]
+        pieces = [
+            piece
+            for sentence, tokens in zip(sentences, self.count_tokens(sentences))
+            for piece in self._split_sentence(sentence, tokens)
+        ]
+        
+        chunks = []
+        current: List[Tuple[str, int]] = []
+        current_tokens = 0
+        for piece, tokens in pieces:
+            if current and current_tokens + tokens > self.max_tokens:
+                chunks.append("".join(sentence for sentence, _ in current))
+                current = self._overlap(current, tokens)
+                current_tokens = sum(count for _, count in current)
+            current.append((piece, tokens))
+            current_tokens += tokens
+        if current:
+            chunks.append("".join(sentence for sentence, _ in current))
+        
+        chunks = [chunk.strip() for chunk in chunks if chunk.strip()]
+        return self._fit_window(chunks)
+
+
+def create_chunker(
+    method: str = "chars",
+    chunk_size: int = 500,
+    chunk_tokens: int = EMBEDDING_MAX_LENGTH,
+    overlap_tokens: int = 0
+):
+    """
+    チャンク化方式に応じたチャンカーを作成する
+    
+    tokens方式ではトークン化ステージと並行して使うため、専用のトークナイザをロードする。
+    """
+    if method == "chars":
+        return TextChunker(chunk_size)
+    if method == "tokens":
+        return TokenChunker(load_tokenizer(), chunk_tokens, overlap_tokens)
+    raise ValueError(f"未対応のチャンク化方式です: {method}")
+
+
+# 切断・タイムアウトなど、接続を使い続けられないFTPのエラー
+FTP_CONNECTION_ERRORS = (OSError, EOFError, error_temp, error_reply, error_proto)
+
+
+class FTPConnectionPool:
+    """
+    ログイン済みFTP接続の有界プール
+    
+    接続とログインはファイルごとではなく接続ごとに1回だけ行い、使い終わった接続は
+    次の処理で再利用する。切断された接続は捨て、次に借りるときに新しく接続する。
+    """
+    
+    def __init__(
+        self,
+        host: str,
+        port: int = 21,
+        user: str = "anonymous",
+        password: str = "",
+        size: int = 4,
+        timeout: float = 30.0
+    ):
         self.host = host
+        self.port = port
         self.user = user
         self.password = password
-    
-    def list_md_files(self, path: str) -> List[str]:
-        """FTPサーバー上のMarkdownファイルを再帰的に取得する"""
-        md_files = []
+        self.size = max(1, size)
+        self.timeout = timeout
         
-        with FTP(self.host) as ftp:
+        self._idle: List[FTP] = []
+        self._condition = threading.Condition()
+        self._open = 0
+    
+    def _connect(self) -> FTP:
+        """新しい接続を作成してログインする"""
+        ftp = FTP(timeout=self.timeout)
+        try:
+            ftp.connect(self.host, self.port)
             ftp.login(user=self.user, passwd=self.password)
-            md_files = self._list_md_files_recursive(ftp, path)
+        except BaseException:
+            ftp.close()
+            raise
+        return ftp
+    
+    def _acquire(self) -> FTP:
+        """プールから接続を取り出す（上限に達していれば返却を待つ）"""
+        with self._condition:
+            while not self._idle and self._open >= self.size:
+                self._condition.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._open += 1
         
-        return md_files
+        try:
+            return self._connect()
+        except BaseException:
+            self._discard(None)
+            raise
     
-    def _list_md_files_recursive(self, ftp: FTP, path: str) -> List[str]:
-        """FTPサーバー上のMarkdownファイルを再帰的に取得する（内部メソッド）"""
-        md_files = []
+    def _release(self, ftp: FTP):
+        """接続をプールに返却する"""
+        with self._condition:
+            self._idle.append(ftp)
+            self._condition.notify()
+    
+    def _discard(self, ftp: Optional[FTP]):
+        """使えなくなった接続を閉じ、空いた枠を待っているスレッドに知らせる"""
+        if ftp is not None:
+            ftp.close()
+        with self._condition:
+            self._open -= 1
+            self._condition.notify()
+    
+    @contextmanager
+    def connection(self) -> Iterator[FTP]:
+        """
+        プールからログイン済みの接続を借りる
         
+        error_perm（ファイルが存在しないなど）は接続を返却し、
+        それ以外の例外では転送途中の可能性があるため接続を捨てる。
+        """
+        ftp = self._acquire()
         try:
-            ftp.cwd(path)
-            items = ftp.nlst()
+            yield ftp
         except error_perm:
-            return []
+            self._release(ftp)
+            raise
+        except BaseException:
+            self._discard(ftp)
+            raise
+        else:
+            self._release(ftp)
+    
+    def run(self, operation: Callable[[FTP], Any], retries: int = 1) -> Any:
+        """接続を借りて処理を実行する（アイドル中に切断された接続は新しい接続で再試行する）"""
+        for attempt in range(retries + 1):
+            try:
+                with self.connection() as ftp:
+                    return operation(ftp)
+            except FTP_CONNECTION_ERRORS:
+                if attempt == retries:
+                    raise
+    
+    def close(self):
+        """アイドル中の接続をすべて閉じる"""
+        with self._condition:
+            idle = self._idle
+            self._idle = []
+            self._open -= len(idle)
+        for ftp in idle:
+            try:
+                ftp.quit()
+            except Exception:
+                ftp.close()
+
+
+def _parse_ftp_time(value: Optional[str]) -> Optional[float]:
+    """MLSDのmodifyファクト・MDTMの応答（YYYYMMDDHHMMSS[.sss]、UTC）をUNIX時刻にする"""
+    if not value:
+        return None
+    try:
+        moment = datetime.strptime(value[:14], "%Y%m%d%H%M%S").replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+    fraction = value[15:] if len(value) > 15 and value[14] == "." else ""
+    return moment.timestamp() + (float(f"0.{fraction}") if fraction.isdigit() else 0.0)
+
+
+def _parse_list_line(line: str) -> Optional[Tuple[str, str, Optional[int]]]:
+    """
+    LISTの1行を (名前, "dir" / "file", サイズ) にする
+    
+    Unix形式（drwxr-xr-x ... 名前）とDOS形式（日付 時刻 <DIR> 名前）に対応し、
+    シンボリックリンクや解析できない行はNoneを返す。
+    """
+    parts = line.split(None, 8)
+    if len(parts) == 9 and parts[0][:1] in ("d", "-"):
+        kind = "dir" if parts[0][0] == "d" else "file"
+        size = int(parts[4]) if parts[4].isdigit() else None
+        return parts[8], kind, size
+    
+    parts = line.split(None, 3)
+    if len(parts) == 4 and parts[0][:1].isdigit():
+        if parts[2].upper() == "<DIR>":
+            return parts[3], "dir", None
+        if parts[2].isdigit():
+            return parts[3], "file", int(parts[2])
+    return None
+
+
+class FTPMirror:
+    """
+    FTPサーバーのファイルを永続的に保持するローカルミラー
+    
+    リモートのパスごとにサイズと更新日時をインデックスに記録し、
+    どちらも一致するファイルはダウンロードせずローカルのコピーを使う。
+    サイズか更新日時が分からないファイルは一致を確認できないため毎回ダウンロードする。
+    """
+    
+    INDEX_FILE = ".mirror_index.json"
+    # インデックスを途中保存する更新件数（中断時に再ダウンロードする量を抑える）
+    SAVE_INTERVAL = 100
+    
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.index_path = os.path.join(directory, self.INDEX_FILE)
+        self.index: Dict[str, Dict[str, Any]] = {}
+        self.stats = {"reused": 0, "downloaded": 0, "pruned": 0}
+        self._lock = threading.Lock()
+        self._unsaved = 0
         
-        for item in items:
-            if item in ('.', '..'):
-                continue
-            
-            sub_path = path.rstrip('/') + '/' + item
-            
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.index_path):
             try:
-                ftp.cwd(sub_path)
-                # ディレクトリなら再帰
-                md_files.extend(self._list_md_files_recursive(ftp, sub_path))
-                ftp.cwd('..')
-            except error_perm:
-                # ファイルなら拡張子チェック
-                if item.lower().endswith('.md'):
-                    md_files.append(sub_path)
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    self.index = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️  FTPミラーのインデックスを読み込めないため作り直します: {e}")
+    
+    def local_path(self, remote_path: str) -> str:
+        """リモートのパスに対応するミラー内のパス"""
+        parts = [part for part in posixpath.normpath(remote_path).split("/") if part]
+        if not parts or ".." in parts:
+            raise ValueError(f"ミラーできないパスです: {remote_path}")
+        return os.path.join(self.directory, *parts)
+    
+    def lookup(self, remote_path: str, size: Optional[int], mtime: Optional[float]) -> Optional[bytes]:
+        """サイズと更新日時がインデックスと一致すればローカルのコピーを返す"""
+        if size is None or mtime is None:
+            return None
+        with self._lock:
+            entry = self.index.get(remote_path)
+        if not entry or entry["size"] != size or entry["mtime"] != mtime:
+            return None
         
-        return md_files
+        try:
+            with open(self.local_path(remote_path), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        # ローカルのコピーが書き換えられていれば使わない
+        if len(data) != size:
+            return None
+        with self._lock:
+            self.stats["reused"] += 1
+        return data
+    
+    def store(self, remote_path: str, size: Optional[int], mtime: Optional[float], data: bytes):
+        """ダウンロードした内容をミラーに書き込み、インデックスを更新する"""
+        local_path = self.local_path(remote_path)
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        # 書き込み途中のファイルが残らないよう、一時ファイルから置き換える
+        temp_path = f"{local_path}.{threading.get_ident()}.part"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, local_path)
+        
+        with self._lock:
+            self.index[remote_path] = {"size": size, "mtime": mtime}
+            self.stats["downloaded"] += 1
+            self._unsaved += 1
+            save = self._unsaved >= self.SAVE_INTERVAL
+        if save:
+            self.save()
+    
+    def prune(self, root: str, remote_paths: set):
+        """root配下でリモートから消えたファイルをミラーとインデックスから削除する"""
+        prefix = root.rstrip("/") + "/"
+        with self._lock:
+            removed = [
+                path for path in self.index
+                if path.startswith(prefix) and path not in remote_paths
+            ]
+            for path in removed:
+                del self.index[path]
+            self.stats["pruned"] += len(removed)
+            self._unsaved += len(removed)
+        
+        for path in removed:
+            try:
+                os.remove(self.local_path(path))
+            except (OSError, ValueError):
+                pass
+    
+    def save(self):
+        """インデックスを保存する"""
+        with self._lock:
+            data = json.dumps(self.index, ensure_ascii=False)
+            self._unsaved = 0
+        temp_path = f"{self.index_path}.{threading.get_ident()}.part"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(temp_path, self.index_path)
+
+
+class FTPDataSource:
+    """
+    FTPデータソースクラス
+    
+    ログイン済み接続のプールを使い、ディレクトリの走査とファイルの
+    ダウンロードを接続数だけ並行に行う。mirror_dirを指定すると、
+    前回からサイズ・更新日時が変わっていないファイルはローカルのミラーから読み込む。
+    """
+    
+    def __init__(
+        self,
+        host: str,
+        user: str = "anonymous",
+        password: str = "",
+        port: int = 21,
+        connections: int = 4,
+        timeout: float = 30.0,
+        mirror_dir: Optional[str] = None
+    ):
+        self.host = host
+        self.user = user
+        self.password = password
+        self.pool = FTPConnectionPool(host, port, user, password, connections, timeout)
+        self.mirror = FTPMirror(mirror_dir) if mirror_dir else None
+        # MLSDに対応していないサーバーでは最初の失敗以降LISTを使う
+        self._use_mlsd = True
+        # list_filesで得たパスごとのサイズ・更新日時（ミラーの一致判定に使う）
+        self._listing: Dict[str, Dict[str, Any]] = {}
+    
+    def _list_directory(self, ftp: FTP, path: str) -> List[Tuple[str, str, Optional[int], Optional[float]]]:
+        """
+        1ディレクトリの (名前, 種類, サイズ, 更新日時) の一覧を1回の要求で取得する
+        
+        MLSDでは種類・サイズ・更新日時がまとめて得られる。LISTの更新日時は
+        分単位かつタイムゾーンが不明なため使わない。
+        """
+        if self._use_mlsd:
+            try:
+                entries = []
+                for name, facts in ftp.mlsd(path, facts=["type", "size", "modify"]):
+                    kind = facts.get("type", "").lower()
+                    if kind in ("dir", "file"):
+                        size = facts.get("size")
+                        entries.append((
+                            name, kind,
+                            int(size) if size and size.isdigit() else None,
+                            _parse_ftp_time(facts.get("modify"))
+                        ))
+                return entries
+            except error_perm as e:
+                # 500/502: コマンド未対応、それ以外（550など）はディレクトリの問題
+                if not str(e).startswith(("500", "502")):
+                    raise
+                self._use_mlsd = False
+        
+        lines: List[str] = []
+        ftp.retrlines(f"LIST {path}", lines.append)
+        entries = []
+        for line in lines:
+            parsed = _parse_list_line(line)
+            if parsed:
+                name, kind, size = parsed
+                entries.append((name, kind, size, None))
+        return entries
+    
+    @staticmethod
+    def _stat_file(ftp: FTP, path: str) -> Tuple[Optional[int], Optional[float]]:
+        """SIZE・MDTMでファイルのサイズと更新日時を取得する（未対応ならNone）"""
+        size = mtime = None
+        try:
+            ftp.voidcmd("TYPE I")  # SIZEはバイナリモードでのみ正確
+            size = ftp.size(path)
+        except error_perm:
+            pass
+        try:
+            response = ftp.voidcmd(f"MDTM {path}")
+            mtime = _parse_ftp_time(response[4:].strip())
+        except error_perm:
+            pass
+        return size, mtime
+    
+    def list_files(self, path: str) -> List[Dict[str, Any]]:
+        """
+        FTPサーバー上のMarkdownファイルをファイル情報付きで再帰的に取得する
+        
+        ディレクトリは階層ごとにプールの接続数だけ並行に一覧を取得する。
+        MLSDに対応していないサーバーではsize/mtimeはNoneとなり、
+        差分構築では内容ハッシュで変更を判定する（ミラー使用時はSIZE・MDTMで補う）。
+        
+        Returns:
+            path, size, mtimeをキーに持つ辞書のリスト
+        """
+        files = []
+        failed = []
+        
+        def list_directory(directory: str):
+            try:
+                return directory, self.pool.run(lambda ftp: self._list_directory(ftp, directory))
+            except error_perm as e:
+                print(f"⚠️  FTPディレクトリ一覧の取得エラー ({directory}): {e}")
+                failed.append(directory)
+                return directory, []
+        
+        with ThreadPoolExecutor(max_workers=self.pool.size, thread_name_prefix="ftp-list") as executor:
+            directories = [path]
+            while directories:
+                subdirectories = []
+                for directory, entries in executor.map(list_directory, directories):
+                    for name, kind, size, mtime in entries:
+                        if name in (".", ".."):
+                            continue
+                        sub_path = directory.rstrip("/") + "/" + name
+                        if kind == "dir":
+                            subdirectories.append(sub_path)
+                        elif name.lower().endswith(".md"):
+                            # LISTのサイズだけでは未変更と判定できないため、mtimeがなければ使わない
+                            files.append({
+                                "path": sub_path,
+                                "size": size if mtime is not None else None,
+                                "mtime": mtime
+                            })
+                directories = subdirectories
+            
+            if self.mirror:
+                # LISTで走査した場合はミラーの一致判定のためにSIZE・MDTMを問い合わせる
+                unknown = [file_info for file_info in files if file_info["mtime"] is None]
+                stats = executor.map(
+                    lambda file_info: self.pool.run(lambda ftp: self._stat_file(ftp, file_info["path"])),
+                    unknown
+                )
+                for file_info, (size, mtime) in zip(unknown, stats):
+                    if size is not None and mtime is not None:
+                        file_info["size"] = size
+                        file_info["mtime"] = mtime
+                # 一覧を取得できなかったディレクトリがあれば、消えたファイルと区別できないため削除しない
+                if not failed:
+                    self.mirror.prune(path, {file_info["path"] for file_info in files})
+        
+        self._listing.update((file_info["path"], file_info) for file_info in files)
+        return files
+    
+    def list_md_files(self, path: str) -> List[str]:
+        """FTPサーバー上のMarkdownファイルを再帰的に取得する"""
+        return [file_info["path"] for file_info in self.list_files(path)]
+    
+    def _retrieve(self, remote_path: str, callback: Callable[[bytes], Any]):
+        """プールの接続でファイルを転送する"""
+        self.pool.run(lambda ftp: ftp.retrbinary(f"RETR {remote_path}", callback))
+    
+    def read_file(self, remote_path: str) -> str:
+        """FTPサーバー上のファイルをメモリに読み込む（ミラーが最新ならダウンロードしない）"""
+        file_info = self._listing.get(remote_path, {})
+        size, mtime = file_info.get("size"), file_info.get("mtime")
+        if self.mirror:
+            data = self.mirror.lookup(remote_path, size, mtime)
+            if data is not None:
+                return data.decode("utf-8")
+        
+        def retrieve(ftp: FTP):
+            # 再試行時に途中までの内容が残らないよう、試行ごとにバッファを作る
+            buffer = io.BytesIO()
+            ftp.retrbinary(f"RETR {remote_path}", buffer.write)
+            return buffer.getvalue()
+        
+        data = self.pool.run(retrieve)
+        if self.mirror:
+            self.mirror.store(remote_path, size, mtime, data)
+        return data.decode("utf-8")
+    
+    def read_files(self, paths: List[str]) -> Iterator[Tuple[str, Optional[str], Optional[Exception]]]:
+        """
+        ファイルを接続数だけ並行にダウンロードし、指定した順に返す
+        
+        先読みは接続数の2倍までに制限するため、後段の処理が遅くても
+        メモリに溜まる内容は一定に保たれる。
+        
+        Yields:
+            (path, content, error): 読み込みに失敗した場合はcontentがNoneでerrorに例外
+        """
+        executor = ThreadPoolExecutor(max_workers=self.pool.size, thread_name_prefix="ftp-download")
+        pending: deque = deque()
+        remaining = iter(paths)
+        try:
+            for path in islice(remaining, self.pool.size * 2):
+                pending.append((path, executor.submit(self.read_file, path)))
+            
+            while pending:
+                path, future = pending.popleft()
+                next_path = next(remaining, None)
+                if next_path is not None:
+                    pending.append((next_path, executor.submit(self.read_file, next_path)))
+                try:
+                    yield path, future.result(), None
+                except Exception as e:
+                    yield path, None, e
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
     
     def download_file(self, remote_path: str, local_path: str):
         """FTPサーバーからファイルをダウンロードする"""
-        with FTP(self.host) as ftp:
-            ftp.login(user=self.user, passwd=self.password)
+        def retrieve(ftp: FTP):
             with open(local_path, 'wb') as f:
                 ftp.retrbinary(f"RETR {remote_path}", f.write)
+        
+        self.pool.run(retrieve)
     
     def get_markdown_files(self, data_dir: str) -> Iterator[Tuple[str, str, str]]:
         """
@@ -157,15 +754,23 @@ class FTPDataSource:
         md_files = self.list_md_files(data_dir)
         print(f"📁 FTPから{len(md_files)}個のMarkdownファイルを発見")
         
-        with tempfile.TemporaryDirectory() as tmpdir:
-            for remote_path in md_files:
-                local_path = os.path.join(tmpdir, os.path.basename(remote_path))
-                self.download_file(remote_path, local_path)
-                
-                url, body = MarkdownParser.parse_markdown_with_url(local_path)
-                filename = os.path.basename(remote_path)
-                
-                yield url, body, filename
+        for remote_path, content, error in self.read_files(md_files):
+            if error is not None:
+                print(f"⚠️  ファイル読み込みエラー ({remote_path}): {error}")
+                continue
+            url, body = MarkdownParser.parse_markdown_text(content)
+            yield url, body, os.path.basename(remote_path)
+    
+    def close(self):
+        """プールの接続を閉じ、ミラーのインデックスを保存する"""
+        self.pool.close()
+        if self.mirror:
+            self.mirror.save()
+            stats = self.mirror.stats
+            print(
+                f"🪞 FTPミラー: ダウンロード {stats['downloaded']}件, "
+                f"再利用 {stats['reused']}件, 削除 {stats['pruned']}件 ({self.mirror.directory})"
+            )
 
 
 class LocalDataSource:
@@ -189,6 +794,44 @@ class LocalDataSource:
         
         return md_files
     
+    def list_files(self) -> List[Dict[str, Any]]:
+        """
+        ローカルのMarkdownファイルをファイル情報付きで取得する
+        
+        Returns:
+            path, size, mtimeをキーに持つ辞書のリスト
+        """
+        files = []
+        for file_path in self.list_md_files():
+            stat = os.stat(file_path)
+            files.append({
+                "path": file_path,
+                "size": stat.st_size,
+                "mtime": stat.st_mtime
+            })
+        return files
+    
+    def read_file(self, file_path: str) -> str:
+        """ローカルファイルを読み込む"""
+        with open(file_path, "r", encoding="utf-8") as f:
+            return f.read()
+    
+    def read_files(self, paths: List[str]) -> Iterator[Tuple[str, Optional[str], Optional[Exception]]]:
+        """
+        ファイルを指定した順に読み込む
+        
+        Yields:
+            (path, content, error): 読み込みに失敗した場合はcontentがNoneでerrorに例外
+        """
+        for path in paths:
+            try:
+                yield path, self.read_file(path), None
+            except Exception as e:
+                yield path, None, e
+    
+    def close(self):
+        """ローカルソースでは何もしない"""
+    
     def get_markdown_files(self) -> Iterator[Tuple[str, str, str]]:
         """
         ローカルディレクトリからMarkdownファイルを取得する
@@ -209,22 +852,149 @@ class LocalDataSource:
                 continue
 
 
+# パイプラインの終端を示す番兵
+_PIPELINE_END = object()
+
+
+class BuildPipeline:
+    """
+    有界キューで接続したステージをスレッドで並行実行するパイプライン
+    
+    いずれかのステージで例外が発生すると全ステージを停止し、
+    run()の呼び出し元で例外を再送出する。
+    """
+    
+    def __init__(self, queue_size: int = 4):
+        self.queue_size = queue_size
+        self._stop = threading.Event()
+        self._errors: List[BaseException] = []
+        self._threads: List[threading.Thread] = []
+    
+    def new_queue(self) -> queue.Queue:
+        """ステージ間を接続する有界キューを作成する"""
+        return queue.Queue(maxsize=self.queue_size)
+    
+    def put(self, q: queue.Queue, item: Any) -> bool:
+        """停止要求を確認しながらキューに追加する（停止時はFalse）"""
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def iterate(self, q: queue.Queue) -> Iterator[Any]:
+        """終端の番兵または停止要求までキューから取り出す"""
+        while not self._stop.is_set():
+            try:
+                item = q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _PIPELINE_END:
+                return
+            yield item
+    
+    def add_stage(self, name: str, target: Callable[[], None], output: queue.Queue):
+        """ステージを追加する（終了時にoutputへ番兵を送る）"""
+        def run():
+            try:
+                target()
+            except BaseException as e:
+                self._errors.append(e)
+                self._stop.set()
+            finally:
+                self.put(output, _PIPELINE_END)
+        
+        self._threads.append(threading.Thread(target=run, name=f"build-{name}", daemon=True))
+    
+    def run(self, consumer: Callable[[], None]):
+        """全ステージを起動し、呼び出しスレッドで最終ステージを実行する"""
+        for thread in self._threads:
+            thread.start()
+        try:
+            consumer()
+        except BaseException:
+            self._stop.set()
+            raise
+        finally:
+            if self._errors:
+                self._stop.set()
+            for thread in self._threads:
+                thread.join()
+        
+        if self._errors:
+            raise self._errors[0]
+
+
 class DatabaseBuilder:
     """データベース構築クラス"""
     
-    def __init__(self, db_path: str = SQLITE_DB_PATH):
+    def __init__(
+        self,
+        db_path: str = SQLITE_DB_PATH,
+        batch_size: int = None,
+        quantization: Optional[str] = None,
+        store_float: Optional[bool] = None,
+        reduced_dimension: Optional[int] = None,
+        projection: Optional[str] = None,
+        shards: Optional[int] = None,
+        shard_by: Optional[str] = None,
+        profiler: Optional[BuildProfiler] = None,
+        chunker: Optional[str] = None,
+        chunk_tokens: Optional[int] = None,
+        chunk_overlap: Optional[int] = None
+    ):
         self.db_path = db_path
-        self.model_manager = EmbeddingModelManager()
-        self.chunker = TextChunker()
-    
-    def initialize_database(self) -> sqlite3.Connection:
-        """sqlite-vecデータベースを初期化する"""
-        # 既存のDBファイルがあれば削除
-        if os.path.exists(self.db_path):
-            os.remove(self.db_path)
+        self.model_manager = EmbeddingModelManager(open_persistent_cache())
+        
+        build_config = ConfigManager.get_build_config()
+        
+        # チャンク化の設定（chars: 文字数 / tokens: トークン数）
+        self.chunker_method = chunker or build_config["chunker"]
+        if self.chunker_method not in CHUNKERS:
+            raise ValueError(f"未対応のチャンク化方式です: {self.chunker_method}")
+        self.chunk_size = build_config["chunk_size"]
+        self.chunk_tokens = chunk_tokens or build_config["chunk_tokens"]
+        self.chunk_overlap = build_config["chunk_overlap"] if chunk_overlap is None else chunk_overlap
+        self.chunker = create_chunker(
+            self.chunker_method, self.chunk_size, self.chunk_tokens, self.chunk_overlap
+        )
+        self.batch_size = batch_size or build_config["embedding_batch_size"]
+        self.queue_size = build_config["pipeline_queue_size"]
+        self.window_size = self.batch_size * build_config["pipeline_window_batches"]
+        
+        # 量子化ベクトルの設定（"none" / "int8" / "bit"）
+        self.quantization = quantization or build_config["quantization"]
+        self.store_float = build_config["store_float"] if store_float is None else store_float
+        self.calibration_size = build_config["calibration_size"]
+        self.cache_mb = build_config["cache_mb"]
+        self.quantizer: Optional[VectorQuantizer] = None
+        
+        # 次元削減列の設定（0で無効）
+        self.reduced_dimension = (
+            build_config["reduced_dimension"] if reduced_dimension is None else reduced_dimension
+        )
+        self.projection = projection or build_config["projection"]
+        self.projector: Optional[VectorProjector] = None
+        self.filter_columns: List[str] = list(FILTER_COLUMNS)
+        
+        # シャード分割の設定（1で単一DB）
+        self.shards = shards or build_config["shards"]
+        self.shard_by = shard_by or build_config["shard_by"]
+        if self.shard_by not in SHARD_KEYS:
+            raise ValueError(f"未対応のシャード分割方式です: {self.shard_by}")
         
+        # 全シャードで一意なチャンクIDの次の値
+        self._next_id = 1
+        
+        # 処理段階ごとの時間計測（無効の場合は何もしない）
+        self.profiler = profiler or BuildProfiler(enabled=False)
+    
+    def _connect(self, path: str) -> sqlite3.Connection:
+        """sqlite-vec拡張を読み込んだ接続を作成する"""
         # SQLiteデータベースに接続
-        conn = sqlite3.connect(self.db_path)
+        conn = sqlite3.connect(path)
         
         # 拡張機能の読み込みを有効化
         conn.enable_load_extension(True)
@@ -235,14 +1005,63 @@ class DatabaseBuilder:
         # 拡張機能の読み込みを無効化（セキュリティのため）
         conn.enable_load_extension(False)
         
+        # vec0はパーティション・列ごとのチャンク（1024行分のBLOB）に書き込むため、
+        # ページキャッシュが小さいと挿入のたびにチャンクを読み直す
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_mb) * 1024}")
+        
+        return conn
+    
+    def _vector_indexes(self) -> List[str]:
+        """docsテーブルに持たせるベクトル列（宣言順）"""
+        indexes = []
+        if self.store_float:
+            indexes.append("float")
+        if self.quantizer:
+            indexes.append(self.quantizer.method)
+        if self.projector:
+            indexes.append("reduced")
+        return indexes
+    
+    def _setup_indexes(self):
+        """構築するベクトル列に応じて量子化・射影の設定を用意する"""
+        if self.quantization == "none":
+            if not self.store_float:
+                raise ValueError("量子化なしの場合はfloatベクトルの保存が必要です")
+            self.quantizer = None
+        else:
+            self.quantizer = VectorQuantizer(self.quantization)
+        
+        self.projector = None
+        if self.reduced_dimension:
+            self.projector = VectorProjector(self.projection, self.reduced_dimension)
+    
+    def _create_schema(self, conn: sqlite3.Connection, shard_index: int = 0):
+        """テーブルを作成する"""
+        # 検索側は読み取り専用接続のため、永続的な設定は構築時に行う
+        conn.execute("PRAGMA page_size=4096")  # sqlite-vecベンチマークで使用
+        conn.execute("PRAGMA journal_mode=WAL")
+        
+        vector_columns = []
+        if self.store_float:
+            vector_columns.append(f"embedding float[{EMBEDDING_DIMENSION}]")
+        if self.quantizer:
+            vector_columns.append(self.quantizer.column_definition(EMBEDDING_DIMENSION))
+        if self.projector:
+            vector_columns.append(self.projector.column_definition())
+        
         # vec0仮想テーブルを作成
+        # パーティションごとにチャンク（1024行分のベクトル領域）が確保されるため、パーティション
+        # キーは種類の少ないsourceだけにする（サイトごとに分けると小さなサイトが多い場合に
+        # DBサイズと絞り込みなしのKNN時間が大幅に増える）。site/sectionの条件もKNN内で適用される
         conn.execute(f"""
             CREATE VIRTUAL TABLE docs USING vec0(
-                embedding float[{EMBEDDING_DIMENSION}],
+                {", ".join(vector_columns)},
                 chunk_text TEXT,
                 url TEXT,
                 file_name TEXT,
-                source TEXT
+                source TEXT partition key,
+                site TEXT,
+                section TEXT
             )
         """)
         
@@ -253,102 +1072,787 @@ class DatabaseBuilder:
                 url TEXT,
                 file_name TEXT,
                 source TEXT,
+                site TEXT,
+                section TEXT,
                 chunk_text TEXT
             )
         """)
         
-        conn.commit()
-        return conn
+        self._create_lexical_index(conn)
+        
+        # 差分構築用のファイルマニフェスト
+        conn.execute("""
+            CREATE TABLE file_manifest (
+                path TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime REAL,
+                content_hash TEXT,
+                chunk_ids TEXT
+            )
+        """)
+        
+        # 検索側が参照するインデックス設定（ベクトル列、量子化パラメータなど）
+        conn.execute("""
+            CREATE TABLE index_settings (
+                key TEXT PRIMARY KEY,
+                value BLOB
+            )
+        """)
+        self.filter_columns = list(FILTER_COLUMNS)
+        save_index_settings(conn, {
+            "vector_indexes": self._vector_indexes(),
+            "filter_columns": self.filter_columns,
+            "quantization": self.quantization,
+            "projection": self.projector.method if self.projector else "none",
+            "shards": self.shards,
+            "shard_by": self.shard_by,
+            "shard_index": shard_index,
+            "backend": self.model_manager.backend_name,
+            **self._chunker_settings()
+        })
+        if self.projector and self.projector.is_fitted:
+            save_index_settings(conn, self.projector.to_settings())
     
-    def build_database(self):
-        """データベースを構築する"""
-        config = ConfigManager.get_data_source_config()
+    def _chunker_settings(self) -> Dict[str, Any]:
+        """index_settingsに保存するチャンク化の設定"""
+        return {
+            "chunker": self.chunker_method,
+            "chunk_size": self.chunk_size,
+            "chunk_tokens": self.chunk_tokens,
+            "chunk_overlap": self.chunk_overlap
+        }
+    
+    def _inherit_chunker(self, settings: Dict[str, Any]):
+        """
+        既存DBのチャンク化の設定を引き継ぐ
+        
+        1つのインデックスに異なる方式のチャンクが混ざらないようにする。
+        設定を持たない既存DBは文字数方式（chars）で構築されている。
+        """
+        inherited = {
+            "chunker": settings.get("chunker", "chars"),
+            "chunk_size": settings.get("chunk_size", self.chunk_size),
+            "chunk_tokens": settings.get("chunk_tokens", self.chunk_tokens),
+            "chunk_overlap": settings.get("chunk_overlap", self.chunk_overlap)
+        }
+        if inherited == self._chunker_settings():
+            return
+        
+        print(f"ℹ️  既存DBのチャンク化の設定を引き継ぎます ({inherited['chunker']})")
+        self.chunker_method = inherited["chunker"]
+        self.chunk_size = inherited["chunk_size"]
+        self.chunk_tokens = inherited["chunk_tokens"]
+        self.chunk_overlap = inherited["chunk_overlap"]
+        self.chunker = create_chunker(
+            self.chunker_method, self.chunk_size, self.chunk_tokens, self.chunk_overlap
+        )
+    
+    def _create_lexical_index(self, conn: sqlite3.Connection):
+        """
+        doc_metadataのchunk_textを対象とするFTS5全文検索インデックスを作成する
+        
+        日本語は単語区切りがないためtrigramトークナイザを使う。
+        本文はdoc_metadataを参照する外部コンテンツとし、トリガーで同期する。
+        """
+        conn.execute("""
+            CREATE VIRTUAL TABLE docs_fts USING fts5(
+                chunk_text,
+                content='doc_metadata',
+                content_rowid='id',
+                tokenize='trigram'
+            )
+        """)
+        conn.execute("""
+            CREATE TRIGGER doc_metadata_fts_insert AFTER INSERT ON doc_metadata BEGIN
+                INSERT INTO docs_fts (rowid, chunk_text) VALUES (new.id, new.chunk_text);
+            END
+        """)
+        conn.execute("""
+            CREATE TRIGGER doc_metadata_fts_delete AFTER DELETE ON doc_metadata BEGIN
+                INSERT INTO docs_fts (docs_fts, rowid, chunk_text)
+                VALUES ('delete', old.id, old.chunk_text);
+            END
+        """)
+    
+    @staticmethod
+    def _remove_database_files(path: str):
+        """DBファイルとWAL・共有メモリファイルを削除する"""
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    
+    def _staging_path(self) -> str:
+        """全件構築中のDBのパス（完了後にdb_pathへ置き換える）"""
+        stem, ext = os.path.splitext(self.db_path)
+        return f"{stem}.building{ext}"
+    
+    def initialize_database(self, db_path: Optional[str] = None) -> List[sqlite3.Connection]:
+        """
+        sqlite-vecデータベースを初期化する
+        
+        Args:
+            db_path: 作成先のパス（省略時はself.db_path）
+        
+        Returns:
+            シャードごとの接続（シャード数1なら db_path への接続のみ）
+        """
+        db_path = db_path or self.db_path
+        
+        # 既存のDBファイル（単一DB・シャード）があれば削除
+        for path in [db_path] + find_shard_paths(db_path):
+            self._remove_database_files(path)
+        
+        self._setup_indexes()
+        conns = []
+        for shard_index, path in enumerate(shard_paths(db_path, self.shards)):
+            conn = self._connect(path)
+            self._create_schema(conn, shard_index)
+            conn.commit()
+            conns.append(conn)
+        
+        self._next_id = 1
+        return conns
+    
+    def _discard_staging(self, staging_path: str):
+        """失敗・中断した全件構築のDBを削除する"""
+        for path in [staging_path] + find_shard_paths(staging_path):
+            self._remove_database_files(path)
+    
+    def _publish_database(self, staging_path: str):
+        """
+        全件構築したDBで既存のDB（単一DB・シャード）を置き換える
+        
+        ファイルごとにos.replaceで置き換えるため、検索中のプロセスは
+        置き換え前のファイルを開いたまま読み続けられる。
+        """
+        targets = shard_paths(self.db_path, self.shards)
+        # シャード数が変わった場合に残る古いファイルを削除
+        for path in [self.db_path] + find_shard_paths(self.db_path):
+            if path not in targets:
+                self._remove_database_files(path)
+        
+        for source, target in zip(shard_paths(staging_path, self.shards), targets):
+            # 古いDBのWALが新しいDBに適用されないよう先に削除する
+            for suffix in ("-wal", "-shm"):
+                if os.path.exists(target + suffix):
+                    os.remove(target + suffix)
+            os.replace(source, target)
+            for suffix in ("-wal", "-shm"):
+                if os.path.exists(source + suffix):
+                    os.remove(source + suffix)
+    
+    def open_database(self) -> Optional[List[sqlite3.Connection]]:
+        """
+        差分構築用に既存のデータベース（またはシャード）を開く
+        
+        Returns:
+            シャードごとの接続。マニフェストを持たない（差分構築できない）場合はNone
+        """
+        if os.path.exists(self.db_path):
+            paths = [self.db_path]
+        else:
+            paths = find_shard_paths(self.db_path)
+        if not paths:
+            return None
+        
+        conns = [self._connect(path) for path in paths]
+        for conn in conns:
+            has_manifest = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name='file_manifest'"
+            ).fetchone()
+            if not has_manifest:
+                print("⚠️  既存DBにファイルマニフェストがありません")
+                for opened in conns:
+                    opened.close()
+                return None
+        
+        settings = load_index_settings(conns[0])
         
+        # 推論バックエンドごとにベクトルがわずかに異なるため、既存DBと同じバックエンドでなければ
+        # 差分構築できない（設定を持たない既存DBはtorchで構築されている）
+        backend = settings.get("backend", "torch")
+        if backend != self.model_manager.backend_name:
+            print(
+                f"⚠️  既存DBの推論バックエンド（{backend}）と異なります"
+                f"（{self.model_manager.backend_name}）"
+            )
+            for conn in conns:
+                conn.close()
+            return None
+        
+        # 既存DBのシャード構成を引き継ぐ（揃っていなければ差分構築できない）
+        shards = settings.get("shards", 1)
+        if shards != len(conns):
+            print(f"⚠️  シャードファイルが揃っていません（{len(conns)}/{shards}）")
+            for conn in conns:
+                conn.close()
+            return None
+        shard_by = settings.get("shard_by", "hash")
+        if shards != self.shards or (shards > 1 and shard_by != self.shard_by):
+            print(f"ℹ️  既存DBのシャード構成を引き継ぎます ({shards}シャード, {shard_by})")
+        self.shards = shards
+        self.shard_by = shard_by
+        
+        # 既存DBのベクトル列・量子化・射影パラメータを引き継ぐ
+        self.store_float = "float" in settings.get("vector_indexes", ["float"])
+        self.quantizer = VectorQuantizer.from_settings(settings)
+        self.quantization = self.quantizer.method if self.quantizer else "none"
+        self.projector = VectorProjector.from_settings(settings)
+        self.reduced_dimension = self.projector.dimension if self.projector else 0
+        # site/section列を持たない既存DBではそれらを書き込まない
+        self.filter_columns = settings.get("filter_columns", LEGACY_FILTER_COLUMNS)
+        
+        # 既存DBと同じ方式でチャンク化する
+        self._inherit_chunker(settings)
+        
+        # バックエンドとチャンク化の設定を持たない既存DBには記録しておく
+        for conn in conns:
+            conn.execute("CREATE TABLE IF NOT EXISTS index_settings (key TEXT PRIMARY KEY, value BLOB)")
+            save_index_settings(conn, {"backend": backend, **self._chunker_settings()})
+        
+        for conn in conns:
+            # 全文検索インデックスを持たない既存DBには作成して既存行から構築する
+            has_lexical_index = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name='docs_fts'"
+            ).fetchone()
+            if not has_lexical_index:
+                print("🔤 全文検索インデックスを作成中...")
+                self._create_lexical_index(conn)
+                conn.execute("INSERT INTO docs_fts (docs_fts) VALUES ('rebuild')")
+                conn.commit()
+        
+        # 新しいチャンクには全シャードの最大IDより大きいIDを振る
+        self._next_id = max(
+            conn.execute("SELECT COALESCE(MAX(id), 0) FROM doc_metadata").fetchone()[0]
+            for conn in conns
+        ) + 1
+        
+        return conns
+    
+    def _load_manifest(self, conns: List[sqlite3.Connection]) -> Dict[str, Dict[str, Any]]:
+        """全シャードのファイルマニフェストを読み込む（shardは格納先のシャード番号）"""
+        manifest = {}
+        for shard_index, conn in enumerate(conns):
+            for path, size, mtime, content_hash, chunk_ids in conn.execute(
+                "SELECT path, size, mtime, content_hash, chunk_ids FROM file_manifest"
+            ):
+                manifest[path] = {
+                    "size": size,
+                    "mtime": mtime,
+                    "content_hash": content_hash,
+                    "chunk_ids": json.loads(chunk_ids),
+                    "shard": shard_index
+                }
+        return manifest
+    
+    def _open_data_source(self, config: Dict[str, Any]):
+        """設定に応じたデータソースとファイル一覧を取得する"""
         print("📋 データソース設定:")
         print(f"  使用するソース: {'FTP' if config['use_ftp_source'] else 'ローカル'}")
         
         if config['use_ftp_source']:
-            print(f"  FTPホスト: {config['ftp_host']}")
+            print(f"  FTPホスト: {config['ftp_host']}:{config['ftp_port']} (接続数: {config['ftp_connections']})")
             print(f"  FTPディレクトリ: {config['ftp_data_dir']}")
+            print(f"  FTPミラー: {config['ftp_mirror_dir'] or 'なし'}")
             data_source = FTPDataSource(
                 config['ftp_host'], 
                 config['ftp_user'], 
-                config['ftp_pass']
+                config['ftp_pass'],
+                port=config['ftp_port'],
+                connections=config['ftp_connections'],
+                timeout=config['ftp_timeout'],
+                mirror_dir=config['ftp_mirror_dir'] or None
             )
-            markdown_files = data_source.get_markdown_files(config['ftp_data_dir'])
+            files = data_source.list_files(config['ftp_data_dir'])
             source_type = "ftp"
+            data_root = config['ftp_data_dir']
         else:
             print(f"  ローカルディレクトリ: {config['local_dir']}")
             data_source = LocalDataSource(config['local_dir'])
-            markdown_files = data_source.get_markdown_files()
+            files = data_source.list_files()
             source_type = "local"
+            data_root = config['local_dir']
         
-        # データベースを初期化
-        conn = self.initialize_database()
-        
-        # データを収集
-        texts = []
-        metadatas = []
+        print(f"📁 {len(files)}個のMarkdownファイルを発見")
+        return data_source, files, source_type, data_root
+    
+    def _delete_chunks(self, conn: sqlite3.Connection, chunk_ids: List[int]):
+        """チャンクをdocsとdoc_metadata（トリガーでdocs_ftsも）から削除する"""
+        rows = [(chunk_id,) for chunk_id in chunk_ids]
+        with self.profiler.stage("delete", len(rows)):
+            conn.executemany("DELETE FROM docs WHERE rowid = ?", rows)
+            conn.executemany("DELETE FROM doc_metadata WHERE id = ?", rows)
+    
+    def _insert_chunk(
+        self,
+        conn: sqlite3.Connection,
+        text: str,
+        embedding: List[float],
+        metadata: Dict[str, str]
+    ) -> int:
+        """チャンクを挿入し、docsとdoc_metadataで共通のIDを返す"""
+        metadata_columns = ["url", "file_name", "source"]
+        if "site" in self.filter_columns:
+            metadata_columns.extend(["site", "section"])
+        metadata_values = [metadata[column] for column in metadata_columns]
         
-        try:
-            for url, body, filename in markdown_files:
-                chunks = self.chunker.chunk_text(body)
-                for chunk in chunks:
-                    texts.append(chunk)
-                    metadatas.append({
-                        "url": url,
-                        "file_name": filename,
-                        "source": source_type
-                    })
-        except Exception as e:
-            print(f"⚠️  データ取得エラー: {e}")
-            conn.close()
-            return
+        # シャードをまたいで一意になるようIDを採番してメタデータテーブルに挿入
+        chunk_id = self._next_id
+        self._next_id += 1
+        # 全文検索インデックスへの追加もトリガーによりここで行われる
+        with self.profiler.stage("insert_metadata", 1):
+            conn.execute(f"""
+                INSERT INTO doc_metadata (id, {", ".join(metadata_columns)}, chunk_text)
+                VALUES ({", ".join(["?"] * (len(metadata_columns) + 2))})
+            """, [chunk_id] + metadata_values + [text])
         
-        if not texts:
-            print("⚠️  処理するテキストが見つかりませんでした")
-            conn.close()
-            return
+        # ベクトル列の値を用意
+        columns = ["rowid"]
+        placeholders = ["?"]
+        values = [chunk_id]
         
-        print(f"🔄 {len(texts)}個のチャンクの埋め込みを生成中...")
-        
-        # バッチ処理でデータベースに挿入
-        for i, (text, metadata) in enumerate(tqdm(
-            zip(texts, metadatas),
-            total=len(texts),
-            desc="埋め込み生成・挿入",
-            unit="チャンク",
-            ncols=80
-        )):
-            # 埋め込みベクトルを生成
-            embedding = self.model_manager.get_embedding(text)
+        with self.profiler.stage("serialize", 1):
+            if self.store_float:
+                # sqlite-vecのserialize_float32を使用してベクトルをシリアライズ
+                columns.append("embedding")
+                placeholders.append("?")
+                values.append(sqlite_vec.serialize_float32(embedding))
             
-            # sqlite-vecのserialize_float32を使用してベクトルをシリアライズ
-            embedding_blob = sqlite_vec.serialize_float32(embedding)
+            if self.quantizer:
+                columns.append(self.quantizer.column)
+                placeholders.append(f"{self.quantizer.sql_constructor}(?)")
+                values.append(self.quantizer.quantize(embedding))
             
-            # vec0仮想テーブルに挿入
+            if self.projector:
+                columns.append(self.projector.column)
+                placeholders.append("?")
+                values.append(self.projector.project(embedding))
+        
+        columns.append("chunk_text")
+        columns.extend(metadata_columns)
+        placeholders.extend(["?"] * (len(metadata_columns) + 1))
+        values.append(text)
+        values.extend(metadata_values)
+        
+        # vec0仮想テーブルに同じrowidで挿入
+        with self.profiler.stage("insert_vectors", 1):
+            conn.execute(f"""
+                INSERT INTO docs ({", ".join(columns)})
+                VALUES ({", ".join(placeholders)})
+            """, values)
+        
+        return chunk_id
+    
+    def _write_manifest_entry(
+        self,
+        conn: sqlite3.Connection,
+        file_info: Dict[str, Any],
+        content_hash: str,
+        chunk_ids: List[int]
+    ):
+        """マニフェストのエントリを書き込む"""
+        with self.profiler.stage("manifest", 1):
             conn.execute("""
-                INSERT INTO docs (embedding, chunk_text, url, file_name, source)
+                INSERT OR REPLACE INTO file_manifest (path, size, mtime, content_hash, chunk_ids)
                 VALUES (?, ?, ?, ?, ?)
             """, (
-                embedding_blob, 
-                text, 
-                metadata["url"], 
-                metadata["file_name"], 
-                metadata["source"]
+                file_info["path"],
+                file_info["size"],
+                file_info["mtime"],
+                content_hash,
+                json.dumps(chunk_ids)
             ))
+    
+    def _read_documents(
+        self,
+        data_source,
+        files: List[Dict[str, Any]],
+        manifest: Dict[str, Dict[str, Any]],
+        source_type: str,
+        data_root: str,
+        stats: Dict[str, int]
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        読み込み・解析・チャンク化ステージ
+        
+        マニフェストと一致するファイルはchunksをNoneにしてマニフェスト更新のみ行わせる。
+        サイズと更新日時が一致するファイルは読み込み自体を省略する。
+        FTPでは後続のファイルのダウンロードを解析・チャンク化と並行して行う。
+        """
+        to_read = []
+        for file_info in files:
+            entry = manifest.get(file_info["path"])
             
-            # メタデータテーブルにも挿入
-            conn.execute("""
-                INSERT INTO doc_metadata (url, file_name, source, chunk_text)
-                VALUES (?, ?, ?, ?)
-            """, (
-                metadata["url"], 
-                metadata["file_name"], 
-                metadata["source"], 
-                text
-            ))
+            # サイズと更新日時が一致すれば内容を読まずにスキップ
+            if (
+                entry
+                and file_info["size"] is not None
+                and entry["size"] == file_info["size"]
+                and entry["mtime"] == file_info["mtime"]
+            ):
+                stats["unchanged"] += 1
+                continue
+            to_read.append(file_info)
+        
+        contents = data_source.read_files([file_info["path"] for file_info in to_read])
+        try:
+            for file_info in to_read:
+                entry = manifest.get(file_info["path"])
+                
+                file_start = time.perf_counter()
+                with self.profiler.stage("read", 1):
+                    _, content, error = next(contents)
+                if error is not None:
+                    print(f"⚠️  ファイル読み込みエラー ({file_info['path']}): {error}")
+                    continue
+                with self.profiler.stage("hash", 1):
+                    content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+                
+                document = {
+                    "file_info": file_info,
+                    "content_hash": content_hash,
+                    "chunks": None
+                }
+                
+                # 内容が同じならファイル情報だけ更新
+                if entry and entry["content_hash"] == content_hash:
+                    stats["unchanged"] += 1
+                    yield document
+                    continue
+                
+                with self.profiler.stage("parse", 1):
+                    url, body = MarkdownParser.parse_markdown_text(content)
+                    site, section = MarkdownParser.derive_site_section(
+                        url, self._relative_path(file_info["path"], data_root, source_type)
+                    )
+                with self.profiler.stage("chunk", 1):
+                    document["chunks"] = self.chunker.chunk_text(body)
+                self.profiler.record_file(
+                    file_info["path"], time.perf_counter() - file_start,
+                    len(content.encode("utf-8")), len(document["chunks"])
+                )
+                document["metadata"] = {
+                    "url": url,
+                    "file_name": os.path.basename(file_info["path"]),
+                    "source": source_type,
+                    "site": site,
+                    "section": section
+                }
+                stats["changed"] += 1
+                yield document
+        finally:
+            # 途中で停止した場合も先読み中のダウンロードを止める
+            contents.close()
+    
+    @staticmethod
+    def _relative_path(path: str, data_root: str, source_type: str) -> str:
+        """データディレクトリからの相対パス（FTPのパスは常に/区切り）"""
+        if source_type == "ftp":
+            return posixpath.relpath(path, data_root)
+        return os.path.relpath(path, data_root)
+    
+    def _tokenize_window(self, documents: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        トークン化ステージ: ウィンドウ内のチャンクを長さ順のバッチにする
+        
+        永続キャッシュにあるチャンクはトークン化せず、キャッシュの埋め込みを使う。
+        """
+        texts = [
+            chunk
+            for document in documents
+            for chunk in (document["chunks"] or [])
+        ]
+        with self.profiler.stage("cache_lookup", len(texts)):
+            embeddings = self.model_manager.get_cached_embeddings(texts)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        missing_texts = [texts[i] for i in missing]
+        with self.profiler.stage("tokenize", len(missing_texts)):
+            batches = self.model_manager.tokenize_batches(missing_texts, self.batch_size)
+        
+        return {
+            "documents": documents,
+            "embeddings": embeddings,
+            "missing": missing,
+            "missing_texts": missing_texts,
+            "batches": batches
+        }
+    
+    def _embed_window(self, window: Dict[str, Any]) -> Dict[str, Any]:
+        """埋め込みステージ: バッチを順伝播して入力順の埋め込みに戻す"""
+        computed: List[Optional[List[float]]] = [None] * len(window["missing"])
+        for indices, inputs in window["batches"]:
+            with self.profiler.stage("forward", len(indices)):
+                batch_embeddings = self.model_manager.embed_tokenized(inputs)
+            for i, embedding in zip(indices, batch_embeddings):
+                computed[i] = embedding
+        
+        with self.profiler.stage("cache_store", len(computed)):
+            self.model_manager.cache_embeddings(window["missing_texts"], computed)
+        
+        embeddings = window["embeddings"]
+        for i, embedding in zip(window["missing"], computed):
+            embeddings[i] = embedding
+        
+        return {"documents": window["documents"], "embeddings": embeddings}
+    
+    def _needs_calibration(self) -> bool:
+        """量子化・射影パラメータの推定が必要かどうか"""
+        return (
+            (self.quantizer is not None and not self.quantizer.is_fitted)
+            or (self.projector is not None and not self.projector.is_fitted)
+        )
+    
+    def _calibrate(self, conns: List[sqlite3.Connection], windows: List[Dict[str, Any]]):
+        """先頭のウィンドウの埋め込みから量子化・射影パラメータを推定して全シャードに保存する"""
+        sample = [
+            embedding
+            for window in windows
+            for embedding in window["embeddings"]
+        ][:self.calibration_size]
+        if not sample:
+            return
+        
+        with self.profiler.stage("calibrate", len(sample)):
+            self._fit_parameters(conns, sample)
+    
+    def _fit_parameters(self, conns: List[sqlite3.Connection], sample: List[List[float]]):
+        """量子化・射影パラメータを推定して全シャードに保存する"""
+        if self.quantizer and not self.quantizer.is_fitted:
+            self.quantizer.fit(sample)
+            for conn in conns:
+                save_index_settings(conn, self.quantizer.to_settings())
+            print(f"📐 量子化パラメータを推定しました ({self.quantizer.method}, {len(sample)}件)")
+        
+        if self.projector and not self.projector.is_fitted:
+            self.projector.fit(sample)
+            for conn in conns:
+                save_index_settings(conn, self.projector.to_settings())
+            print(
+                f"📐 射影行列を推定しました "
+                f"({self.projector.method}, {self.projector.dimension}次元, {len(sample)}件)"
+            )
+    
+    def _shard_index(self, document: Dict[str, Any]) -> int:
+        """文書の格納先シャード（ファイル単位でパスまたはサイトのハッシュにより決める）"""
+        if self.shards == 1:
+            return 0
+        if self.shard_by == "site":
+            return shard_for_key(document["metadata"]["site"], self.shards)
+        return shard_for_key(document["file_info"]["path"], self.shards)
+    
+    def _write_window(
+        self,
+        conns: List[sqlite3.Connection],
+        window: Dict[str, Any],
+        manifest: Dict[str, Dict[str, Any]]
+    ) -> int:
+        """挿入ステージ: ファイル単位で古いチャンクを置き換え、マニフェストを更新する"""
+        embeddings = window["embeddings"]
+        offset = 0
+        
+        for document in window["documents"]:
+            file_info = document["file_info"]
+            old_entry = manifest.get(file_info["path"])
+            
+            if document["chunks"] is None:
+                self._write_manifest_entry(
+                    conns[old_entry["shard"]], file_info,
+                    document["content_hash"], old_entry["chunk_ids"]
+                )
+                continue
+            
+            shard_index = self._shard_index(document)
+            conn = conns[shard_index]
+            if old_entry:
+                old_conn = conns[old_entry["shard"]]
+                self._delete_chunks(old_conn, old_entry["chunk_ids"])
+                # サイトが変わり格納先シャードが移る場合は古いマニフェストも消す
+                if old_entry["shard"] != shard_index:
+                    old_conn.execute(
+                        "DELETE FROM file_manifest WHERE path = ?", (file_info["path"],)
+                    )
+            
+            chunk_ids = []
+            for chunk in document["chunks"]:
+                chunk_ids.append(self._insert_chunk(
+                    conn, chunk, embeddings[offset], document["metadata"]
+                ))
+                offset += 1
+            
+            self._write_manifest_entry(conn, file_info, document["content_hash"], chunk_ids)
+        
+        return offset
+    
+    def build_database(self, incremental: bool = False):
+        """
+        データベースを構築する
+        
+        読み込み・解析・チャンク化 → トークン化 → 埋め込み → 挿入 の各ステージを
+        有界キューで接続して並行実行するため、コーパスの大きさによらず
+        メモリ使用量は一定に保たれる。
+        
+        Args:
+            incremental: Trueの場合、マニフェストと比較して追加・変更された
+                ファイルだけを再埋め込みし、削除されたファイルの行を取り除く
+        """
+        config = ConfigManager.get_data_source_config()
+        data_source, files, source_type, data_root = self._open_data_source(config)
+        
+        # データベースを初期化（差分構築時は既存DBを開く）
+        conns = self.open_database() if incremental else None
+        staging_path = None
+        if conns is None:
+            if incremental:
+                print("⚠️  差分構築できる既存DBがないため、全件構築します")
+                incremental = False
+            # 全件構築は別名のDBに行い、完了後に置き換える（失敗しても既存DBは残る）
+            staging_path = self._staging_path()
+            conns = self.initialize_database(staging_path)
+        if self.shards > 1:
+            print(f"🧩 シャード数: {self.shards} (分割方式: {self.shard_by})")
+        
+        manifest = self._load_manifest(conns)
+        
+        # ソースから消えたファイルの行を削除
+        listed_paths = {file_info["path"] for file_info in files}
+        deleted_paths = [path for path in manifest if path not in listed_paths]
+        for path in deleted_paths:
+            conn = conns[manifest[path]["shard"]]
+            self._delete_chunks(conn, manifest[path]["chunk_ids"])
+            conn.execute("DELETE FROM file_manifest WHERE path = ?", (path,))
+        
+        print(
+            f"🔄 パイプライン構築開始 (バッチサイズ: {self.batch_size}, "
+            f"ウィンドウ: {self.window_size}チャンク, キュー長: {self.queue_size}, "
+            f"チャンク化: {self.chunker_method})"
+        )
+        
+        stats = {"changed": 0, "unchanged": 0, "chunks": 0}
+        pipeline = BuildPipeline(self.queue_size)
+        document_queue = pipeline.new_queue()
+        tokenized_queue = pipeline.new_queue()
+        embedded_queue = pipeline.new_queue()
+        
+        def read_stage():
+            for document in self._read_documents(
+                data_source, files, manifest, source_type, data_root, stats
+            ):
+                if not pipeline.put(document_queue, document):
+                    return
+        
+        def tokenize_stage():
+            window = []
+            window_chunks = 0
+            for document in pipeline.iterate(document_queue):
+                window.append(document)
+                window_chunks += len(document["chunks"] or [])
+                if window_chunks >= self.window_size:
+                    if not pipeline.put(tokenized_queue, self._tokenize_window(window)):
+                        return
+                    window = []
+                    window_chunks = 0
+            if window:
+                pipeline.put(tokenized_queue, self._tokenize_window(window))
+        
+        def embed_stage():
+            with self.profiler.trace_forward():
+                for window in pipeline.iterate(tokenized_queue):
+                    if not pipeline.put(embedded_queue, self._embed_window(window)):
+                        return
+        
+        def write_stage():
+            # 量子化パラメータの推定に使うまで保留するウィンドウ
+            pending = []
+            
+            with tqdm(
+                desc="埋め込み生成・挿入",
+                unit="チャンク",
+                ncols=80
+            ) as pbar:
+                def write(windows):
+                    for window in windows:
+                        written = self._write_window(conns, window, manifest)
+                        stats["chunks"] += written
+                        pbar.update(written)
+                
+                for window in pipeline.iterate(embedded_queue):
+                    if not self._needs_calibration():
+                        write([window])
+                        continue
+                    
+                    pending.append(window)
+                    if sum(len(w["embeddings"]) for w in pending) >= self.calibration_size:
+                        self._calibrate(conns, pending)
+                        write(pending)
+                        pending = []
+                
+                if pending:
+                    self._calibrate(conns, pending)
+                    write(pending)
+        
+        pipeline.add_stage("read", self.profiler.thread("read", read_stage), document_queue)
+        pipeline.add_stage(
+            "tokenize", self.profiler.thread("tokenize", tokenize_stage), tokenized_queue
+        )
+        pipeline.add_stage("embed", self.profiler.thread("embed", embed_stage), embedded_queue)
+        
+        build_start = time.time()
+        try:
+            pipeline.run(self.profiler.thread("write", write_stage))
+        except BaseException:
+            # 差分構築はコミットしていないため、接続を閉じると変更が取り消される
+            for conn in conns:
+                conn.close()
+            if staging_path:
+                self._discard_staging(staging_path)
+            print("⚠️  構築に失敗したため、既存のDBは変更していません")
+            raise
+        finally:
+            data_source.close()
+        build_time = time.time() - build_start
+        
+        if incremental:
+            print(
+                f"🔍 差分: 変更/追加 {stats['changed']}件, "
+                f"未変更 {stats['unchanged']}件, 削除 {len(deleted_paths)}件"
+            )
+        elif stats["chunks"] == 0:
+            print("⚠️  処理するテキストが見つかりませんでした（既存のDBは変更していません）")
+            for conn in conns:
+                conn.close()
+            self._discard_staging(staging_path)
+            return
+        
+        with self.profiler.stage("finalize", len(conns)):
+            for conn in conns:
+                conn.execute("INSERT INTO docs_fts (docs_fts) VALUES ('optimize')")  # FTS5セグメントの統合
+                conn.commit()
+                conn.execute("PRAGMA optimize")  # クエリプランナー最適化
+                conn.close()  # 最後の接続を閉じるとWALがDB本体に書き戻される
+            if staging_path:
+                self._publish_database(staging_path)
+        if stats["chunks"] and build_time > 0:
+            throughput = stats["chunks"] / build_time
+            print(f"⚡ スループット: {throughput:.1f}チャンク/秒 ({build_time:.1f}s)")
+        print(f"✅ sqlite-vec構築完了: {stats['chunks']}件のチャンクを追加しました。")
         
-        conn.commit()
-        conn.close()
-        print(f"✅ sqlite-vec構築完了: {len(texts)}件のチャンクを追加しました。")
\ No newline at end of file
+        self.profiler.finish({
+            "source": source_type,
+            "files": len(files),
+            "changed": stats["changed"],
+            "unchanged": stats["unchanged"],
+            "deleted": len(deleted_paths),
+            "chunks": stats["chunks"],
+            "pipeline_seconds": build_time,
+            "chunks_per_second": stats["chunks"] / build_time if build_time > 0 else 0.0,
+            "incremental": incremental,
+            "batch_size": self.batch_size,
+            "window_size": self.window_size,
+            "queue_size": self.queue_size,
+            "quantization": self.quantization,
+            "store_float": self.store_float,
+            "reduced_dimension": self.reduced_dimension,
+            "shards": self.shards,
+            "backend": self.model_manager.backend_name,
+            "chunker": self.chunker_method
+        })
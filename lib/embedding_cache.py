@@ -0,0 +1,379 @@
+"""
+埋め込みベクトルのキャッシュモジュール
+
+このモジュールは以下の機能を提供します:
+- バイト数上限・TTL付きのメモリ内LRUキャッシュ
+- SQLiteファイルへの埋め込みベクトルの永続キャッシュ
+- (モデル名, リビジョン, 正規化テキストのハッシュ) をキーとした検索
+- 容量制限に基づくLRU退避と統計情報の取得
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+
+
+# 最終アクセス時刻をまとめて書き込む間隔（秒）
+ACCESS_FLUSH_SECONDS = 60.0
+
+
+def normalize_text(text: str) -> str:
+    """キャッシュキー用にテキストを正規化する"""
+    return unicodedata.normalize("NFC", text).strip()
+
+
+class LRUEmbeddingCache:
+    """
+    バイト数で容量を制限するメモリ内LRUキャッシュクラス
+    
+    ベクトルはfloat32のarrayとして保持するため、Pythonのfloatリストに比べて
+    1要素あたりのメモリ使用量が小さい。複数スレッドから利用できる。
+    """
+    
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, ttl: Optional[float] = None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl if ttl else None
+        self._entries: "OrderedDict[str, Tuple[array, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    @staticmethod
+    def _entry_size(text: str, vector: array) -> int:
+        """エントリの概算バイト数"""
+        return len(vector) * vector.itemsize + len(text.encode("utf-8"))
+    
+    def get(self, text: str) -> Optional[List[float]]:
+        """キャッシュされた埋め込みを取得する（なければNone）"""
+        with self._lock:
+            entry = self._entries.get(text)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            vector, stored_at = entry
+            if self.ttl is not None and time.time() - stored_at > self.ttl:
+                self._remove_locked(text)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(text)
+            self.hits += 1
+            return vector.tolist()
+    
+    def put(self, text: str, embedding: List[float]):
+        """埋め込みを保存し、上限を超えた分を古い順に退避する"""
+        vector = array("f", embedding)
+        size = self._entry_size(text, vector)
+        if size > self.max_bytes:
+            return
+        
+        with self._lock:
+            if text in self._entries:
+                self._remove_locked(text)
+            
+            self._entries[text] = (vector, time.time())
+            self._bytes += size
+            
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove_locked(oldest)
+                self.evictions += 1
+    
+    def _remove_locked(self, text: str):
+        """ロック取得済みの状態でエントリを削除する"""
+        vector, _ = self._entries.pop(text)
+        self._bytes -= self._entry_size(text, vector)
+    
+    def __contains__(self, text: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(text)
+            if entry is None:
+                return False
+            return self.ttl is None or time.time() - entry[1] <= self.ttl
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def clear(self):
+        """全エントリを削除する"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        """ヒット率などの統計情報を取得する"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+class PersistentEmbeddingCache:
+    """
+    SQLiteに埋め込みベクトルを永続化するキャッシュクラス
+    
+    検索DBとは別ファイルに保存するため、DBの再構築やサーバーの再起動後も
+    キャッシュが残る。複数スレッドから利用できる。
+    
+    ヒット時の最終アクセス時刻はメモリに溜め、保存・退避・終了時または
+    ACCESS_FLUSH_SECONDSごとにまとめて書き込む（検索のたびに書き込まない）。
+    """
+    
+    def __init__(
+        self,
+        path: str,
+        model_name: str,
+        revision: str,
+        max_bytes: int = 1024 * 1024 * 1024
+    ):
+        self.path = path
+        self.model_name = model_name
+        self.revision = revision
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._pending_access: Dict[str, float] = {}  # 未書き込みの最終アクセス時刻
+        self._last_flush = time.time()
+        self._closed = False
+        
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                revision TEXT,
+                embedding BLOB,
+                size INTEGER,
+                created_at REAL,
+                last_access REAL
+            )
+        """)
+        self._connection.execute("""
+            CREATE INDEX IF NOT EXISTS idx_embedding_cache_last_access
+            ON embedding_cache (last_access)
+        """)
+        self._connection.commit()
+        
+        self._total_bytes = self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM embedding_cache"
+        ).fetchone()[0]
+    
+    def make_key(self, text: str) -> str:
+        """(モデル名, リビジョン, 正規化テキスト) からキャッシュキーを作成する"""
+        material = "\0".join([self.model_name, self.revision, normalize_text(text)])
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+    
+    def get(self, text: str) -> Optional[List[float]]:
+        """キャッシュされた埋め込みを取得する（なければNone）"""
+        return self.get_many([text])[0]
+    
+    def get_many(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        複数テキストの埋め込みをまとめて取得する
+        
+        Returns:
+            入力順に並んだ埋め込み（キャッシュにないものはNone）
+        """
+        if not texts:
+            return []
+        
+        keys = [self.make_key(text) for text in texts]
+        found: Dict[str, List[float]] = {}
+        
+        with self._lock:
+            # SQLiteの変数上限を超えないよう分割して問い合わせ
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._connection.execute(
+                    f"SELECT key, embedding FROM embedding_cache WHERE key IN ({placeholders})",
+                    chunk
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+            
+            if found:
+                now = time.time()
+                self._pending_access.update(dict.fromkeys(found, now))
+                if now - self._last_flush >= ACCESS_FLUSH_SECONDS:
+                    self._flush_access_locked()
+                    self._connection.commit()
+        
+        return [found.get(key) for key in keys]
+    
+    def __contains__(self, text: str) -> bool:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT 1 FROM embedding_cache WHERE key = ?", (self.make_key(text),)
+            ).fetchone()
+        return row is not None
+    
+    def put(self, text: str, embedding: List[float]):
+        """埋め込みをキャッシュに保存する"""
+        self.put_many([text], [embedding])
+    
+    def put_many(self, texts: List[str], embeddings: List[List[float]]):
+        """複数の埋め込みをまとめてキャッシュに保存する"""
+        if not texts:
+            return
+        
+        now = time.time()
+        # 同じテキストが複数含まれる場合は1行にまとめる（容量の二重計上を防ぐ）
+        rows: Dict[str, Tuple] = {}
+        for text, embedding in zip(texts, embeddings):
+            blob = array("f", embedding).tobytes()
+            key = self.make_key(text)
+            rows[key] = (key, self.model_name, self.revision, blob, len(blob), now, now)
+        
+        with self._lock:
+            # SQLiteの変数上限を超えないよう分割して問い合わせ
+            keys = list(rows)
+            replaced = 0
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                replaced += self._connection.execute(
+                    f"SELECT COALESCE(SUM(size), 0) FROM embedding_cache WHERE key IN ({placeholders})",
+                    chunk
+                ).fetchone()[0]
+            self._connection.executemany("""
+                INSERT OR REPLACE INTO embedding_cache
+                    (key, model, revision, embedding, size, created_at, last_access)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, rows.values())
+            self._total_bytes += sum(row[4] for row in rows.values()) - replaced
+            for key in rows:
+                self._pending_access.pop(key, None)
+            self._flush_access_locked()
+            
+            if self._total_bytes > self.max_bytes:
+                self._evict_locked(self.max_bytes)
+            self._connection.commit()
+    
+    def evict(self, max_bytes: Optional[int] = None) -> int:
+        """
+        最終アクセスの古い順にエントリを削除し、容量を上限以下にする
+        
+        Args:
+            max_bytes: 目標とする最大容量（省略時はインスタンスの上限）
+        
+        Returns:
+            削除したエントリ数
+        """
+        with self._lock:
+            self._flush_access_locked()
+            removed = self._evict_locked(self.max_bytes if max_bytes is None else max_bytes)
+            self._connection.commit()
+        return removed
+    
+    def flush(self):
+        """溜めた最終アクセス時刻を書き込む"""
+        with self._lock:
+            if self._closed or not self._pending_access:
+                return
+            self._flush_access_locked()
+            self._connection.commit()
+    
+    def _flush_access_locked(self):
+        """ロック取得済みの状態で、溜めた最終アクセス時刻を書き込む（コミットは呼び出し元）"""
+        if self._pending_access:
+            self._connection.executemany(
+                "UPDATE embedding_cache SET last_access = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self._pending_access.items()]
+            )
+            self._pending_access = {}
+        self._last_flush = time.time()
+    
+    def _evict_locked(self, max_bytes: int) -> int:
+        """ロック取得済みの状態で退避を行う"""
+        excess = self._total_bytes - max_bytes
+        if excess <= 0:
+            return 0
+        
+        victims = []
+        freed = 0
+        for key, size in self._connection.execute(
+            "SELECT key, size FROM embedding_cache ORDER BY last_access"
+        ):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        
+        self._connection.executemany("DELETE FROM embedding_cache WHERE key = ?", victims)
+        self._total_bytes -= freed
+        return len(victims)
+    
+    def clear(self) -> int:
+        """全エントリを削除する"""
+        with self._lock:
+            self._pending_access = {}
+            removed = self._connection.execute("DELETE FROM embedding_cache").rowcount
+            self._connection.commit()
+            self._connection.execute("VACUUM")
+            self._total_bytes = 0
+        return removed
+    
+    def stats(self) -> Dict[str, Any]:
+        """キャッシュの統計情報を取得する"""
+        with self._lock:
+            if self._pending_access:
+                self._flush_access_locked()
+                self._connection.commit()
+            entries, total_bytes, oldest, newest = self._connection.execute("""
+                SELECT COUNT(*), COALESCE(SUM(size), 0), MIN(last_access), MAX(last_access)
+                FROM embedding_cache
+            """).fetchone()
+            models = self._connection.execute("""
+                SELECT model, revision, COUNT(*), SUM(size)
+                FROM embedding_cache
+                GROUP BY model, revision
+            """).fetchall()
+        
+        return {
+            "path": self.path,
+            "entries": entries,
+            "bytes": total_bytes,
+            "max_bytes": self.max_bytes,
+            "file_bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+            "oldest_access": oldest,
+            "newest_access": newest,
+            "models": [
+                {"model": model, "revision": revision, "entries": count, "bytes": size}
+                for model, revision, count, size in models
+            ]
+        }
+    
+    def close(self):
+        """溜めた最終アクセス時刻を書き込み、キャッシュの接続を閉じる"""
+        with self._lock:
+            if self._closed:
+                return
+            self._flush_access_locked()
+            self._connection.commit()
+            self._connection.close()
+            self._closed = True
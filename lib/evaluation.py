@@ -0,0 +1,156 @@
+"""
+検索品質評価モジュール
+
+このモジュールは以下の機能を提供します:
+- recall@k・逆順位（MRR）の計算（同距離の近傍を考慮した版を含む）
+- 全ベクトルの総当たりによる厳密な近傍（正解）の計算
+- 正解集合に対する検索結果の比較
+- 埋め込みベクトルのコサイン類似度による比較
+- レイテンシのパーセンタイルの計算
+"""
+
+import math
+from typing import List, Sequence, Iterable, Tuple, Collection
+
+import numpy as np
+
+
+def recall_at_k(truth_ids: Sequence[int], result_ids: Sequence[int], k: int) -> float:
+    """
+    正解の上位k件のうち、検索結果の上位k件に含まれる割合
+    
+    Args:
+        truth_ids: 正解（厳密検索）の結果IDリスト
+        result_ids: 評価対象の検索結果IDリスト
+        k: 評価する件数
+    
+    Returns:
+        0.0〜1.0のrecall
+    """
+    truth = set(truth_ids[:k])
+    if not truth:
+        return 1.0
+    return len(truth & set(result_ids[:k])) / len(truth)
+
+
+def reciprocal_rank(truth_ids: Collection[int], result_ids: Sequence[int]) -> float:
+    """
+    正解（最近傍、同距離のものが複数あればそのいずれか）が検索結果に最初に現れる順位の逆数
+    
+    現れなければ0.0。クエリ集合での平均がMRR（Mean Reciprocal Rank）となる。
+    """
+    for rank, result_id in enumerate(result_ids, 1):
+        if result_id in truth_ids:
+            return 1.0 / rank
+    return 0.0
+
+
+def tied_neighbors(
+    truth_ids: Sequence[int],
+    truth_distances: Sequence[float],
+    k: int,
+    tolerance: float = 1e-5
+) -> List[int]:
+    """
+    上位k件の正解に、k番目と同じ距離の近傍を加えたIDリスト
+    
+    重複したチャンクのように距離が等しい近傍はどれを返しても正しいため、
+    recallの計算ではk番目と同距離のものも正解とみなす。
+    """
+    if not truth_ids:
+        return []
+    k = min(k, len(truth_ids))
+    threshold = truth_distances[k - 1] + tolerance * max(1.0, abs(truth_distances[k - 1]))
+    return list(truth_ids[:k]) + [
+        truth_id for truth_id, distance in zip(truth_ids[k:], truth_distances[k:])
+        if distance <= threshold
+    ]
+
+
+def tied_recall_at_k(
+    truth_ids: Sequence[int],
+    truth_distances: Sequence[float],
+    result_ids: Sequence[int],
+    k: int
+) -> float:
+    """
+    k番目と同距離の近傍も正解とみなすrecall@k
+    
+    Args:
+        truth_ids: 厳密検索の結果IDリスト（kより多めに取得しておく）
+        truth_distances: truth_idsの距離
+        result_ids: 評価対象の検索結果IDリスト
+        k: 評価する件数
+    
+    Returns:
+        0.0〜1.0のrecall
+    """
+    accepted = set(tied_neighbors(truth_ids, truth_distances, k))
+    expected = min(k, len(truth_ids))
+    if not expected:
+        return 1.0
+    return sum(1 for result_id in result_ids[:k] if result_id in accepted) / expected
+
+
+def exact_neighbors(
+    batches: Iterable[Tuple[np.ndarray, np.ndarray]],
+    queries: Sequence[Sequence[float]],
+    k: int
+) -> Tuple[List[List[int]], List[List[float]]]:
+    """
+    全ベクトルとのL2距離を総当たりで計算し、クエリごとの厳密な上位k件を求める
+    
+    ベクトルはバッチごとに処理し、それまでの上位k件とだけ比較するため、
+    メモリ使用量はコーパスの大きさによらない。
+    
+    Args:
+        batches: (IDの配列, ベクトルの行列) のイテラブル
+        queries: クエリベクトル
+        k: 求める件数
+    
+    Returns:
+        (クエリごとの距離の小さい順のIDリスト, 各IDのL2距離)
+    """
+    # 展開した式は桁落ちしやすいため、float64で計算する
+    query_matrix = np.asarray(queries, dtype=np.float64)
+    query_norms = (query_matrix ** 2).sum(axis=1, keepdims=True)
+    best_ids = np.empty((len(query_matrix), 0), dtype=np.int64)
+    best_distances = np.empty((len(query_matrix), 0), dtype=np.float64)
+    
+    for ids, vectors in batches:
+        vectors = vectors.astype(np.float64)
+        # ||q - x||^2 = ||q||^2 - 2 q・x + ||x||^2
+        distances = query_norms - 2.0 * (query_matrix @ vectors.T) + (vectors ** 2).sum(axis=1)
+        candidate_ids = np.concatenate([best_ids, np.broadcast_to(ids, distances.shape)], axis=1)
+        candidate_distances = np.concatenate([best_distances, distances], axis=1)
+        
+        count = min(k, candidate_distances.shape[1])
+        top = np.argpartition(candidate_distances, count - 1, axis=1)[:, :count]
+        best_ids = np.take_along_axis(candidate_ids, top, axis=1)
+        best_distances = np.take_along_axis(candidate_distances, top, axis=1)
+    
+    order = np.argsort(best_distances, axis=1, kind="stable")
+    distances = np.sqrt(np.maximum(np.take_along_axis(best_distances, order, axis=1), 0.0))
+    return np.take_along_axis(best_ids, order, axis=1).tolist(), distances.tolist()
+
+
+def mean(values: List[float]) -> float:
+    """空リストでは0.0を返す平均"""
+    return sum(values) / len(values) if values else 0.0
+
+
+def cosine_similarity(a: Sequence[float], b: Sequence[float]) -> float:
+    """2本のベクトルのコサイン類似度（どちらかがゼロベクトルなら0.0）"""
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """ソート済みの値のpパーセンタイル（線形補間）"""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * p / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
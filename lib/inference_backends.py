@@ -0,0 +1,221 @@
+"""
+推論バックエンドモジュール
+
+このモジュールは以下の機能を提供します:
+- PyTorch（float32 / bfloat16）による埋め込みモデルの推論
+- ONNX Runtime（float32 / int8動的量子化）による推論
+- 設定値からのバックエンドの選択
+
+torch・transformers・onnxruntimeはimportに数秒かかるため、
+モデルをロードするときに初めてimportする。
+"""
+
+import os
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+
+INFERENCE_BACKENDS = ("torch", "torch-bf16", "onnx", "onnx-int8")
+# ONNXバックエンドごとのモデルファイル名（ONNX_MODEL_DIR内）
+ONNX_MODEL_FILES = {
+    "onnx": "model.onnx",
+    "onnx-int8": "model.int8.onnx"
+}
+
+
+def mean_pool(hidden: np.ndarray, attention_mask: np.ndarray) -> List[List[float]]:
+    """パディング位置を除外して隠れ状態の平均を取る（numpy版）"""
+    mask = attention_mask[..., None].astype(np.float32)
+    summed = (hidden.astype(np.float32) * mask).sum(axis=1)
+    counts = np.maximum(mask.sum(axis=1), 1.0)
+    return (summed / counts).tolist()
+
+
+def cpu_supports_bf16() -> Optional[bool]:
+    """CPUがbfloat16演算命令（AVX512-BF16 / AMX）に対応しているか（判定できない場合はNone）"""
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            flags = f.read()
+    except OSError:
+        return None
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+
+def cache_revision(revision: str, backend: str) -> str:
+    """
+    埋め込みキャッシュのキーに使うリビジョン文字列
+    
+    バックエンドごとに出力がわずかに異なるため、torch（float32）以外では
+    バックエンド名を付けて別のエントリとして保存する。
+    """
+    return revision if backend == "torch" else f"{revision}+{backend}"
+
+
+class InferenceBackend:
+    """推論バックエンドの基底クラス"""
+    
+    name = "base"
+    tensor_type = "pt"  # トークナイザに要求するテンソルの種類
+    
+    def __init__(self):
+        self.device = "cpu"
+    
+    def load(self, model_name: str, revision: str):
+        """モデルをロードする"""
+        raise NotImplementedError
+    
+    def embed(self, inputs: Dict[str, Any]) -> List[List[float]]:
+        """トークン化済みの入力から平均プーリングした埋め込みを計算する"""
+        raise NotImplementedError
+
+
+class TorchBackend(InferenceBackend):
+    """PyTorchによる推論（float32またはbfloat16）"""
+    
+    tensor_type = "pt"
+    
+    def __init__(self, dtype: str = "float32", num_threads: int = 0):
+        super().__init__()
+        self.name = "torch" if dtype == "float32" else "torch-bf16"
+        self.dtype_name = dtype
+        self.dtype = None
+        self.num_threads = num_threads
+        self.model = None
+    
+    def load(self, model_name: str, revision: str):
+        import torch
+        from transformers import AutoModel
+        
+        self.dtype = getattr(torch, self.dtype_name)
+        if self.num_threads > 0:
+            torch.set_num_threads(self.num_threads)
+        
+        self.model = AutoModel.from_pretrained(
+            model_name,
+            trust_remote_code=True,
+            revision=revision,
+            torch_dtype=self.dtype
+        )
+        
+        # デバイス自動判定
+        self.device = self._detect_device()
+        if self.dtype == torch.bfloat16 and self.device == "cpu" and cpu_supports_bf16() is False:
+            print("⚠️  CPUがbfloat16命令に対応していないため、float32より遅くなる可能性があります")
+        self.model = self.model.to(self.device)
+        
+        # モデルを評価モードに設定（推論最適化）
+        self.model.eval()
+    
+    def _detect_device(self) -> str:
+        """最適なデバイスを自動判定する"""
+        import torch
+        
+        if torch.cuda.is_available():
+            gpu_name = torch.cuda.get_device_name(0)
+            print(f"🚀 GPU使用: {gpu_name} (CUDA {torch.version.cuda})")
+            return "cuda"
+        elif hasattr(torch.backends, "mps") and torch.backends.mps.is_available():
+            print("🚀 GPU使用: Apple Metal Performance Shaders (MPS)")
+            return "mps"
+        else:
+            print("⚠️  CPU使用: GPUが利用できません")
+            return "cpu"
+    
+    def embed(self, inputs: Dict[str, Any]) -> List[List[float]]:
+        import torch
+        
+        inputs = {k: v.to(self.device) for k, v in inputs.items()}
+        
+        with torch.no_grad():
+            # 推論最適化のためのコンテキスト
+            if self.device == "cuda" and self.dtype == torch.float32:
+                with torch.cuda.amp.autocast():
+                    outputs = self.model(**inputs)
+            else:
+                outputs = self.model(**inputs)
+            
+            hidden = outputs.last_hidden_state
+            # パディング位置を除外して平均を取る
+            mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+            summed = (hidden * mask).sum(dim=1)
+            counts = mask.sum(dim=1).clamp(min=1)
+            embeddings = (summed.float() / counts.float()).cpu().tolist()
+        
+        return embeddings
+
+
+class OnnxBackend(InferenceBackend):
+    """
+    ONNX Runtime（CPU）による推論
+    
+    export_onnx.pyで変換したモデル（last_hidden_stateを出力）を読み込む。
+    onnxruntimeは任意依存のため、このバックエンドを使うときだけimportする。
+    """
+    
+    tensor_type = "np"
+    
+    def __init__(self, name: str, model_path: str, num_threads: int = 0):
+        super().__init__()
+        self.name = name
+        self.model_path = model_path
+        self.num_threads = num_threads
+        self.session = None
+        self.input_names: List[str] = []
+    
+    def load(self, model_name: str, revision: str):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise RuntimeError(
+                "ONNXバックエンドにはonnxruntimeが必要です（uv sync --extra onnx）"
+            ) from e
+        
+        if not os.path.exists(self.model_path):
+            raise FileNotFoundError(
+                f"ONNXモデルが見つかりません: {self.model_path}（export_onnx.pyで作成してください）"
+            )
+        
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        # 0の場合はonnxruntimeの既定値（物理コア数）を使う
+        if self.num_threads > 0:
+            options.intra_op_num_threads = self.num_threads
+        options.inter_op_num_threads = 1
+        
+        self.session = ort.InferenceSession(
+            self.model_path,
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [node.name for node in self.session.get_inputs()]
+        threads = self.num_threads or "auto"
+        print(f"⚙️  ONNX Runtime: {os.path.basename(self.model_path)} (intra-op threads: {threads})")
+    
+    def embed(self, inputs: Dict[str, Any]) -> List[List[float]]:
+        feed = {name: np.asarray(inputs[name], dtype=np.int64) for name in self.input_names}
+        hidden = self.session.run(["last_hidden_state"], feed)[0]
+        return mean_pool(hidden, feed["attention_mask"])
+
+
+def create_backend(name: str, onnx_dir: str, num_threads: int = 0) -> InferenceBackend:
+    """
+    名前から推論バックエンドを作成する
+    
+    Args:
+        name: torch / torch-bf16 / onnx / onnx-int8
+        onnx_dir: ONNXモデルの格納ディレクトリ
+        num_threads: 推論スレッド数（0で各ランタイムの既定値）
+    
+    Returns:
+        未ロードの推論バックエンド
+    """
+    if name not in INFERENCE_BACKENDS:
+        raise ValueError(f"未対応の推論バックエンドです: {name}")
+    
+    if name == "torch":
+        return TorchBackend("float32", num_threads)
+    if name == "torch-bf16":
+        return TorchBackend("bfloat16", num_threads)
+    return OnnxBackend(name, os.path.join(onnx_dir, ONNX_MODEL_FILES[name]), num_threads)
@@ -0,0 +1,382 @@
+"""
+メトリクスモジュール
+
+このモジュールは以下の機能を提供します:
+- カウンタ・ゲージ・ヒストグラムによる処理時間と件数の記録
+- 取得時に値を計算するゲージ（キュー長やキャッシュ統計など）
+- Prometheusのテキスト形式での出力とJSON向けの要約
+
+記録はロック1回と数回の加算で済むため、検索のホットパスで使っても
+オーバーヘッドは無視できる。ラベル付きの系列はlabelsで事前に取得しておくと
+記録のたびにラベルを解決する必要がない。
+"""
+
+import math
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Tuple, Callable, Iterator, Sequence
+
+
+# 処理時間（秒）のヒストグラムのバケット境界
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+# 件数（バッチの大きさなど）のヒストグラムのバケット境界
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+def _format_value(value: float) -> str:
+    """Prometheusのテキスト形式の数値表現"""
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    """ラベル値のエスケープ"""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    """{name="value",...} 形式のラベル文字列"""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """メトリクスの基底クラス"""
+    
+    type_name = "untyped"
+    
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], Any] = {}
+    
+    def _new_child(self) -> Any:
+        raise NotImplementedError
+    
+    def labels(self, **labels: str) -> Any:
+        """ラベル値に対応する系列を取得する（なければ作成する）"""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+    
+    def _default(self) -> Any:
+        """ラベルなしのメトリクスの系列"""
+        if self.labelnames:
+            raise ValueError(f"{self.name}にはラベルの指定が必要です: {', '.join(self.labelnames)}")
+        return self.labels()
+    
+    def _items(self) -> List[Tuple[Tuple[str, ...], Any]]:
+        with self._lock:
+            return sorted(self._children.items())
+    
+    def render(self) -> List[str]:
+        """Prometheusのテキスト形式の行"""
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type_name}"]
+        for key, child in self._items():
+            lines.extend(self._render_child(key, child))
+        return lines
+    
+    def _render_child(self, key: Tuple[str, ...], child: Any) -> List[str]:
+        return [f"{self.name}{_label_text(self.labelnames, key)} {_format_value(child.get())}"]
+    
+    def snapshot(self) -> Any:
+        """JSON向けの値（ラベルなしなら値、ラベル付きなら "a=x,b=y" をキーとする辞書）"""
+        if not self.labelnames:
+            child = self._children.get(())
+            return self._snapshot_child(child) if child is not None else None
+        return {
+            ",".join(f"{name}={value}" for name, value in zip(self.labelnames, key)):
+                self._snapshot_child(child)
+            for key, child in self._items()
+        }
+    
+    def _snapshot_child(self, child: Any) -> Any:
+        return child.get()
+
+
+class _Value:
+    """カウンタ・ゲージの1系列"""
+    
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+    
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+    
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self._value -= amount
+    
+    def set(self, value: float):
+        with self._lock:
+            self._value = value
+    
+    def get(self) -> float:
+        return self._value
+
+
+class _FunctionValue:
+    """取得時に関数を呼んで値を求める系列"""
+    
+    def __init__(self, function: Callable[[], float]):
+        self.function = function
+    
+    def get(self) -> float:
+        try:
+            return float(self.function())
+        except Exception:
+            return math.nan
+
+
+class Counter(Metric):
+    """単調増加するカウンタ"""
+    
+    type_name = "counter"
+    
+    def _new_child(self) -> _Value:
+        return _Value()
+    
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+
+class Gauge(Metric):
+    """増減する値（関数を指定すると取得時に値を計算する）"""
+    
+    type_name = "gauge"
+    
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        function: Optional[Callable[[], float]] = None
+    ):
+        super().__init__(name, help_text, labelnames)
+        if function is not None:
+            self._children[()] = _FunctionValue(function)
+    
+    def _new_child(self) -> _Value:
+        return _Value()
+    
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+    
+    def dec(self, amount: float = 1.0):
+        self._default().dec(amount)
+    
+    def set(self, value: float):
+        self._default().set(value)
+    
+    @contextmanager
+    def track_inprogress(self) -> Iterator[None]:
+        """ブロックの実行中だけ値を1増やす"""
+        child = self._default()
+        child.inc()
+        try:
+            yield
+        finally:
+            child.dec()
+
+
+class FunctionCounter(Counter):
+    """取得時に関数を呼んで値を求めるカウンタ（既存の統計値の公開用）"""
+    
+    def __init__(self, name: str, help_text: str, function: Callable[[], float]):
+        super().__init__(name, help_text)
+        self._children[()] = _FunctionValue(function)
+
+
+class _HistogramValue:
+    """ヒストグラムの1系列"""
+    
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # 最後は+Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+    
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """ブロックの実行時間（秒）を記録する"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+    
+    def state(self) -> Tuple[List[int], float]:
+        with self._lock:
+            return list(self.counts), self.sum
+    
+    def quantile(self, counts: List[int], q: float) -> float:
+        """バケット内の線形補間による分位点の推定値"""
+        total = sum(counts)
+        if not total:
+            return 0.0
+        rank = q * total
+        cumulative = 0
+        for index, count in enumerate(counts):
+            if cumulative + count >= rank and count:
+                lower = self.bounds[index - 1] if index > 0 else 0.0
+                if index == len(self.bounds):
+                    return lower  # +Infのバケットは上限が分からない
+                upper = self.bounds[index]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.bounds[-1]
+
+
+class Histogram(Metric):
+    """値の分布をバケットごとの件数で記録するヒストグラム"""
+    
+    type_name = "histogram"
+    
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, help_text, labelnames)
+        self.bounds = tuple(sorted(buckets))
+    
+    def _new_child(self) -> _HistogramValue:
+        return _HistogramValue(self.bounds)
+    
+    def observe(self, value: float):
+        self._default().observe(value)
+    
+    def time(self):
+        return self._default().time()
+    
+    def _render_child(self, key: Tuple[str, ...], child: _HistogramValue) -> List[str]:
+        counts, total = child.state()
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.bounds + (math.inf,), counts):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(
+                f"{self.name}_bucket{_label_text(self.labelnames, key, le)} {cumulative}"
+            )
+        labels = _label_text(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+    
+    def _snapshot_child(self, child: _HistogramValue) -> Dict[str, float]:
+        counts, total = child.state()
+        count = sum(counts)
+        return {
+            "count": count,
+            "sum": total,
+            "mean": total / count if count else 0.0,
+            "p50": child.quantile(counts, 0.50),
+            "p95": child.quantile(counts, 0.95),
+            "p99": child.quantile(counts, 0.99)
+        }
+
+
+class MetricsRegistry:
+    """メトリクスの登録先（同じ名前で再登録すると既存のものを返す）"""
+    
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+    
+    def register(self, metric: Metric) -> Metric:
+        """メトリクスを登録する"""
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric):
+                    raise ValueError(f"メトリクス名が重複しています: {metric.name}")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+    
+    def replace(self, metric: Metric) -> Metric:
+        """メトリクスを登録する（同じ名前のものがあれば置き換える）"""
+        with self._lock:
+            self._metrics[metric.name] = metric
+            return metric
+    
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help_text, labelnames))
+    
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help_text, labelnames))
+    
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+    
+    def gauge_function(self, name: str, help_text: str, function: Callable[[], float]) -> Gauge:
+        """取得時に値を計算するゲージを登録する"""
+        return self.replace(Gauge(name, help_text, function=function))
+    
+    def counter_function(self, name: str, help_text: str, function: Callable[[], float]) -> Counter:
+        """取得時に値を計算するカウンタを登録する"""
+        return self.replace(FunctionCounter(name, help_text, function))
+    
+    def render(self) -> str:
+        """全メトリクスをPrometheusのテキスト形式で出力する"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """全メトリクスの現在値（ヒストグラムは件数・平均・推定分位点）"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+
+# プロセス全体で共有するレジストリ
+REGISTRY = MetricsRegistry()
+
+# 検索の処理段階ごとの所要時間
+SEARCH_STAGE_SECONDS = REGISTRY.histogram(
+    "search_stage_seconds",
+    "Time spent in each search stage",
+    ["stage"]
+)
+# 埋め込みキャッシュの参照結果（cache: query / persistent, result: hit / miss）
+EMBEDDING_CACHE_LOOKUPS = REGISTRY.counter(
+    "embedding_cache_lookups_total",
+    "Embedding cache lookups by cache and result",
+    ["cache", "result"]
+)
@@ -0,0 +1,103 @@
+"""
+次元削減モジュール
+
+このモジュールは以下の機能を提供します:
+- 構築時のサンプルからのPCA射影行列の推定
+- 先頭次元の切り出し（Matryoshka形式の埋め込み向け）
+- 射影パラメータのDBへの保存・復元
+"""
+
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+
+PROJECTION_METHODS = ("pca", "truncate")
+
+
+class VectorProjector:
+    """
+    埋め込みベクトルを低次元に射影するクラス
+    
+    - pca: サンプルの平均を引き、上位主成分へ射影する
+    - truncate: 先頭の dimension 次元だけを使う（学習不要）
+    """
+    
+    def __init__(
+        self,
+        method: str,
+        dimension: int,
+        mean: Optional[np.ndarray] = None,
+        components: Optional[np.ndarray] = None
+    ):
+        if method not in PROJECTION_METHODS:
+            raise ValueError(f"未対応の次元削減方式です: {method}")
+        self.method = method
+        self.dimension = dimension
+        self.mean = mean
+        self.components = components
+    
+    @property
+    def is_fitted(self) -> bool:
+        """射影パラメータが推定済みかどうか"""
+        return self.method == "truncate" or self.components is not None
+    
+    def fit(self, vectors: List[List[float]]):
+        """サンプルベクトルから主成分を推定する"""
+        if self.method == "truncate":
+            return
+        
+        matrix = np.asarray(vectors, dtype=np.float32)
+        self.mean = matrix.mean(axis=0)
+        _, _, vt = np.linalg.svd(matrix - self.mean, full_matrices=False)
+        
+        # サンプル数が次元数より少ない場合は不足分をゼロで埋める
+        components = np.zeros((self.dimension, matrix.shape[1]), dtype=np.float32)
+        count = min(self.dimension, vt.shape[0])
+        components[:count] = vt[:count]
+        self.components = components
+    
+    def project(self, vector: List[float]) -> bytes:
+        """1本のベクトルを射影してsqlite-vec用のBLOBにする"""
+        array = np.asarray(vector, dtype=np.float32)
+        
+        if self.method == "truncate":
+            return array[:self.dimension].tobytes()
+        
+        return (self.components @ (array - self.mean)).astype(np.float32).tobytes()
+    
+    @property
+    def column(self) -> str:
+        """vec0テーブル上の列名"""
+        return "embedding_reduced"
+    
+    def column_definition(self) -> str:
+        """vec0テーブルの列定義"""
+        return f"{self.column} float[{self.dimension}]"
+    
+    def to_settings(self) -> Dict[str, Any]:
+        """DBに保存する設定値に変換する"""
+        settings = {
+            "projection": self.method,
+            "projection_dimension": self.dimension
+        }
+        if self.method == "pca":
+            settings["projection_mean"] = self.mean.astype(np.float32).tobytes()
+            settings["projection_components"] = self.components.astype(np.float32).tobytes()
+        return settings
+    
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any]) -> Optional["VectorProjector"]:
+        """DBの設定値から復元する（次元削減なしの場合はNone）"""
+        method = settings.get("projection", "none")
+        if method == "none":
+            return None
+        
+        dimension = settings["projection_dimension"]
+        projector = cls(method, dimension)
+        if "projection_components" in settings:
+            projector.mean = np.frombuffer(settings["projection_mean"], dtype=np.float32)
+            projector.components = np.frombuffer(
+                settings["projection_components"], dtype=np.float32
+            ).reshape(dimension, -1)
+        return projector
@@ -0,0 +1,96 @@
+"""
+ベクトル量子化モジュール
+
+このモジュールは以下の機能を提供します:
+- 構築時のサンプルからの量子化パラメータ（次元ごとの平均・スケール）の推定
+- int8量子化およびバイナリ（符号ビット）量子化
+- 量子化パラメータのDBへの保存・復元
+"""
+
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+
+QUANTIZATION_METHODS = ("none", "int8", "bit")
+
+
+class VectorQuantizer:
+    """
+    埋め込みベクトルの量子化クラス
+    
+    平均プーリングした隠れ状態は次元ごとに偏りがあるため、
+    次元ごとの平均を引いてから量子化する。
+    - int8: 平均を引いた値を次元ごとのスケール（絶対値の99.9パーセンタイル）で[-127, 127]に写像
+    - bit: 平均を引いた値の符号を1ビットで表現（ハミング距離で検索）
+    """
+    
+    def __init__(
+        self,
+        method: str,
+        mean: Optional[np.ndarray] = None,
+        scale: Optional[np.ndarray] = None
+    ):
+        if method not in QUANTIZATION_METHODS or method == "none":
+            raise ValueError(f"未対応の量子化方式です: {method}")
+        self.method = method
+        self.mean = mean
+        self.scale = scale
+    
+    @property
+    def is_fitted(self) -> bool:
+        """量子化パラメータが推定済みかどうか"""
+        return self.mean is not None
+    
+    def fit(self, vectors: List[List[float]]):
+        """サンプルベクトルから量子化パラメータを推定する"""
+        matrix = np.asarray(vectors, dtype=np.float32)
+        self.mean = matrix.mean(axis=0)
+        # 外れ値の影響を抑えるため99.9パーセンタイルをスケールとする
+        scale = np.percentile(np.abs(matrix - self.mean), 99.9, axis=0)
+        self.scale = np.maximum(scale, 1e-6).astype(np.float32)
+    
+    def quantize(self, vector: List[float]) -> bytes:
+        """1本のベクトルを量子化してsqlite-vec用のBLOBにする"""
+        centered = np.asarray(vector, dtype=np.float32) - self.mean
+        
+        if self.method == "int8":
+            quantized = np.clip(np.rint(centered / self.scale * 127.0), -127, 127)
+            return quantized.astype(np.int8).tobytes()
+        
+        return np.packbits(centered > 0).tobytes()
+    
+    @property
+    def column(self) -> str:
+        """vec0テーブル上の列名"""
+        return f"embedding_{self.method}"
+    
+    @property
+    def sql_constructor(self) -> str:
+        """BLOBを列の型に変換するsqlite-vec関数名"""
+        return "vec_int8" if self.method == "int8" else "vec_bit"
+    
+    def column_definition(self, dimension: int) -> str:
+        """vec0テーブルの列定義"""
+        return f"{self.column} {self.method}[{dimension}]"
+    
+    def to_settings(self) -> Dict[str, Any]:
+        """DBに保存する設定値に変換する"""
+        return {
+            "quantization": self.method,
+            "quantization_mean": self.mean.astype(np.float32).tobytes(),
+            "quantization_scale": self.scale.astype(np.float32).tobytes()
+        }
+    
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any]) -> Optional["VectorQuantizer"]:
+        """DBの設定値から復元する（量子化なしの場合はNone）"""
+        method = settings.get("quantization", "none")
+        if method == "none":
+            return None
+        
+        quantizer = cls(method)
+        if "quantization_mean" in settings:
+            quantizer.mean = np.frombuffer(settings["quantization_mean"], dtype=np.float32)
+            quantizer.scale = np.frombuffer(settings["quantization_scale"], dtype=np.float32)
+        return quantizer
@@ -0,0 +1,94 @@
+"""
+クエリのマイクロバッチ処理モジュール
+
+このモジュールは以下の機能を提供します:
+- 短い時間窓内に到着したクエリの集約
+- 集約したクエリの1回のバッチ順伝播による埋め込み生成
+- イベントループを塞がないワーカースレッドでのモデル実行
+"""
+
+import asyncio
+from concurrent.futures import Executor
+from typing import List, Callable, Optional, Tuple
+
+
+class QueryBatcher:
+    """
+    同時に到着したクエリをまとめて埋め込むクラス
+    
+    最初のクエリの到着から window_ms ミリ秒以内に到着したクエリ
+    （最大 max_batch_size 件）を1バッチとして embed_fn に渡し、
+    各呼び出し元には自分のクエリの埋め込みを返す。
+    """
+    
+    def __init__(
+        self,
+        embed_fn: Callable[[List[str]], List[List[float]]],
+        executor: Optional[Executor] = None,
+        window_ms: float = 10.0,
+        max_batch_size: int = 16
+    ):
+        self.embed_fn = embed_fn
+        self.executor = executor
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+        
+        # 統計情報
+        self.batches = 0
+        self.queries = 0
+    
+    @property
+    def queue_depth(self) -> int:
+        """バッチ化待ちのクエリ数"""
+        return len(self._pending)
+    
+    async def embed(self, query: str) -> List[float]:
+        """クエリをバッチに加え、埋め込みが生成されるまで待つ"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((query, future))
+        
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        
+        return await future
+    
+    def _flush(self):
+        """待機中のクエリを1バッチとして実行する"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        
+        task = asyncio.get_running_loop().create_task(self._run_batch(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future]]):
+        """バッチの埋め込みをワーカースレッドで生成し、各呼び出し元に配る"""
+        queries = list(dict.fromkeys(query for query, _ in batch))
+        self.batches += 1
+        self.queries += len(batch)
+        
+        try:
+            loop = asyncio.get_running_loop()
+            embeddings = await loop.run_in_executor(self.executor, self.embed_fn, queries)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        results = dict(zip(queries, embeddings))
+        for query, future in batch:
+            if not future.done():
+                future.set_result(results[query])
@@ -0,0 +1,92 @@
+"""
+クエリログモジュール
+
+このモジュールは以下の機能を提供します:
+- 検索クエリのJSON Lines形式での追記
+- ログからの頻出クエリの抽出（起動時のキャッシュ事前投入用）
+"""
+
+import os
+import json
+import time
+import threading
+from collections import Counter
+from typing import List, Dict, Any, Optional, Iterator
+
+
+class QueryLog:
+    """
+    検索クエリをJSON Lines形式で追記するクラス
+    
+    1行に1クエリ（時刻・クエリ・検索モード・件数・絞り込み条件）を書き込む。
+    複数スレッドから利用できる。
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+    
+    def append(
+        self,
+        query: str,
+        mode: str,
+        top_k: int,
+        filters: Optional[Dict[str, Optional[str]]] = None,
+        collapse_by: Optional[str] = None
+    ):
+        """クエリを1行追記する"""
+        entry: Dict[str, Any] = {
+            "time": time.time(),
+            "query": query,
+            "mode": mode,
+            "top_k": top_k
+        }
+        active_filters = {k: v for k, v in (filters or {}).items() if v is not None}
+        if active_filters:
+            entry["filters"] = active_filters
+        if collapse_by:
+            entry["collapse_by"] = collapse_by
+        
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+    
+    def close(self):
+        """ログファイルを閉じる"""
+        with self._lock:
+            self._file.close()
+
+
+def read_query_log(path: str) -> Iterator[Dict[str, Any]]:
+    """クエリログの各エントリを読み込む（壊れた行は読み飛ばす）"""
+    if not os.path.exists(path):
+        return
+    
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(entry, dict) and entry.get("query"):
+                yield entry
+
+
+def frequent_queries(path: str, limit: int) -> List[str]:
+    """
+    クエリログから埋め込みを使う頻出クエリを抽出する
+    
+    Args:
+        path: クエリログのパス
+        limit: 取得する最大件数
+    
+    Returns:
+        出現回数の多い順に並んだクエリ（全文検索のみのクエリは除く）
+    """
+    counts = Counter(
+        entry["query"] for entry in read_query_log(path)
+        if entry.get("mode") != "lexical"
+    )
+    return [query for query, _ in counts.most_common(limit)]
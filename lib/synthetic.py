@@ -0,0 +1,204 @@
+"""
+合成コーパスモジュール
+
+このモジュールは以下の機能を提供します:
+- 固定シードによる再現可能な合成埋め込みベクトルの生成
+- 埋め込みモデルを使わないsqlite-vecデータベースの構築
+- OSのページキャッシュからのDBファイルの追い出し（コールドキャッシュの計測用）
+"""
+
+import os
+import time
+from typing import List, Dict, Any, Iterator
+
+import numpy as np
+
+from .data_processing import DatabaseBuilder
+from .vector_utils import EMBEDDING_DIMENSION
+
+
+# 生成・挿入の単位（行数が変わっても先頭の行が同じになるよう固定する）
+SYNTHETIC_BATCH_SIZE = 10000
+SYNTHETIC_SITES = 8
+SYNTHETIC_SECTIONS = 16
+
+
+class SyntheticCorpus:
+    """
+    クラスタ構造を持つ合成埋め込みベクトルの生成クラス
+    
+    平均プーリングした埋め込みと同様に、次元ごとの偏りとトピックごとの
+    まとまりを持たせる。同じシードからは常に同じベクトルが生成され、
+    行数の少ないコーパスは行数の多いコーパスの先頭と一致する。
+    """
+    
+    def __init__(
+        self,
+        seed: int = 0,
+        dimension: int = EMBEDDING_DIMENSION,
+        clusters: int = 256,
+        noise: float = 0.6
+    ):
+        self.seed = seed
+        self.dimension = dimension
+        self.noise = noise
+        
+        rng = np.random.default_rng(seed)
+        self.offset = rng.normal(0.0, 0.5, dimension).astype(np.float32)  # 次元ごとの偏り
+        self.centers = rng.normal(0.0, 1.0, (clusters, dimension)).astype(np.float32)
+    
+    def _generate(self, rng: np.random.Generator, count: int) -> np.ndarray:
+        """クラスタ中心にノイズを加えたベクトルをcount本生成する"""
+        labels = rng.integers(len(self.centers), size=count)
+        noise = rng.normal(0.0, self.noise, (count, self.dimension)).astype(np.float32)
+        return self.offset + self.centers[labels] + noise
+    
+    def batches(self, rows: int) -> Iterator[np.ndarray]:
+        """コーパスのベクトルをSYNTHETIC_BATCH_SIZE行ずつ生成する"""
+        rng = np.random.default_rng([self.seed, 0])
+        for start in range(0, rows, SYNTHETIC_BATCH_SIZE):
+            batch = self._generate(rng, SYNTHETIC_BATCH_SIZE)
+            yield batch[:rows - start]
+    
+    def queries(self, count: int) -> np.ndarray:
+        """コーパスとは別の乱数列からクエリベクトルを生成する"""
+        return self._generate(np.random.default_rng([self.seed, 1]), count)
+
+
+def _metadata(chunk_id: int) -> Dict[str, str]:
+    """合成チャンクのメタデータ（サイト・セクションはIDから決める）"""
+    site = f"site-{chunk_id % SYNTHETIC_SITES}"
+    section = f"section-{chunk_id % SYNTHETIC_SECTIONS}"
+    return {
+        "url": f"https://{site}.example.com/{section}/{chunk_id}",
+        "file_name": f"{chunk_id // 100}.md",
+        "source": "synthetic",
+        "site": site,
+        "section": section
+    }
+
+
+def build_synthetic_database(
+    db_path: str,
+    corpus: SyntheticCorpus,
+    rows: int,
+    quantization: str = "none",
+    reduced_dimension: int = 0,
+    projection: str = "pca"
+) -> Dict[str, Any]:
+    """
+    合成ベクトルだけを格納したsqlite-vecデータベースを構築する
+    
+    スキーマ・量子化パラメータ・射影行列はbuild_db.pyと同じ方法で作成するため、
+    SqliteVecDatabaseでそのまま検索できる。全文検索インデックスは作成しない。
+    
+    Args:
+        db_path: 作成するDBのパス（既存のファイルは削除される）
+        corpus: ベクトルの生成元
+        rows: 行数
+        quantization: 量子化方式（none / int8 / bit）
+        reduced_dimension: 次元削減列の次元数（0で無効）
+        projection: 次元削減方式（pca / truncate）
+    
+    Returns:
+        行数・生成時間・挿入時間・DBサイズ
+    """
+    builder = DatabaseBuilder(
+        db_path,
+        quantization=quantization,
+        store_float=True,
+        reduced_dimension=reduced_dimension,
+        projection=projection,
+        shards=1
+    )
+    conn = builder.initialize_database()[0]
+    conn.execute("DROP TRIGGER doc_metadata_fts_insert")
+    conn.execute("DROP TRIGGER doc_metadata_fts_delete")
+    conn.execute("DROP TABLE docs_fts")
+    
+    metadata_columns = ["url", "file_name", "source", "site", "section"]
+    columns = ["rowid", "embedding"]
+    placeholders = ["?", "?"]
+    if builder.quantizer:
+        columns.append(builder.quantizer.column)
+        placeholders.append(f"{builder.quantizer.sql_constructor}(?)")
+    if builder.projector:
+        columns.append(builder.projector.column)
+        placeholders.append("?")
+    columns.append("chunk_text")
+    columns.extend(metadata_columns)
+    placeholders.extend(["?"] * (len(metadata_columns) + 1))
+    
+    docs_sql = f"INSERT INTO docs ({', '.join(columns)}) VALUES ({', '.join(placeholders)})"
+    metadata_sql = f"""
+        INSERT INTO doc_metadata (id, {", ".join(metadata_columns)}, chunk_text)
+        VALUES ({", ".join(["?"] * (len(metadata_columns) + 2))})
+    """
+    
+    generate_seconds = 0.0
+    insert_seconds = 0.0
+    next_id = 1
+    batches = corpus.batches(rows)
+    while True:
+        start = time.perf_counter()
+        batch = next(batches, None)
+        generate_seconds += time.perf_counter() - start
+        if batch is None:
+            break
+        
+        start = time.perf_counter()
+        if builder._needs_calibration():
+            builder._calibrate([conn], [{"embeddings": batch}])
+        
+        docs_rows: List[List[Any]] = []
+        metadata_rows: List[List[Any]] = []
+        for vector in batch:
+            metadata = _metadata(next_id)
+            metadata_values = [metadata[column] for column in metadata_columns]
+            text = f"synthetic chunk {next_id}"
+            
+            values = [next_id, vector.tobytes()]
+            if builder.quantizer:
+                values.append(builder.quantizer.quantize(vector))
+            if builder.projector:
+                values.append(builder.projector.project(vector))
+            docs_rows.append(values + [text] + metadata_values)
+            metadata_rows.append([next_id] + metadata_values + [text])
+            next_id += 1
+        
+        conn.executemany(metadata_sql, metadata_rows)
+        conn.executemany(docs_sql, docs_rows)
+        insert_seconds += time.perf_counter() - start
+    
+    start = time.perf_counter()
+    conn.commit()
+    conn.execute("PRAGMA optimize")
+    conn.close()  # 最後の接続を閉じるとWALがDB本体に書き戻される
+    insert_seconds += time.perf_counter() - start
+    
+    return {
+        "rows": rows,
+        "vector_indexes": builder._vector_indexes(),
+        "generate_seconds": generate_seconds,
+        "insert_seconds": insert_seconds,
+        "db_bytes": os.path.getsize(db_path)
+    }
+
+
+def evict_page_cache(path: str) -> bool:
+    """
+    ファイルをOSのページキャッシュから追い出す
+    
+    posix_fadviseに対応していない環境（macOSなど）ではFalseを返す。
+    ダーティページは追い出せないため、書き込み直後のファイルは先にfsyncする。
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return False
+    
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+    return True
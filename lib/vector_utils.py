@@ -9,148 +9,449 @@
 """
 
 import os
+import glob
+import atexit
+import json
+import heapq
+import queue
+import hashlib
 import sqlite3
+import threading
 import sqlite_vec
-from typing import List, Dict, Any, Optional, Tuple
-from transformers import AutoTokenizer, AutoModel
-import torch
+from contextlib import contextmanager
+from concurrent.futures import Executor, ThreadPoolExecutor
+from urllib.request import pathname2url
+from typing import List, Dict, Any, Optional, Tuple, Callable, Iterator, Union
 from dotenv import load_dotenv
+import numpy as np
+
+from .embedding_cache import LRUEmbeddingCache, PersistentEmbeddingCache
+from .quantization import VectorQuantizer
+from .projection import VectorProjector
+from .inference_backends import InferenceBackend, create_backend, cache_revision
+from .metrics import SEARCH_STAGE_SECONDS, EMBEDDING_CACHE_LOOKUPS
 
 # 設定の読み込み
 load_dotenv()
 
 # 定数定義
 EMBEDDING_MODEL = "pfnet/plamo-embedding-1b"
+EMBEDDING_REVISION = os.getenv("EMBEDDING_REVISION", "main")
 SQLITE_DB_PATH = "search.db"
 EMBEDDING_DIMENSION = 2048
+EMBEDDING_MAX_LENGTH = 512
+EMBEDDING_BATCH_SIZE = 16
+VEC0_MAX_K = 4096  # sqlite-vecのKNNで指定できるkの上限
+FTS_MIN_TERM_LENGTH = 3  # trigramトークナイザで索引できる最短の語長
+SEARCH_MODES = ("vector", "hybrid", "lexical")
+COLLAPSE_KEYS = ("file", "url")
+SHARD_KEYS = ("hash", "site")
+# 検索時に絞り込みに使えるdocs/doc_metadataの列（site/sectionを持たない旧DBは後者）
+FILTER_COLUMNS = ["source", "site", "section", "file_name", "url"]
+LEGACY_FILTER_COLUMNS = ["source", "file_name", "url"]
+
+# 処理段階ごとの所要時間・キャッシュ参照のメトリクス（記録のたびにラベルを解決しないよう事前に取得）
+TOKENIZE_SECONDS = SEARCH_STAGE_SECONDS.labels(stage="tokenize")
+FORWARD_SECONDS = SEARCH_STAGE_SECONDS.labels(stage="forward")
+KNN_SECONDS = SEARCH_STAGE_SECONDS.labels(stage="knn")
+LEXICAL_SECONDS = SEARCH_STAGE_SECONDS.labels(stage="lexical")
+FUSE_SECONDS = SEARCH_STAGE_SECONDS.labels(stage="fuse")
+FORMAT_SECONDS = SEARCH_STAGE_SECONDS.labels(stage="format")
+QUERY_CACHE_HITS = EMBEDDING_CACHE_LOOKUPS.labels(cache="query", result="hit")
+QUERY_CACHE_MISSES = EMBEDDING_CACHE_LOOKUPS.labels(cache="query", result="miss")
+PERSISTENT_CACHE_HITS = EMBEDDING_CACHE_LOOKUPS.labels(cache="persistent", result="hit")
+PERSISTENT_CACHE_MISSES = EMBEDDING_CACHE_LOOKUPS.labels(cache="persistent", result="miss")
+
+
+def load_tokenizer() -> Any:
+    """
+    埋め込みモデルのトークナイザをロードする（transformersはここで初めてimportする）
+    
+    トークナイザは呼び出しごとに切り詰め設定を書き換えるため、別スレッドで
+    使う場合（チャンク化など）はモデルとは別のインスタンスをロードする。
+    """
+    from transformers import AutoTokenizer
+    
+    return AutoTokenizer.from_pretrained(
+        EMBEDDING_MODEL,
+        trust_remote_code=True,
+        revision=EMBEDDING_REVISION
+    )
 
 
 class EmbeddingModelManager:
     """埋め込みモデルの管理クラス"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        persistent_cache: Optional[PersistentEmbeddingCache] = None,
+        backend: Optional[str] = None
+    ):
         self.tokenizer = None
-        self.model = None
+        self.backend = None
         self.device = None
         self._is_loaded = False
-        self._embedding_cache = {}  # 埋め込みキャッシュ
-    
-    def load_model(self) -> Tuple[AutoTokenizer, AutoModel, str]:
-        """埋め込みモデルをロードする"""
-        if self._is_loaded:
-            return self.tokenizer, self.model, self.device
-        
-        print(f"📦 モデルロード中: {EMBEDDING_MODEL}")
-        
-        self.tokenizer = AutoTokenizer.from_pretrained(
-            EMBEDDING_MODEL,
-            trust_remote_code=True,
-            revision="main"
+        self._load_lock = threading.Lock()
+        # 推論バックエンド（省略時はEMBEDDING_BACKEND）
+        self.inference_config = ConfigManager.get_inference_config()
+        self.backend_name = backend or self.inference_config["backend"]
+        # クエリ埋め込みのLRUキャッシュ
+        cache_config = ConfigManager.get_cache_config()
+        self._embedding_cache = LRUEmbeddingCache(
+            max_bytes=cache_config["query_max_mb"] * 1024 * 1024,
+            ttl=cache_config["query_ttl"]
         )
-        self.model = AutoModel.from_pretrained(
-            EMBEDDING_MODEL,
-            trust_remote_code=True,
-            revision="main"
-        )
-        
-        # デバイス自動判定
-        self.device = self._detect_device()
-        self.model = self.model.to(self.device)
+        self.persistent_cache = persistent_cache  # 永続キャッシュ（任意）
+    
+    def load_model(self) -> Tuple[Any, InferenceBackend, str]:
+        """
+        トークナイザと推論バックエンドをロードする
         
-        # モデルを評価モードに設定（推論最適化）
-        self.model.eval()
+        transformers（およびtorch）はここで初めてimportするため、DB情報の取得や
+        全文検索・キャッシュ済みクエリの検索ではこれらを読み込まない。
+        """
+        if self._is_loaded:
+            return self.tokenizer, self.backend, self.device
         
-        print(f"✅ モデルロード完了: {self.device}")
-        self._is_loaded = True
+        # 複数スレッドから同時に呼ばれても1回だけロードする
+        with self._load_lock:
+            if not self._is_loaded:
+                print(f"📦 モデルロード中: {EMBEDDING_MODEL} ({self.backend_name})")
+                
+                self.tokenizer = load_tokenizer()
+                backend = create_backend(
+                    self.backend_name,
+                    self.inference_config["onnx_dir"],
+                    self.inference_config["num_threads"]
+                )
+                backend.load(EMBEDDING_MODEL, EMBEDDING_REVISION)
+                self.backend = backend
+                self.device = backend.device
+                
+                print(f"✅ モデルロード完了: {self.device}")
+                self._is_loaded = True
         
-        return self.tokenizer, self.model, self.device
+        return self.tokenizer, self.backend, self.device
     
-    def _detect_device(self) -> str:
-        """最適なデバイスを自動判定する"""
-        if torch.cuda.is_available():
-            gpu_name = torch.cuda.get_device_name(0)
-            print(f"🚀 GPU使用: {gpu_name} (CUDA {torch.version.cuda})")
-            return "cuda"
-        elif hasattr(torch.backends, "mps") and torch.backends.mps.is_available():
-            print("🚀 GPU使用: Apple Metal Performance Shaders (MPS)")
-            return "mps"
-        else:
-            print("⚠️  CPU使用: GPUが利用できません")
-            return "cpu"
+    def embed_tokenized(self, inputs: Dict[str, Any]) -> List[List[float]]:
+        """トークン化済みの入力でモデルを実行し、マスク付き平均プーリングを行う"""
+        with FORWARD_SECONDS.time():
+            return self.backend.embed(inputs)
     
     def get_embedding(self, text: str) -> List[float]:
         """テキストの埋め込みベクトルを取得する（キャッシュ付き）"""
         # キャッシュチェック
-        if text in self._embedding_cache:
-            return self._embedding_cache[text]
+        embeddings = self._embedding_cache.get(text)
+        if embeddings is not None:
+            QUERY_CACHE_HITS.inc()
+            return embeddings
+        QUERY_CACHE_MISSES.inc()
+        
+        if self.persistent_cache:
+            embeddings = self.persistent_cache.get(text)
+            if embeddings is not None:
+                PERSISTENT_CACHE_HITS.inc()
+                self._embedding_cache.put(text, embeddings)
+                return embeddings
+            PERSISTENT_CACHE_MISSES.inc()
         
         if not self._is_loaded:
             self.load_model()
         
-        inputs = self.tokenizer(
-            text,
-            return_tensors="pt",
-            truncation=True,
-            max_length=512,
-            padding=True  # バッチ処理の最適化
-        )
-        inputs = {k: v.to(self.device) for k, v in inputs.items()}
+        with TOKENIZE_SECONDS.time():
+            inputs = self.tokenizer(
+                text,
+                return_tensors=self.backend.tensor_type,
+                truncation=True,
+                max_length=EMBEDDING_MAX_LENGTH,
+                padding=True  # バッチ処理の最適化
+            )
+        embeddings = self.embed_tokenized(inputs)[0]
         
-        with torch.no_grad():
-            # 推論最適化のためのコンテキスト
-            if self.device == "cuda":
-                with torch.cuda.amp.autocast():
-                    outputs = self.model(**inputs)
-            else:
-                outputs = self.model(**inputs)
+        if self.persistent_cache:
+            self.persistent_cache.put(text, embeddings)
+        
+        # キャッシュに保存（上限を超えると古い順に退避）
+        self._embedding_cache.put(text, embeddings)
+        
+        return embeddings
+    
+    def get_embeddings(
+        self,
+        texts: List[str],
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        progress_callback: Optional[Callable[[int], None]] = None
+    ) -> List[List[float]]:
+        """
+        複数テキストの埋め込みベクトルをバッチ処理で取得する
+        
+        トークン長で並べ替えてから同程度の長さごとにバッチ化するため、
+        パディングによる無駄な計算が最小限になる。永続キャッシュにある
+        テキストは再計算しない。結果は入力順で返す。
+        
+        Args:
+            texts: 埋め込みを生成するテキストのリスト
+            batch_size: 1回の順伝播で処理するテキスト数
+            progress_callback: バッチ処理ごとに処理件数を渡して呼ばれる関数
+        
+        Returns:
+            入力順に並んだ埋め込みベクトルのリスト
+        """
+        embeddings = self.get_cached_embeddings(texts)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        
+        if progress_callback and len(missing) < len(texts):
+            progress_callback(len(texts) - len(missing))
+        
+        missing_texts = [texts[i] for i in missing]
+        computed: List[Optional[List[float]]] = [None] * len(missing)
+        for indices, inputs in self.tokenize_batches(missing_texts, batch_size):
+            for i, embedding in zip(indices, self.embed_tokenized(inputs)):
+                computed[i] = embedding
             
-            embeddings = outputs.last_hidden_state.mean(dim=1).squeeze().cpu().tolist()
+            if progress_callback:
+                progress_callback(len(indices))
         
-        # キャッシュに保存（メモリ制限のため最大100件）
-        if len(self._embedding_cache) < 100:
-            self._embedding_cache[text] = embeddings
+        self.cache_embeddings(missing_texts, computed)
+        for i, embedding in zip(missing, computed):
+            embeddings[i] = embedding
         
         return embeddings
+    
+    def get_query_embeddings(
+        self,
+        queries: List[str],
+        batch_size: int = EMBEDDING_BATCH_SIZE
+    ) -> List[List[float]]:
+        """
+        複数クエリの埋め込みをクエリキャッシュ付きでまとめて取得する
+        
+        クエリキャッシュにないクエリだけを1回のバッチ処理で計算する。
+        """
+        embeddings = [self._embedding_cache.get(query) for query in queries]
+        missing = list(dict.fromkeys(
+            query for query, embedding in zip(queries, embeddings) if embedding is None
+        ))
+        QUERY_CACHE_HITS.inc(len(queries) - len(missing))
+        QUERY_CACHE_MISSES.inc(len(missing))
+        
+        if missing:
+            computed = dict(zip(missing, self.get_embeddings(missing, batch_size)))
+            for query, embedding in computed.items():
+                self._embedding_cache.put(query, embedding)
+            embeddings = [
+                embedding if embedding is not None else computed[query]
+                for query, embedding in zip(queries, embeddings)
+            ]
+        
+        return embeddings
+    
+    def is_cached(self, text: str) -> bool:
+        """クエリキャッシュまたは永続キャッシュに埋め込みがあるかどうか"""
+        if text in self._embedding_cache:
+            return True
+        return self.persistent_cache is not None and text in self.persistent_cache
+    
+    def get_cached_embeddings(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """永続キャッシュから埋め込みを取得する（キャッシュにないものはNone）"""
+        if not self.persistent_cache:
+            return [None] * len(texts)
+        embeddings = self.persistent_cache.get_many(texts)
+        hits = sum(1 for embedding in embeddings if embedding is not None)
+        PERSISTENT_CACHE_HITS.inc(hits)
+        PERSISTENT_CACHE_MISSES.inc(len(texts) - hits)
+        return embeddings
+    
+    def cache_embeddings(self, texts: List[str], embeddings: List[List[float]]):
+        """計算した埋め込みを永続キャッシュに保存する"""
+        if self.persistent_cache:
+            self.persistent_cache.put_many(texts, embeddings)
+    
+    def tokenize_batches(
+        self,
+        texts: List[str],
+        batch_size: int = EMBEDDING_BATCH_SIZE
+    ) -> List[Tuple[List[int], Dict[str, Any]]]:
+        """
+        テキストを一括トークン化し、トークン長順のバッチに分割する
+        
+        Args:
+            texts: トークン化するテキストのリスト
+            batch_size: 1バッチあたりのテキスト数
+        
+        Returns:
+            (元のインデックスのリスト, パディング済み入力テンソル) のリスト
+        """
+        if not texts:
+            return []
+        
+        if not self._is_loaded:
+            self.load_model()
+        
+        with TOKENIZE_SECONDS.time():
+            # パディングなしで一括トークン化し、長さ順に並べ替える
+            encodings = self.tokenizer(
+                texts,
+                truncation=True,
+                max_length=EMBEDDING_MAX_LENGTH
+            )
+            keys = list(encodings.keys())
+            order = sorted(range(len(texts)), key=lambda i: len(encodings["input_ids"][i]))
+            
+            batches = []
+            for start in range(0, len(order), batch_size):
+                indices = order[start:start + batch_size]
+                features = [{k: encodings[k][i] for k in keys} for i in indices]
+                inputs = self.tokenizer.pad(
+                    features, padding=True, return_tensors=self.backend.tensor_type
+                )
+                batches.append((indices, inputs))
+        
+        return batches
+
+
+def load_index_settings(conn: sqlite3.Connection) -> Dict[str, Any]:
+    """index_settingsテーブルから設定を読み込む（テーブルがなければ空）"""
+    has_table = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='index_settings'"
+    ).fetchone()
+    if not has_table:
+        return {}
+    
+    settings = {}
+    for key, value in conn.execute("SELECT key, value FROM index_settings"):
+        # BLOBはそのまま、それ以外はJSONとして保存されている
+        settings[key] = value if isinstance(value, bytes) else json.loads(value)
+    return settings
+
+
+def save_index_settings(conn: sqlite3.Connection, settings: Dict[str, Any]):
+    """index_settingsテーブルに設定を書き込む"""
+    conn.executemany(
+        "INSERT OR REPLACE INTO index_settings (key, value) VALUES (?, ?)",
+        [
+            (key, value if isinstance(value, bytes) else json.dumps(value))
+            for key, value in settings.items()
+        ]
+    )
+
+
+def shard_paths(db_path: str, shards: int) -> List[str]:
+    """シャード数に応じたDBファイルのパス（シャード数1なら db_path のみ）"""
+    if shards <= 1:
+        return [db_path]
+    stem, ext = os.path.splitext(db_path)
+    return [f"{stem}.shard-{i:02d}{ext}" for i in range(shards)]
+
+
+def find_shard_paths(db_path: str) -> List[str]:
+    """db_pathに対応する既存のシャードファイルを番号順に取得する"""
+    stem, ext = os.path.splitext(db_path)
+    return sorted(glob.glob(f"{glob.escape(stem)}.shard-[0-9][0-9]{ext}"))
+
+
+def shard_for_key(key: str, shards: int) -> int:
+    """キー（ファイルパスまたはサイト）の格納先シャード番号（プロセスによらず一定）"""
+    digest = hashlib.sha256(key.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % shards
 
 
 class SqliteVecDatabase:
-    """sqlite-vecデータベースの管理クラス"""
+    """
+    sqlite-vecデータベースの管理クラス
     
-    def __init__(self, db_path: str = SQLITE_DB_PATH):
+    読み取り専用接続のプールを持ち、複数スレッドからの並行検索に対応する。
+    各接続はsqlite-vecの読み込みとPRAGMA設定を作成時に一度だけ行う。
+    """
+    
+    def __init__(
+        self,
+        db_path: str = SQLITE_DB_PATH,
+        pool_size: Optional[int] = None,
+        immutable: Optional[bool] = None,
+        mmap_size: Optional[int] = None,
+        cache_pages: Optional[int] = None
+    ):
+        config = ConfigManager.get_database_config()
         self.db_path = db_path
-        self._connection = None
-        self._connection_initialized = False
+        self.pool_size = pool_size or config["pool_size"]
+        # 更新されないDBではimmutable=1でロック・変更検知を省略できる
+        self.immutable = config["immutable"] if immutable is None else immutable
+        # 接続ごとのmmapの大きさ（バイト）とページキャッシュのページ数
+        self.mmap_size = config["mmap_mb"] * 1024 * 1024 if mmap_size is None else mmap_size
+        self.cache_pages = config["cache_pages"] if cache_pages is None else cache_pages
+        
+        self._pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        
+        self._index_settings: Optional[Dict[str, Any]] = None
+        self.quantizer: Optional[VectorQuantizer] = None
+        self.projector: Optional[VectorProjector] = None
+        self._has_lexical_index: Optional[bool] = None
     
-    def get_connection(self) -> sqlite3.Connection:
-        """データベース接続を取得する（接続プール付き）"""
+    def _create_connection(self) -> sqlite3.Connection:
+        """読み取り専用の接続を作成する"""
         if not os.path.exists(self.db_path):
             raise RuntimeError(
                 f"sqlite-vecデータベースが存在しません: {self.db_path}\n"
                 "build_db.pyを実行してDBを構築してください。"
             )
         
-        if not self._connection_initialized:
-            self._connection = sqlite3.Connection(self.db_path)
-            self._connection.enable_load_extension(True)
-            sqlite_vec.load(self._connection)
-            self._connection.enable_load_extension(False)
-            
-            # パフォーマンス最適化設定（sqlite-vecベンチマークに基づく）
-            self._connection.execute("PRAGMA journal_mode=WAL")
-            self._connection.execute("PRAGMA synchronous=NORMAL")
-            self._connection.execute("PRAGMA cache_size=20000")  # より大きなキャッシュ
-            self._connection.execute("PRAGMA temp_store=MEMORY")
-            self._connection.execute("PRAGMA page_size=4096")    # sqlite-vecベンチマークで使用
-            self._connection.execute("PRAGMA mmap_size=268435456")  # 256MB mmap
-            self._connection.execute("PRAGMA optimize")  # クエリプランナー最適化
-            
-            self._connection_initialized = True
+        uri = f"file:{pathname2url(os.path.abspath(self.db_path))}?mode=ro"
+        if self.immutable:
+            uri += "&immutable=1"
+        
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.enable_load_extension(True)
+        sqlite_vec.load(conn)
+        conn.enable_load_extension(False)
+        
+        # 接続ごとのパフォーマンス設定（sqlite-vecベンチマークに基づく）
+        # journal_modeとpage_sizeはDB構築時に設定済み
+        conn.execute(f"PRAGMA cache_size={int(self.cache_pages)}")  # より大きなキャッシュ
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")  # デフォルト256MB mmap
         
-        return self._connection
+        return conn
+    
+    def _acquire(self) -> sqlite3.Connection:
+        """プールから接続を取り出す（上限に達していれば返却を待つ）"""
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+        
+        with self._lock:
+            if len(self._connections) < self.pool_size:
+                conn = self._create_connection()
+                self._connections.append(conn)
+                return conn
+        
+        return self._pool.get()
+    
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        プールから読み取り専用接続を借りる
+        
+        使用例:
+            with database.connection() as conn:
+                conn.execute(...)
+        """
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+    
+    def database_size(self) -> int:
+        """DBファイルのバイト数"""
+        return os.path.getsize(self.db_path)
     
     def get_database_info(self) -> Dict[str, Any]:
         """データベースの情報を取得する"""
-        with self.get_connection() as conn:
+        with self.connection() as conn:
             # sqlite-vecバージョン
             version = conn.execute("SELECT vec_version()").fetchone()[0]
             
@@ -178,81 +479,647 @@ class SqliteVecDatabase:
                 "sample_files": sample
             }
     
+    @property
+    def index_settings(self) -> Dict[str, Any]:
+        """構築時に保存されたインデックス設定（初回アクセス時に読み込む）"""
+        if self._index_settings is None:
+            with self.connection() as conn:
+                settings = load_index_settings(conn)
+            self.quantizer = VectorQuantizer.from_settings(settings)
+            self.projector = VectorProjector.from_settings(settings)
+            self._index_settings = settings
+        return self._index_settings
+    
+    @property
+    def vector_indexes(self) -> List[str]:
+        """docsテーブルが持つベクトル列（宣言順）"""
+        return self.index_settings.get("vector_indexes", ["float"])
+    
+    def resolve_vector_index(self, vector_index: Optional[str] = None) -> str:
+        """
+        使用するベクトル列を決定する
+        
+        "auto"またはNoneの場合、量子化列・次元削減列があればそれを、なければfloat列を使う。
+        """
+        available = self.vector_indexes
+        if vector_index in (None, "auto"):
+            quantized = [index for index in available if index != "float"]
+            return quantized[0] if quantized else "float"
+        
+        if vector_index not in available:
+            raise ValueError(
+                f"このDBには{vector_index}インデックスがありません（利用可能: {', '.join(available)}）"
+            )
+        return vector_index
+    
+    @property
+    def filter_columns(self) -> List[str]:
+        """絞り込みに使える列"""
+        return self.index_settings.get("filter_columns", LEGACY_FILTER_COLUMNS)
+    
+    def _filter_clause(
+        self,
+        filters: Optional[Dict[str, str]],
+        table_alias: str = ""
+    ) -> Tuple[str, List[str]]:
+        """
+        絞り込み条件をWHERE句（先頭に AND を含む）とパラメータに変換する
+        
+        source/site/section/file_nameは完全一致、url_prefixはurlの前方一致を
+        範囲条件で表し、vec0のKNNクエリにもそのまま渡せるようにする。
+        """
+        if not filters:
+            return "", []
+        
+        available = self.filter_columns
+        clauses = []
+        params = []
+        for key, value in filters.items():
+            if value is None or value == "":
+                continue
+            
+            column = "url" if key == "url_prefix" else key
+            if column not in available or key == "url":
+                raise ValueError(
+                    f"このDBでは{key}で絞り込めません"
+                    f"（利用可能: {', '.join(self._filter_keys(available))}）"
+                )
+            
+            if key == "url_prefix":
+                # 前方一致を [prefix, prefixの末尾文字+1) の範囲条件で表す
+                upper = value[:-1] + chr(ord(value[-1]) + 1)
+                clauses.append(f"{table_alias}url >= ? AND {table_alias}url < ?")
+                params.extend([value, upper])
+            else:
+                clauses.append(f"{table_alias}{column} = ?")
+                params.append(value)
+        
+        if not clauses:
+            return "", []
+        return " AND " + " AND ".join(clauses), params
+    
+    @staticmethod
+    def _filter_keys(columns: List[str]) -> List[str]:
+        """絞り込み列を検索時の引数名に変換する"""
+        return ["url_prefix" if column == "url" else column for column in columns]
+    
+    def vector_index_sizes(self) -> Dict[str, int]:
+        """ベクトル列ごとの格納バイト数"""
+        sizes = {}
+        with self.connection() as conn:
+            # vec0はベクトル列ごとにシャドウテーブルへ格納する
+            for i, index in enumerate(self.vector_indexes):
+                sizes[index] = conn.execute(
+                    f"SELECT COALESCE(SUM(length(vectors)), 0) FROM docs_vector_chunks{i:02d}"
+                ).fetchone()[0]
+        return sizes
+    
+    def chunk_ids(self) -> List[int]:
+        """全チャンクのID"""
+        with self.connection() as conn:
+            return [row[0] for row in conn.execute("SELECT id FROM doc_metadata ORDER BY id")]
+    
+    def chunk_texts(self, chunk_ids: List[int]) -> Dict[int, str]:
+        """指定したIDのチャンク本文（このDBにないIDは含まない）"""
+        with self.connection() as conn:
+            texts = {}
+            for chunk_id in chunk_ids:
+                row = conn.execute(
+                    "SELECT chunk_text FROM doc_metadata WHERE id = ?", (chunk_id,)
+                ).fetchone()
+                if row:
+                    texts[chunk_id] = row[0]
+            return texts
+    
+    def iter_float_vectors(self, batch_size: int = 10000) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        float列の全ベクトルを読み出す（厳密な正解の計算用）
+        
+        Yields:
+            (rowidの配列, batch_size行以下のfloat32行列)
+        """
+        if "float" not in self.vector_indexes:
+            raise RuntimeError("floatベクトル列がないため、ベクトルを読み出せません")
+        
+        with self.connection() as conn:
+            cursor = conn.execute("SELECT rowid, embedding FROM docs")
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+                vectors = np.frombuffer(b"".join(row[1] for row in rows), dtype=np.float32)
+                yield ids, vectors.reshape(len(rows), -1)
+    
+    def search_vectors(
+        self,
+        query_embedding: List[float],
+        top_k: int = 5,
+        vector_index: Optional[str] = None,
+        oversample: Optional[int] = None,
+        rescore: bool = True,
+        filters: Optional[Dict[str, str]] = None
+    ) -> List[Tuple[int, str, str, str, str, float]]:
+        """
+        ベクトル検索を実行する（最適化版）
+        
+        量子化列・次元削減列を使う場合は、その列で top_k * oversample 件を粗く検索し、
+        float列があればその候補を元の精度の距離で再スコアリングする。
+        絞り込み条件はKNNクエリのWHERE句に含める（sourceはパーティション単位で走査を絞る）。
+        
+        Args:
+            query_embedding: クエリの埋め込みベクトル
+            top_k: 返す件数
+            vector_index: 使用するベクトル列（"float" / "int8" / "bit" / "reduced" / "auto"）
+            oversample: 粗い検索での候補の倍率
+            rescore: float列による再スコアリングを行うかどうか
+            filters: 絞り込み条件（source / site / section / file_name / url_prefix）
+        
+        Returns:
+            (id, chunk_text, url, file_name, source, distance) のリスト
+        """
+        vector_index = self.resolve_vector_index(vector_index)
+        filter_sql, filter_params = self._filter_clause(filters)
+        
+        with self.connection() as conn:
+            if vector_index == "float":
+                query_blob = sqlite_vec.serialize_float32(query_embedding)
+                cursor = conn.execute(f"""
+                    SELECT
+                        rowid,
+                        chunk_text,
+                        url,
+                        file_name,
+                        source,
+                        distance
+                    FROM docs
+                    WHERE embedding MATCH ?
+                      AND k = ?{filter_sql}
+                    ORDER BY distance
+                """, [query_blob, top_k] + filter_params)
+                
+                return cursor.fetchall()
+            
+            rescore = rescore and "float" in self.vector_indexes
+            if oversample is None:
+                oversample = ConfigManager.get_search_config()["oversample"]
+            k = min(top_k * oversample, VEC0_MAX_K) if rescore else top_k
+            
+            column, placeholder, query_blob = self._coarse_query(vector_index, query_embedding)
+            candidates = conn.execute(f"""
+                SELECT rowid, distance
+                FROM docs
+                WHERE {column} MATCH {placeholder}
+                  AND k = ?{filter_sql}
+                ORDER BY distance
+            """, [query_blob, k] + filter_params).fetchall()
+            
+            if rescore:
+                candidates = self._rescore(conn, query_embedding, candidates)
+            
+            return self._fetch_rows(conn, candidates[:top_k])
+    
+    @property
+    def has_lexical_index(self) -> bool:
+        """全文検索インデックス（docs_fts）を持つかどうか"""
+        if self._has_lexical_index is None:
+            with self.connection() as conn:
+                self._has_lexical_index = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type='table' AND name='docs_fts'"
+                ).fetchone() is not None
+        return self._has_lexical_index
+    
+    def search_lexical(
+        self,
+        query: str,
+        top_k: int = 5,
+        filters: Optional[Dict[str, str]] = None
+    ) -> List[Tuple[int, str, str, str, str, float]]:
+        """
+        FTS5（trigram）による全文検索を実行する
+        
+        空白で区切った語のいずれかを含むチャンクをBM25で順位付けする。
+        trigramでは3文字未満の語を索引できないため、3文字以上の語があればそれらで検索し、
+        3文字未満の語だけからなるクエリはLIKEによる部分一致で検索して出現回数で順位付けする。
+        
+        Args:
+            query: 検索クエリ
+            top_k: 返す件数
+            filters: 絞り込み条件（search_vectorsと同じ）
+        
+        Returns:
+            (id, chunk_text, url, file_name, source, score) のリスト（scoreは小さいほど一致度が高い）
+        """
+        if not self.has_lexical_index:
+            raise ValueError("このDBには全文検索インデックスがありません（DBを再構築してください）")
+        
+        terms = query.split()
+        if not terms:
+            return []
+        long_terms = [term for term in terms if len(term) >= FTS_MIN_TERM_LENGTH]
+        filter_sql, filter_params = self._filter_clause(filters, "m.")
+        
+        with self.connection() as conn:
+            if long_terms:
+                # 各語をフレーズとして引用し、FTS5の演算子として解釈されないようにする
+                match = " OR ".join(
+                    '"' + term.replace('"', '""') + '"' for term in long_terms
+                )
+                return conn.execute(f"""
+                    SELECT
+                        m.id,
+                        m.chunk_text,
+                        m.url,
+                        m.file_name,
+                        m.source,
+                        bm25(docs_fts) AS score
+                    FROM docs_fts
+                    JOIN doc_metadata AS m ON m.id = docs_fts.rowid
+                    WHERE docs_fts MATCH ?{filter_sql}
+                    ORDER BY score
+                    LIMIT ?
+                """, [match] + filter_params + [top_k]).fetchall()
+            
+            # 語の出現回数の合計（符号を反転して小さいほど一致度が高いスコアにする）
+            occurrences = " + ".join(
+                "(length(chunk_text) - length(replace(chunk_text, ?, ''))) / length(?)"
+                for _ in terms
+            )
+            conditions = " OR ".join("chunk_text LIKE ? ESCAPE '\\'" for _ in terms)
+            params: List[Any] = []
+            for term in terms:
+                params.extend([term, term])
+            for term in terms:
+                escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                params.append(f"%{escaped}%")
+            params.extend(filter_params)
+            params.append(top_k)
+            
+            return conn.execute(f"""
+                SELECT m.id, m.chunk_text, m.url, m.file_name, m.source, -({occurrences}) AS score
+                FROM doc_metadata AS m
+                WHERE ({conditions}){filter_sql}
+                ORDER BY score, m.id
+                LIMIT ?
+            """, params).fetchall()
+    
+    def _coarse_query(
+        self,
+        vector_index: str,
+        query_embedding: List[float]
+    ) -> Tuple[str, str, bytes]:
+        """粗い検索に使う (列名, プレースホルダ, クエリBLOB) を返す"""
+        if vector_index == "reduced":
+            projector = self.projector
+            return projector.column, "?", projector.project(query_embedding)
+        
+        quantizer = self.quantizer
+        return (
+            quantizer.column,
+            f"{quantizer.sql_constructor}(?)",
+            quantizer.quantize(query_embedding)
+        )
+    
+    def _rescore(
+        self,
+        conn: sqlite3.Connection,
+        query_embedding: List[float],
+        candidates: List[Tuple[int, float]]
+    ) -> List[Tuple[int, float]]:
+        """候補をfloatベクトルとの距離で並べ替える"""
+        # vec0は rowid IN (...) を全件走査で処理するため、候補のrowidを json_each で
+        # 展開して結合し、1回のクエリで rowid の等値検索として引く
+        rescored = conn.execute("""
+            SELECT candidates.value, vec_distance_l2(docs.embedding, ?)
+            FROM json_each(?) AS candidates
+            JOIN docs ON docs.rowid = candidates.value
+        """, (
+            sqlite_vec.serialize_float32(query_embedding),
+            json.dumps([rowid for rowid, _ in candidates])
+        )).fetchall()
+        
+        rescored.sort(key=lambda candidate: candidate[1])
+        return rescored
+    
+    def _fetch_rows(
+        self,
+        conn: sqlite3.Connection,
+        candidates: List[Tuple[int, float]]
+    ) -> List[Tuple[int, str, str, str, str, float]]:
+        """候補のrowidから結果行を組み立てる"""
+        if not candidates:
+            return []
+        fields = {
+            rowid: (chunk_text, url, file_name, source)
+            for rowid, chunk_text, url, file_name, source in conn.execute("""
+                SELECT docs.rowid, docs.chunk_text, docs.url, docs.file_name, docs.source
+                FROM json_each(?) AS candidates
+                JOIN docs ON docs.rowid = candidates.value
+            """, (json.dumps([rowid for rowid, _ in candidates]),))
+        }
+        return [(rowid, *fields[rowid], distance) for rowid, distance in candidates]
+    
+    def close(self):
+        """プール内の全接続を閉じる"""
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+            self._pool = queue.LifoQueue()
+
+
+class ShardedVectorDatabase:
+    """
+    シャード分割したsqlite-vecデータベースの管理クラス
+    
+    SqliteVecDatabaseと同じインターフェースを持つ。KNN検索は全シャードで並列に実行し、
+    各シャードの上位top_k件を距離順にマージするため、検索時間はコーパス全体ではなく
+    シャード1つ分の大きさで決まる。サイト単位で分割したDBでsiteを指定した場合は
+    該当するシャードだけを検索する。
+    """
+    
+    def __init__(
+        self,
+        paths: List[str],
+        pool_size: Optional[int] = None,
+        immutable: Optional[bool] = None
+    ):
+        self.shards = [SqliteVecDatabase(path, pool_size, immutable) for path in paths]
+        self.pool_size = self.shards[0].pool_size
+        self.immutable = self.shards[0].immutable
+        # 各シャードの接続プールを使い切れるだけのワーカーを用意する
+        self._executor = ThreadPoolExecutor(
+            max_workers=len(self.shards) * self.pool_size,
+            thread_name_prefix="shard"
+        )
+    
+    @property
+    def index_settings(self) -> Dict[str, Any]:
+        """構築時に保存されたインデックス設定（全シャード共通）"""
+        return self.shards[0].index_settings
+    
+    @property
+    def vector_indexes(self) -> List[str]:
+        """docsテーブルが持つベクトル列（宣言順）"""
+        return self.shards[0].vector_indexes
+    
+    @property
+    def filter_columns(self) -> List[str]:
+        """絞り込みに使える列"""
+        return self.shards[0].filter_columns
+    
+    @property
+    def has_lexical_index(self) -> bool:
+        """全文検索インデックス（docs_fts）を持つかどうか"""
+        return self.shards[0].has_lexical_index
+    
+    def resolve_vector_index(self, vector_index: Optional[str] = None) -> str:
+        """使用するベクトル列を決定する（SqliteVecDatabase.resolve_vector_indexと同じ）"""
+        return self.shards[0].resolve_vector_index(vector_index)
+    
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """先頭シャードの接続を借りる（PRAGMAの参照など、シャードによらない用途向け）"""
+        with self.shards[0].connection() as conn:
+            yield conn
+    
+    def _target_shards(self, filters: Optional[Dict[str, str]]) -> List[SqliteVecDatabase]:
+        """検索対象のシャード（サイト単位の分割でsiteが指定されていればその1つ）"""
+        site = (filters or {}).get("site")
+        if site and self.index_settings.get("shard_by") == "site":
+            return [self.shards[shard_for_key(site, len(self.shards))]]
+        return self.shards
+    
+    def _fan_out(
+        self,
+        shards: List[SqliteVecDatabase],
+        search: Callable[[SqliteVecDatabase], List[Tuple]]
+    ) -> List[Tuple]:
+        """各シャードで検索を並列に実行し、結果を連結する"""
+        if len(shards) == 1:
+            return search(shards[0])
+        return [row for rows in self._executor.map(search, shards) for row in rows]
+    
     def search_vectors(
         self,
         query_embedding: List[float],
-        top_k: int = 5
-    ) -> List[Tuple[str, str, str, str, float]]:
-        """ベクトル検索を実行する（最適化版）"""
-        query_blob = sqlite_vec.serialize_float32(query_embedding)
-        
-        conn = self.get_connection()
-        cursor = conn.execute("""
-            SELECT
-                chunk_text,
-                url,
-                file_name,
-                source,
-                distance
-            FROM docs
-            WHERE embedding MATCH ?
-              AND k = ?
-            ORDER BY distance
-        """, (query_blob, top_k))
-        
-        return cursor.fetchall()
+        top_k: int = 5,
+        vector_index: Optional[str] = None,
+        oversample: Optional[int] = None,
+        rescore: bool = True,
+        filters: Optional[Dict[str, str]] = None
+    ) -> List[Tuple[int, str, str, str, str, float]]:
+        """全シャードでベクトル検索を実行し、距離の小さい順にtop_k件を返す"""
+        vector_index = self.resolve_vector_index(vector_index)
+        rows = self._fan_out(
+            self._target_shards(filters),
+            lambda shard: shard.search_vectors(
+                query_embedding, top_k, vector_index, oversample, rescore, filters
+            )
+        )
+        return heapq.nsmallest(top_k, rows, key=lambda row: row[5])
+    
+    def search_lexical(
+        self,
+        query: str,
+        top_k: int = 5,
+        filters: Optional[Dict[str, str]] = None
+    ) -> List[Tuple[int, str, str, str, str, float]]:
+        """
+        全シャードで全文検索を実行し、スコアの小さい順にtop_k件を返す
+        
+        BM25の文書頻度はシャードごとに計算されるため、単一DBとは順位が多少異なりうる。
+        """
+        rows = self._fan_out(
+            self._target_shards(filters),
+            lambda shard: shard.search_lexical(query, top_k, filters)
+        )
+        return heapq.nsmallest(top_k, rows, key=lambda row: row[5])
+    
+    def vector_index_sizes(self) -> Dict[str, int]:
+        """ベクトル列ごとの格納バイト数（全シャードの合計）"""
+        sizes: Dict[str, int] = {}
+        for shard in self.shards:
+            for index, size in shard.vector_index_sizes().items():
+                sizes[index] = sizes.get(index, 0) + size
+        return sizes
+    
+    def chunk_ids(self) -> List[int]:
+        """全シャードのチャンクID"""
+        return [chunk_id for shard in self.shards for chunk_id in shard.chunk_ids()]
+    
+    def chunk_texts(self, chunk_ids: List[int]) -> Dict[int, str]:
+        """指定したIDのチャンク本文（IDは全シャードで一意）"""
+        texts = {}
+        for shard in self.shards:
+            texts.update(shard.chunk_texts(chunk_ids))
+        return texts
+    
+    def iter_float_vectors(self, batch_size: int = 10000) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """全シャードのfloat列のベクトルを順に読み出す"""
+        for shard in self.shards:
+            yield from shard.iter_float_vectors(batch_size)
+    
+    def database_size(self) -> int:
+        """DBファイルのバイト数（全シャードの合計）"""
+        return sum(shard.database_size() for shard in self.shards)
+    
+    def get_database_info(self) -> Dict[str, Any]:
+        """データベースの情報を取得する（件数は全シャードの合計）"""
+        infos = [shard.get_database_info() for shard in self.shards]
+        return {
+            "version": infos[0]["version"],
+            "table_count": infos[0]["table_count"],
+            "doc_count": sum(info["doc_count"] for info in infos),
+            "meta_count": sum(info["meta_count"] for info in infos),
+            "sample_files": infos[0]["sample_files"],
+            "shards": [
+                {"path": shard.db_path, "doc_count": info["doc_count"]}
+                for shard, info in zip(self.shards, infos)
+            ]
+        }
     
     def close(self):
-        """データベース接続を閉じる"""
-        if self._connection:
-            self._connection.close()
-            self._connection = None
-            self._connection_initialized = False
+        """全シャードの接続を閉じる"""
+        for shard in self.shards:
+            shard.close()
+        self._executor.shutdown(wait=False)
+
+
+def open_vector_database(
+    db_path: str = SQLITE_DB_PATH,
+    pool_size: Optional[int] = None,
+    immutable: Optional[bool] = None
+) -> Union[SqliteVecDatabase, ShardedVectorDatabase]:
+    """
+    検索用データベースを開く
+    
+    db_pathのファイルがなく、シャードファイル（例: search.shard-00.db）があれば
+    ShardedVectorDatabaseを、それ以外はSqliteVecDatabaseを返す。
+    """
+    if not os.path.exists(db_path):
+        paths = find_shard_paths(db_path)
+        if paths:
+            return ShardedVectorDatabase(paths, pool_size, immutable)
+    return SqliteVecDatabase(db_path, pool_size, immutable)
 
 
 class VectorSearchService:
     """ベクトル検索サービスクラス"""
     
     def __init__(self):
-        self.model_manager = EmbeddingModelManager()
-        self.database = SqliteVecDatabase()
+        self.model_manager = EmbeddingModelManager(open_persistent_cache())
+        self.database = open_vector_database()
+        search_config = ConfigManager.get_search_config()
+        self.mode = search_config["mode"]
+        self.vector_index = search_config["vector_index"]
+        self.rescore = search_config["rescore"]
+        self.hybrid_candidates = search_config["hybrid_candidates"]
+        self.rrf_k = search_config["rrf_k"]
+        self.collapse_overfetch = search_config["collapse_overfetch"]
+        self.collapse_max_k = min(search_config["collapse_max_k"], VEC0_MAX_K)
         self._warmup_completed = False
+        self._warmup_lock = threading.Lock()
+        self._search_executor: Optional[ThreadPoolExecutor] = None
+    
+    @property
+    def is_warmed_up(self) -> bool:
+        """ウォームアップが完了しているかどうか"""
+        return self._warmup_completed
     
-    def _warmup(self):
-        """初回検索の高速化のためのウォームアップ"""
-        if not self._warmup_completed:
+    def warmup(self):
+        """
+        初回検索の高速化のためのウォームアップ
+        
+        複数スレッドから同時に呼ばれた場合は、最初の呼び出しの完了を待つ。
+        """
+        with self._warmup_lock:
+            if self._warmup_completed:
+                return
+            
             print("🔥 検索エンジンウォームアップ中...")
             # モデルを事前ロード
             self.model_manager.load_model()
             # ダミー検索でキャッシュを準備
             dummy_embedding = self.model_manager.get_embedding("test")
-            self.database.search_vectors(dummy_embedding, 1)
+            self.database.search_vectors(dummy_embedding, 1, self.vector_index)
             self._warmup_completed = True
             print("✅ ウォームアップ完了")
     
-    def search(self, query: str, top_k: int = 5, show_timing: bool = False) -> List[Dict[str, Any]]:
-        """クエリに対してベクトル検索を実行する"""
+    def resolve_mode(self, mode: Optional[str]) -> str:
+        """検索モードを決定する（省略時はSEARCH_MODE）"""
+        mode = mode or self.mode
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"未対応の検索モードです: {mode}（利用可能: {', '.join(SEARCH_MODES)}）")
+        return mode
+    
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        show_timing: bool = False,
+        vector_index: Optional[str] = None,
+        mode: Optional[str] = None,
+        filters: Optional[Dict[str, str]] = None,
+        collapse_by: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        クエリに対して検索を実行する
+        
+        Args:
+            query: 検索クエリ
+            top_k: 返す件数
+            show_timing: 処理時間の内訳を表示するかどうか
+            vector_index: 使用するベクトル列（省略時はSEARCH_VECTOR_INDEX）
+            mode: 検索モード（"vector" / "hybrid" / "lexical"、省略時はSEARCH_MODE）
+            filters: 絞り込み条件（source / site / section / file_name / url_prefix）
+            collapse_by: 文書ごとに最良のチャンクだけを返す単位（"file" / "url"）
+        """
         import time
         
-        if not self._warmup_completed:
-            self._warmup()
+        mode = self.resolve_mode(mode)
+        
+        # 全文検索のみの場合はモデルを読み込まずに応答する
+        if mode == "lexical":
+            search_start = time.time()
+            
+            def fetch_lexical(k: int) -> List[Dict[str, Any]]:
+                with LEXICAL_SECONDS.time():
+                    rows = self.database.search_lexical(query, k, filters)
+                with FORMAT_SECONDS.time():
+                    return self._format_results(rows, "bm25")
+            
+            results = self._collapsed(fetch_lexical, top_k, collapse_by)
+            if show_timing:
+                print(f"⏱️  検索時間詳細:")
+                print(f"   🔤 全文検索: {time.time() - search_start:.3f}s")
+                print(f"   🎯 結果数: {len(results)}件")
+            return results
+        
+        # キャッシュ済みのクエリはモデルを読み込まずに検索する
+        if not self._warmup_completed and not self.model_manager.is_cached(query):
+            self.warmup()
         
         start_time = time.time()
         
         # 埋め込みベクトルを生成
+        cache_hit = query in self.model_manager._embedding_cache
         embedding_start = time.time()
         query_embedding = self.model_manager.get_embedding(query)
         embedding_time = time.time() - embedding_start
         
-        # ベクトル検索を実行
+        # ベクトル検索（hybridでは全文検索との統合）を実行
         search_start = time.time()
-        results = self.database.search_vectors(query_embedding, top_k)
+        results = self.search_by_embedding(
+            query_embedding, top_k, vector_index,
+            query=query, mode=mode, filters=filters, collapse_by=collapse_by
+        )
         search_time = time.time() - search_start
         
         total_time = time.time() - start_time
         
         if show_timing:
-            cache_status = "HIT" if query in self.model_manager._embedding_cache else "MISS"
+            cache_status = "HIT" if cache_hit else "MISS"
             print(f"⏱️  検索時間詳細:")
             print(f"   📦 埋め込み生成: {embedding_time:.3f}s (キャッシュ: {cache_status})")
             print(f"   🔍 DB検索: {search_time:.3f}s")
@@ -265,15 +1132,203 @@ class VectorSearchService:
             if search_time > 0.05:
                 print(f"   ⚠️  DB検索が遅い可能性があります ({search_time:.3f}s)")
         
-        # 結果を辞書形式に変換
+        return results
+    
+    def search_many(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        vector_index: Optional[str] = None,
+        mode: Optional[str] = None,
+        filters: Optional[Dict[str, str]] = None,
+        collapse_by: Optional[str] = None,
+        executor: Optional[Executor] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        複数クエリをまとめて検索する
+        
+        埋め込みは1回のバッチ順伝播でまとめて生成し、DB検索は接続プールの
+        大きさまで並列に実行する（sqlite-vecのKNN中はGILが解放される）。
+        
+        Args:
+            queries: 検索クエリのリスト
+            top_k: クエリごとに返す件数
+            vector_index, mode, filters, collapse_by: searchと同じ
+            executor: DB検索を実行するExecutor（省略時は接続プールの大きさのスレッドプール）
+        
+        Returns:
+            入力順に並んだクエリごとの検索結果
+        """
+        mode = self.resolve_mode(mode)
+        executor = executor or self._get_search_executor()
+        
+        if mode == "lexical":
+            return list(executor.map(
+                lambda query: self.search(
+                    query, top_k, mode=mode, filters=filters, collapse_by=collapse_by
+                ),
+                queries
+            ))
+        
+        embeddings = self.embed_queries(queries)
+        return list(executor.map(
+            lambda item: self.search_by_embedding(
+                item[1], top_k, vector_index,
+                query=item[0], mode=mode, filters=filters, collapse_by=collapse_by
+            ),
+            zip(queries, embeddings)
+        ))
+    
+    def _get_search_executor(self) -> ThreadPoolExecutor:
+        """search_many用のスレッドプール（初回呼び出し時に作成）"""
+        if self._search_executor is None:
+            self._search_executor = ThreadPoolExecutor(
+                max_workers=self.database.pool_size,
+                thread_name_prefix="search"
+            )
+        return self._search_executor
+    
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        複数クエリの埋め込みを1回のバッチ順伝播でまとめて生成する
+        
+        Args:
+            queries: 検索クエリのリスト
+        
+        Returns:
+            入力順に並んだ埋め込みベクトルのリスト
+        """
+        if not self._warmup_completed and not all(
+            self.model_manager.is_cached(query) for query in queries
+        ):
+            self.warmup()
+        
+        return self.model_manager.get_query_embeddings(queries)
+    
+    def search_by_embedding(
+        self,
+        query_embedding: List[float],
+        top_k: int = 5,
+        vector_index: Optional[str] = None,
+        query: Optional[str] = None,
+        mode: Optional[str] = None,
+        filters: Optional[Dict[str, str]] = None,
+        collapse_by: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        生成済みの埋め込みベクトルで検索を実行する
+        
+        hybridモードではクエリ文字列で全文検索も行い、両者の順位を統合する。
+        """
+        mode = self.resolve_mode(mode)
+        if mode == "lexical":
+            raise ValueError("lexicalモードは埋め込みを使用しません（searchを使用してください）")
+        if mode == "hybrid" and query is None:
+            raise ValueError("hybridモードにはクエリ文字列が必要です")
+        vector_index = vector_index or self.vector_index
+        
+        def fetch(k: int) -> List[Dict[str, Any]]:
+            if mode == "vector":
+                with KNN_SECONDS.time():
+                    results = self.database.search_vectors(
+                        query_embedding, k, vector_index, rescore=self.rescore, filters=filters
+                    )
+                with FORMAT_SECONDS.time():
+                    return self._format_results(results)
+            
+            candidate_k = max(k, self.hybrid_candidates)
+            with KNN_SECONDS.time():
+                vector_results = self.database.search_vectors(
+                    query_embedding, candidate_k, vector_index, rescore=self.rescore, filters=filters
+                )
+            with LEXICAL_SECONDS.time():
+                lexical_results = self.database.search_lexical(query, candidate_k, filters)
+            with FUSE_SECONDS.time():
+                return self._fuse_results(vector_results, lexical_results, k)
+        
+        return self._collapsed(fetch, top_k, collapse_by)
+    
+    def _collapsed(
+        self,
+        fetch: Callable[[int], List[Dict[str, Any]]],
+        top_k: int,
+        collapse_by: Optional[str]
+    ) -> List[Dict[str, Any]]:
+        """
+        文書単位にまとめた上位top_k件を返す
+        
+        同じ文書のチャンクが上位を占めると異なる文書がtop_k件に満たないため、
+        top_k * collapse_overfetch 件から取得件数を倍々に増やし、
+        異なる文書がtop_k件集まるか、候補が尽きるか、上限に達するまで再検索する。
+        各文書では最上位のチャンクを残し、同じ文書から取得したチャンク数を chunk_hits に入れる。
+        
+        Args:
+            fetch: 取得件数を受け取り、順位順の検索結果を返す関数
+            top_k: 返す文書数
+            collapse_by: まとめる単位（"file" / "url"、Noneならまとめない）
+        """
+        if collapse_by is None:
+            return fetch(top_k)
+        if collapse_by not in COLLAPSE_KEYS:
+            raise ValueError(
+                f"未対応のcollapse_byです: {collapse_by}（利用可能: {', '.join(COLLAPSE_KEYS)}）"
+            )
+        
+        k = top_k * self.collapse_overfetch
+        while True:
+            results = fetch(k)
+            documents: Dict[str, Dict[str, Any]] = {}
+            for result in results:
+                # URLを持たない文書はファイル名でまとめる
+                key = result[collapse_by] or result["file"]
+                if key in documents:
+                    documents[key]["chunk_hits"] += 1
+                else:
+                    documents[key] = {**result, "chunk_hits": 1}
+            
+            if len(documents) >= top_k or len(results) < k or k >= self.collapse_max_k:
+                return list(documents.values())[:top_k]
+            k = min(k * 2, self.collapse_max_k)
+    
+    def _fuse_results(
+        self,
+        vector_results: List[Tuple[int, str, str, str, str, float]],
+        lexical_results: List[Tuple[int, str, str, str, str, float]],
+        top_k: int
+    ) -> List[Dict[str, Any]]:
+        """
+        ベクトル検索と全文検索の結果をReciprocal Rank Fusionで統合する
+        
+        各結果の score は Σ 1 / (rrf_k + 順位) で、大きいほど上位。
+        片方にしか現れない結果の distance / bm25 はNoneとなる。
+        """
+        fused: Dict[int, Dict[str, Any]] = {}
+        for results, key in ((vector_results, "distance"), (lexical_results, "bm25")):
+            for rank, result in enumerate(self._format_results(results, key), 1):
+                entry = fused.setdefault(result["id"], {
+                    **result, "distance": None, "bm25": None, "score": 0.0
+                })
+                entry[key] = result[key]
+                entry["score"] += 1.0 / (self.rrf_k + rank)
+        
+        ranked = sorted(fused.values(), key=lambda entry: entry["score"], reverse=True)
+        return ranked[:top_k]
+    
+    @staticmethod
+    def _format_results(
+        results: List[Tuple[int, str, str, str, str, float]],
+        score_key: str = "distance"
+    ) -> List[Dict[str, Any]]:
+        """検索結果を辞書形式に変換する（score_keyは最後の列の名前）"""
         formatted_results = []
-        for text, url, file_name, source, distance in results:
+        for chunk_id, text, url, file_name, source, score in results:
             formatted_results.append({
+                "id": chunk_id,
                 "text": text,
                 "url": url,
                 "file": file_name,
                 "source": source,
-                "distance": distance
+                score_key: score
             })
         
         return formatted_results
@@ -284,13 +1339,11 @@ class VectorSearchService:
     
     def analyze_performance(self) -> Dict[str, Any]:
         """パフォーマンス分析情報を取得する"""
-        conn = self.database.get_connection()
-        
         # SQLite統計情報を取得
         stats = {}
         
         # データベースサイズ
-        stats['db_size_mb'] = os.path.getsize(self.database.db_path) / (1024 * 1024)
+        stats['db_size_mb'] = self.database.database_size() / (1024 * 1024)
         
         # PRAGMA情報
         pragma_info = {}
@@ -299,19 +1352,25 @@ class VectorSearchService:
             'temp_store', 'page_size', 'mmap_size'
         ]
         
-        for pragma in pragmas:
-            result = conn.execute(f"PRAGMA {pragma}").fetchone()
-            pragma_info[pragma] = result[0] if result else None
+        with self.database.connection() as conn:
+            for pragma in pragmas:
+                result = conn.execute(f"PRAGMA {pragma}").fetchone()
+                pragma_info[pragma] = result[0] if result else None
         
         stats['pragma_settings'] = pragma_info
+        stats['vector_indexes'] = self.database.vector_index_sizes()
+        stats['connection_pool'] = {
+            'pool_size': self.database.pool_size,
+            'immutable': self.database.immutable
+        }
         
-        # キャッシュ統計
-        stats['embedding_cache_size'] = len(self.model_manager._embedding_cache)
-        stats['embedding_cache_limit'] = 100
+        # キャッシュ統計（ヒット・ミス・退避回数など）
+        stats['embedding_cache'] = self.model_manager._embedding_cache.stats()
         
         # モデル情報
         stats['model_loaded'] = self.model_manager._is_loaded
         stats['device'] = self.model_manager.device if self.model_manager._is_loaded else None
+        stats['inference_backend'] = self.model_manager.backend_name
         
         return stats
 
@@ -325,19 +1384,145 @@ class ConfigManager:
         return {
             "use_ftp_source": os.getenv("USE_FTP_SOURCE", "true").lower() == "true",
             "ftp_host": os.getenv("FTP_HOST", "192.168.7.48"),
+            "ftp_port": int(os.getenv("FTP_PORT", "21")),
             "ftp_user": os.getenv("FTP_USER", "anonymous"),
             "ftp_pass": os.getenv("FTP_PASS", ""),
             "ftp_data_dir": os.getenv("FTP_DATA_DIR", "/data"),
+            # 同時に使うFTP接続数（ディレクトリ走査とダウンロードの並列数）
+            "ftp_connections": int(os.getenv("FTP_CONNECTIONS", "4")),
+            "ftp_timeout": float(os.getenv("FTP_TIMEOUT", "30")),
+            # FTPのファイルを保持するローカルミラー（空で無効）
+            "ftp_mirror_dir": os.getenv("FTP_MIRROR_DIR", "./ftp_mirror"),
             "local_dir": os.getenv("LOCAL_DIR", "./data")
         }
+    
+    @staticmethod
+    def get_build_config() -> Dict[str, Any]:
+        """データベース構築設定を取得する"""
+        return {
+            "embedding_batch_size": int(os.getenv("EMBEDDING_BATCH_SIZE", str(EMBEDDING_BATCH_SIZE))),
+            # パイプライン段間のキューの最大長（ウィンドウ単位）
+            "pipeline_queue_size": int(os.getenv("PIPELINE_QUEUE_SIZE", "4")),
+            # 長さ順ソートを行うウィンドウの大きさ（バッチ数）
+            "pipeline_window_batches": int(os.getenv("PIPELINE_WINDOW_BATCHES", "8")),
+            # 量子化ベクトル（none / int8 / bit）とfloatベクトルの保存有無
+            "quantization": os.getenv("VECTOR_QUANTIZATION", "none"),
+            "store_float": os.getenv("STORE_FLOAT_VECTORS", "true").lower() == "true",
+            # 次元削減列の次元数（0で無効）と方式（pca / truncate）
+            "reduced_dimension": int(os.getenv("REDUCED_DIMENSION", "0")),
+            "projection": os.getenv("PROJECTION_METHOD", "pca"),
+            # シャード数（1で単一DB）と分割方式（hash: ファイルパス / site: サイト）
+            "shards": int(os.getenv("INDEX_SHARDS", "1")),
+            "shard_by": os.getenv("SHARD_BY", "hash"),
+            # 量子化・射影パラメータの推定に使うチャンク数
+            "calibration_size": int(os.getenv("QUANTIZATION_CALIBRATION_SIZE", "1024")),
+            # 構築時のSQLiteページキャッシュ（MB）。vec0のチャンクがキャッシュに収まらないと挿入が大幅に遅くなる
+            "cache_mb": int(os.getenv("BUILD_CACHE_MB", "256")),
+            # チャンク化方式（chars: 文字数 / tokens: トークン数）と各方式の上限
+            "chunker": os.getenv("CHUNKER", "chars"),
+            "chunk_size": int(os.getenv("CHUNK_SIZE", "500")),
+            "chunk_tokens": int(os.getenv("CHUNK_TOKENS", str(EMBEDDING_MAX_LENGTH))),
+            # tokens方式で前のチャンクの末尾から引き継ぐトークン数（文単位）
+            "chunk_overlap": int(os.getenv("CHUNK_OVERLAP_TOKENS", "0"))
+        }
+    
+    @staticmethod
+    def get_search_config() -> Dict[str, Any]:
+        """検索設定を取得する"""
+        return {
+            # 検索モード（vector / hybrid / lexical）
+            "mode": os.getenv("SEARCH_MODE", "vector"),
+            # hybridモードで各検索から取得する候補数とRRFの定数
+            "hybrid_candidates": int(os.getenv("SEARCH_HYBRID_CANDIDATES", "50")),
+            "rrf_k": int(os.getenv("SEARCH_RRF_K", "60")),
+            # 文書単位にまとめる場合の初回取得倍率と取得件数の上限
+            "collapse_overfetch": int(os.getenv("SEARCH_COLLAPSE_OVERFETCH", "4")),
+            "collapse_max_k": int(os.getenv("SEARCH_COLLAPSE_MAX_K", "512")),
+            # 使用するベクトル列（auto / float / int8 / bit / reduced）
+            "vector_index": os.getenv("SEARCH_VECTOR_INDEX", "auto"),
+            # 量子化・次元削減検索で再スコアリングする候補の倍率
+            "oversample": int(os.getenv("SEARCH_OVERSAMPLE", "8")),
+            # float列による再スコアリングの有無
+            "rescore": os.getenv("SEARCH_RESCORE", "true").lower() == "true"
+        }
+    
+    @staticmethod
+    def get_database_config() -> Dict[str, Any]:
+        """検索用データベース接続設定を取得する"""
+        return {
+            "pool_size": int(os.getenv("DB_POOL_SIZE", str(os.cpu_count() or 4))),
+            "immutable": os.getenv("DB_IMMUTABLE", "false").lower() == "true",
+            # 接続ごとのmmapの大きさ（MB、0で無効）とSQLiteのページキャッシュ（ページ数）
+            "mmap_mb": int(os.getenv("DB_MMAP_MB", "256")),
+            "cache_pages": int(os.getenv("DB_CACHE_PAGES", "20000"))
+        }
+    
+    @staticmethod
+    def get_inference_config() -> Dict[str, Any]:
+        """埋め込みモデルの推論設定を取得する"""
+        return {
+            # torch / torch-bf16 / onnx / onnx-int8
+            "backend": os.getenv("EMBEDDING_BACKEND", "torch"),
+            "onnx_dir": os.getenv("ONNX_MODEL_DIR", "onnx_model"),
+            # 推論スレッド数（0で各ランタイムの既定値）
+            "num_threads": int(os.getenv("INFERENCE_THREADS", "0"))
+        }
+    
+    @staticmethod
+    def get_cache_config() -> Dict[str, Any]:
+        """埋め込みキャッシュ設定を取得する"""
+        return {
+            "enabled": os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true",
+            "path": os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.db"),
+            "max_mb": int(os.getenv("EMBEDDING_CACHE_MAX_MB", "1024")),
+            # メモリ内クエリキャッシュ（TTLは秒、0で無期限）
+            "query_max_mb": int(os.getenv("QUERY_CACHE_MAX_MB", "64")),
+            "query_ttl": float(os.getenv("QUERY_CACHE_TTL", "0"))
+        }
+
+
+def open_persistent_cache(force: bool = False) -> Optional[PersistentEmbeddingCache]:
+    """
+    設定に基づいて永続埋め込みキャッシュを開く
+    
+    Args:
+        force: Trueの場合、無効化設定に関わらず開く（管理コマンド用）
+    
+    Returns:
+        永続キャッシュ。無効化されている場合はNone
+    """
+    config = ConfigManager.get_cache_config()
+    if not config["enabled"] and not force:
+        return None
+    
+    cache = PersistentEmbeddingCache(
+        config["path"],
+        EMBEDDING_MODEL,
+        cache_revision(EMBEDDING_REVISION, ConfigManager.get_inference_config()["backend"]),
+        max_bytes=config["max_mb"] * 1024 * 1024
+    )
+    # メモリに溜めた最終アクセス時刻を終了時に書き込む
+    atexit.register(cache.flush)
+    return cache
 
 
 # グローバルインスタンス（シングルトンパターン）
 _vector_search_service = None
+_vector_search_service_lock = threading.Lock()
 
 def get_vector_search_service() -> VectorSearchService:
     """ベクトル検索サービスのシングルトンインスタンスを取得する"""
     global _vector_search_service
     if _vector_search_service is None:
-        _vector_search_service = VectorSearchService()
-    return _vector_search_service
\ No newline at end of file
+        with _vector_search_service_lock:
+            if _vector_search_service is None:
+                _vector_search_service = VectorSearchService()
+    return _vector_search_service
+
+def reset_vector_search_service():
+    """シングルトンインスタンスを破棄し、DB接続を閉じる（次の取得時に開き直す）"""
+    global _vector_search_service
+    with _vector_search_service_lock:
+        service, _vector_search_service = _vector_search_service, None
+    if service is not None:
+        service.database.close()
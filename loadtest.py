@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+"""
+MCPサーバー負荷試験プログラム
+
+streamable-httpで起動したserver.pyのsearchツールに複数のクライアントから
+同時に検索要求を送り、スループット・レイテンシ（p50/p95/p99）・エラー率を測定します。
+
+使用方法:
+    python loadtest.py                                    # 既定のクエリで8並列・30秒
+    python loadtest.py --concurrency 32 --rate 50         # 毎秒50要求（オープンループ）
+    python loadtest.py --mix vector=7,hybrid=2,lexical=1  # 検索モードの比率を指定
+    python loadtest.py --query-log query_log.jsonl --replay-timing  # クエリログを時刻どおりに再生
+    python loadtest.py --output report.json --compare previous.json # レポートの保存と前回との比較
+
+--rateまたは--replay-timingを指定した場合は予定送信時刻からの経過時間をレイテンシとするため、
+サーバーが詰まって送信が遅れた分も計測に含まれます（coordinated omissionの回避）。
+"""
+
+import json
+import time
+import random
+import asyncio
+import subprocess
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+
+import click
+import httpx
+from mcp import ClientSession
+from mcp.client.streamable_http import streamablehttp_client
+
+from lib.evaluation import percentile
+from lib.query_log import read_query_log
+
+
+# デフォルトテストクエリ
+DEFAULT_QUERIES = [
+    "大学", "授業", "履修", "成績", "卒業",
+    "学生証", "図書館", "研究室", "試験", "単位"
+]
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """"vector=7,hybrid=2,lexical=1" 形式の検索モード比率を解析する"""
+    weights = {}
+    for item in mix.split(","):
+        mode, _, weight = item.partition("=")
+        weights[mode.strip()] = float(weight or 1)
+    if not weights or sum(weights.values()) <= 0:
+        raise click.BadParameter(f"検索モードの比率が不正です: {mix}")
+    return weights
+
+
+def build_workload(
+    queries: List[str],
+    mix: Dict[str, float],
+    top_k: int,
+    seed: int
+) -> Iterator[Dict[str, Any]]:
+    """クエリと検索モードを無作為に組み合わせた要求を無限に生成する"""
+    rng = random.Random(seed)
+    modes = list(mix)
+    weights = [mix[mode] for mode in modes]
+    while True:
+        yield {
+            "offset": None,
+            "arguments": {
+                "query": rng.choice(queries),
+                "top_k": top_k,
+                "mode": rng.choices(modes, weights)[0]
+            }
+        }
+
+
+def replay_workload(path: str, top_k: Optional[int]) -> Iterator[Dict[str, Any]]:
+    """クエリログのエントリを記録された順・時刻で再生する要求に変換する（top_kの指定で上書き）"""
+    first = None
+    for entry in read_query_log(path):
+        logged_at = entry.get("time")
+        if first is None:
+            first = logged_at
+        arguments = {
+            "query": entry["query"],
+            "top_k": top_k or entry.get("top_k", 5),
+            "mode": entry.get("mode")
+        }
+        arguments.update(entry.get("filters", {}))
+        if entry.get("collapse_by"):
+            arguments["collapse_by"] = entry["collapse_by"]
+        yield {
+            "offset": logged_at - first if logged_at is not None and first is not None else None,
+            "arguments": arguments
+        }
+
+
+def tool_error(result) -> Tuple[Optional[str], int]:
+    """ツールの応答から (エラーメッセージ, 結果件数) を取り出す"""
+    text = "".join(getattr(content, "text", "") for content in result.content)
+    if result.isError:
+        return text or "tool error", 0
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        return "invalid JSON response", 0
+    if data.get("error"):
+        return data["error"], 0
+    return None, len(data.get("results", []))
+
+
+def summarize(records: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    """要求ごとの記録をスループット・レイテンシ・エラー率に集計する"""
+    errors = sum(1 for record in records if record["error"] is not None)
+    succeeded = len(records) - errors
+    latencies = sorted(record["latency"] * 1000 for record in records if record["error"] is None)
+    service_times = sorted(
+        record["service_time"] * 1000 for record in records if record["error"] is None
+    )
+    return {
+        "requests": len(records),
+        "succeeded": succeeded,
+        "errors": errors,
+        "error_rate": errors / len(records) if records else 0.0,
+        "throughput": succeeded / elapsed if elapsed > 0 else 0.0,
+        "latency_ms": {
+            "mean": sum(latencies) / len(latencies) if latencies else 0.0,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": latencies[-1] if latencies else 0.0
+        },
+        "service_time_ms": {
+            "p50": percentile(service_times, 50),
+            "p99": percentile(service_times, 99)
+        }
+    }
+
+
+def git_revision() -> Optional[str]:
+    """レポートに記録する現在のリビジョン"""
+    try:
+        completed = subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            capture_output=True, text=True, timeout=5
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return completed.stdout.strip() or None
+
+
+async def wait_for_health(url: str, timeout: float) -> Optional[Dict[str, Any]]:
+    """サーバーの/healthが準備完了を返すまで待つ（エンドポイントがなければNone）"""
+    health_url = url.rsplit("/", 1)[0] + "/health"
+    deadline = time.time() + timeout
+    async with httpx.AsyncClient() as client:
+        while True:
+            try:
+                response = await client.get(health_url, timeout=5)
+            except httpx.HTTPError:
+                response = None
+            
+            if response is not None and response.status_code == 404:
+                return None
+            if response is not None and response.status_code == 200:
+                return response.json()
+            if time.time() >= deadline:
+                raise click.ClickException(f"サーバーの準備が完了しません: {health_url}")
+            await asyncio.sleep(1)
+
+
+class LoadTest:
+    """
+    負荷試験の実行クラス
+    
+    同時実行数と同じ数のMCPセッションを張り、要求キューから取り出した
+    検索要求を各セッションで順に実行する。
+    """
+    
+    def __init__(
+        self,
+        url: str,
+        concurrency: int,
+        rate: float,
+        duration: float,
+        max_requests: int,
+        replay_timing: bool,
+        speed: float,
+        poisson: bool,
+        timeout: float,
+        seed: int
+    ):
+        self.url = url
+        self.concurrency = concurrency
+        self.rate = rate
+        self.duration = duration
+        self.max_requests = max_requests
+        self.replay_timing = replay_timing
+        self.speed = speed
+        self.poisson = poisson
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        
+        self.records: List[Dict[str, Any]] = []
+        self.client_errors: List[str] = []
+        self.start = 0.0
+        self.elapsed = 0.0
+        self._workload: Iterator[Dict[str, Any]] = iter(())
+        self._issued = 0
+        self._connected = 0
+        self._all_connected = asyncio.Event()
+        self._go = asyncio.Event()
+    
+    async def run(self, workload: Iterator[Dict[str, Any]], warmup: int):
+        """全クライアントの接続後に計測を開始し、要求を送り切るまで実行する"""
+        self._workload = workload
+        queue: Optional[asyncio.Queue] = asyncio.Queue() if self._open_loop else None
+        workers = [
+            asyncio.create_task(self._worker(queue, warmup if i == 0 else 0))
+            for i in range(self.concurrency)
+        ]
+        
+        await self._all_connected.wait()
+        if len(self.client_errors) == self.concurrency:
+            await asyncio.gather(*workers)
+            raise click.ClickException(f"サーバーに接続できません: {self.client_errors[0]}")
+        
+        self.start = time.perf_counter()
+        self._go.set()
+        if queue is not None:
+            await self._produce(queue)
+        await asyncio.gather(*workers)
+        self.elapsed = time.perf_counter() - self.start
+    
+    @property
+    def _open_loop(self) -> bool:
+        """送信時刻を予定するオープンループかどうか"""
+        return self.rate > 0 or self.replay_timing
+    
+    def _next_request(self) -> Optional[Dict[str, Any]]:
+        """次の要求を取り出す（要求数・実行時間の上限に達したらNone）"""
+        if self.max_requests and self._issued >= self.max_requests:
+            return None
+        if self.duration and time.perf_counter() - self.start >= self.duration:
+            return None
+        request = next(self._workload, None)
+        if request is not None:
+            self._issued += 1
+        return request
+    
+    async def _produce(self, queue: asyncio.Queue):
+        """オープンループでは予定時刻に合わせて要求をキューに積む"""
+        due = 0.0
+        while True:
+            request = self._next_request()
+            if request is None:
+                break
+            
+            if self.replay_timing and request["offset"] is not None:
+                due = request["offset"] / self.speed
+            elif self.rate > 0:
+                due += self.rng.expovariate(self.rate) if self.poisson else 1.0 / self.rate
+            
+            delay = self.start + due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            queue.put_nowait((request, due))
+        
+        for _ in range(self.concurrency):
+            queue.put_nowait(None)
+    
+    async def _worker(self, queue: Optional[asyncio.Queue], warmup: int):
+        """1クライアント分のセッションで要求を処理する"""
+        connected = False
+        try:
+            async with streamablehttp_client(self.url, timeout=self.timeout) as (read, write, _):
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    for i in range(warmup):
+                        await session.call_tool(
+                            "search", {"query": DEFAULT_QUERIES[i % len(DEFAULT_QUERIES)]}
+                        )
+                    connected = True
+                    self._mark_connected()
+                    await self._go.wait()
+                    
+                    while True:
+                        if queue is not None:
+                            item = await queue.get()
+                        else:
+                            # クローズドループでは応答を受け取るたびに次の要求を送る
+                            request = self._next_request()
+                            item = (request, None) if request is not None else None
+                        if item is None:
+                            return
+                        await self._execute(session, *item)
+        except Exception as e:
+            self.client_errors.append(f"{type(e).__name__}: {e}")
+            if not connected:
+                self._mark_connected()
+    
+    def _mark_connected(self):
+        """接続の完了（または失敗）を数え、全クライアント分そろったら計測を開始できるようにする"""
+        self._connected += 1
+        if self._connected >= self.concurrency:
+            self._all_connected.set()
+    
+    async def _execute(self, session: ClientSession, request: Dict[str, Any], due: Optional[float]):
+        """1要求を実行して記録する"""
+        sent = time.perf_counter()
+        try:
+            result = await session.call_tool(
+                "search", request["arguments"], timedelta(seconds=self.timeout)
+            )
+            error, result_count = tool_error(result)
+        except Exception as e:
+            error, result_count = f"{type(e).__name__}: {e}", 0
+        finished = time.perf_counter()
+        
+        # オープンループでは予定時刻から計測し、送信待ちの時間もレイテンシに含める
+        origin = self.start + due if due is not None else sent
+        self.records.append({
+            "mode": request["arguments"].get("mode") or "default",
+            "latency": finished - origin,
+            "service_time": finished - sent,
+            "finished": finished - self.start,
+            "results": result_count,
+            "error": error
+        })
+
+
+def print_summary(label: str, summary: Dict[str, Any]):
+    """集計結果を1行で表示する"""
+    latency = summary["latency_ms"]
+    print(
+        f"{label:10} | {summary['requests']:7d} | {summary['throughput']:8.1f}/s | "
+        f"{latency['p50']:8.1f} | {latency['p95']:8.1f} | {latency['p99']:8.1f} | "
+        f"{summary['error_rate'] * 100:5.1f}%"
+    )
+
+
+def print_comparison(previous: Dict[str, Any], current: Dict[str, Any]):
+    """前回のレポートとの差分を表示する"""
+    print(f"\n📊 前回との比較 ({previous.get('git_revision')} → {current.get('git_revision')})")
+    print("-" * 60)
+    
+    def row(label: str, old: float, new: float, unit: str):
+        change = f"{(new - old) / old * 100:+6.1f}%" if old else "    -  "
+        print(f"{label:12} | {old:10.2f}{unit} → {new:10.2f}{unit} ({change})")
+    
+    old, new = previous["summary"], current["summary"]
+    row("throughput", old["throughput"], new["throughput"], "/s")
+    for key in ("p50", "p95", "p99"):
+        row(key, old["latency_ms"][key], new["latency_ms"][key], "ms")
+    row("error_rate", old["error_rate"] * 100, new["error_rate"] * 100, "%")
+
+
+@click.command()
+@click.option("--url", default="http://127.0.0.1:8080/mcp", help="MCP endpoint of the streamable-http server")
+@click.option("--concurrency", default=8, help="Number of concurrent client sessions")
+@click.option("--rate", default=0.0, help="Target requests per second (0 = closed loop, as fast as possible)")
+@click.option("--poisson", is_flag=True, help="Use exponential inter-arrival times with --rate")
+@click.option("--duration", default=30.0, help="Test duration in seconds (0 = until the workload ends)")
+@click.option("--requests", "max_requests", default=0, help="Maximum number of requests (0 = unlimited)")
+@click.option("--query", "queries", multiple=True, help="Query to send (repeatable)")
+@click.option("--query-file", default=None, help="File with one query per line")
+@click.option("--mix", default="vector=1", help="Search mode weights, e.g. vector=7,hybrid=2,lexical=1")
+@click.option("--top-k", type=int, default=None, help="Number of results per request (default: 5, or as logged)")
+@click.option("--query-log", default=None, help="Replay requests from a server query log (JSON Lines)")
+@click.option("--replay-timing", is_flag=True, help="Keep the inter-arrival times of the query log")
+@click.option("--speed", default=1.0, help="Speed-up factor for --replay-timing")
+@click.option("--warmup", default=10, help="Requests sent before measuring")
+@click.option("--timeout", default=60.0, help="Per-request timeout in seconds")
+@click.option("--wait-ready", default=300.0, help="Seconds to wait for /health to report ready")
+@click.option("--seed", default=0, help="Random seed for the query mix")
+@click.option("--output", default=None, help="Write the JSON report to this file")
+@click.option("--compare", default=None, help="Previous JSON report to compare against")
+def main(
+    url: str,
+    concurrency: int,
+    rate: float,
+    poisson: bool,
+    duration: float,
+    max_requests: int,
+    queries: Tuple[str, ...],
+    query_file: Optional[str],
+    mix: str,
+    top_k: Optional[int],
+    query_log: Optional[str],
+    replay_timing: bool,
+    speed: float,
+    warmup: int,
+    timeout: float,
+    wait_ready: float,
+    seed: int,
+    output: Optional[str],
+    compare: Optional[str]
+):
+    """MCPサーバーのsearchツールに負荷をかけて性能を測定する"""
+    if replay_timing and not query_log:
+        raise click.BadParameter("--replay-timingには--query-logが必要です")
+    
+    if query_log:
+        workload = replay_workload(query_log, top_k)
+        source = f"query log: {query_log}"
+    else:
+        query_list = list(queries)
+        if query_file:
+            with open(query_file, encoding="utf-8") as f:
+                query_list.extend(line.strip() for line in f if line.strip())
+        query_list = query_list or DEFAULT_QUERIES
+        workload = build_workload(query_list, parse_mix(mix), top_k or 5, seed)
+        source = f"{len(query_list)} queries, mix {mix}"
+        if not duration and not max_requests:
+            raise click.BadParameter("--durationか--requestsのどちらかを指定してください")
+    
+    async def run() -> Tuple[LoadTest, Optional[Dict[str, Any]]]:
+        health = await wait_for_health(url, wait_ready)
+        test = LoadTest(
+            url, concurrency, rate, duration, max_requests,
+            replay_timing, speed, poisson, timeout, seed
+        )
+        await test.run(workload, warmup)
+        return test, health
+    
+    print("🚦 MCPサーバー負荷試験")
+    print("=" * 80)
+    print(f"URL: {url}")
+    print(f"同時実行数: {concurrency}, 送信レート: {f'{rate}/s' if rate else 'クローズドループ'}, 要求: {source}")
+    
+    test, health = asyncio.run(run())
+    
+    summary = summarize(test.records, test.elapsed)
+    modes = sorted({record["mode"] for record in test.records})
+    mode_summaries = {
+        mode: summarize([r for r in test.records if r["mode"] == mode], test.elapsed)
+        for mode in modes
+    }
+    
+    print("-" * 80)
+    print(f"{'モード':10} | {'要求数':>7} | {'スループット':>10} | {'p50(ms)':>8} | {'p95(ms)':>8} | {'p99(ms)':>8} | エラー")
+    print("-" * 80)
+    for mode, mode_summary in mode_summaries.items():
+        print_summary(mode, mode_summary)
+    print_summary("合計", summary)
+    print(f"実行時間: {test.elapsed:.1f}秒")
+    
+    error_counts = Counter(record["error"][:200] for record in test.records if record["error"])
+    for message, count in error_counts.most_common(5):
+        print(f"❌ {count}件: {message}")
+    if test.client_errors:
+        print(f"⚠️  異常終了したクライアント: {len(test.client_errors)}件 ({test.client_errors[0]})")
+    
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "git_revision": git_revision(),
+        "url": url,
+        "config": {
+            "concurrency": concurrency,
+            "rate": rate,
+            "poisson": poisson,
+            "duration": duration,
+            "requests": max_requests,
+            "workload": source,
+            "top_k": top_k,
+            "replay_timing": replay_timing,
+            "speed": speed,
+            "warmup": warmup,
+            "seed": seed
+        },
+        "elapsed": test.elapsed,
+        "summary": summary,
+        "modes": mode_summaries,
+        "errors": [{"message": m, "count": c} for m, c in error_counts.most_common(20)],
+        "client_errors": test.client_errors,
+        "server_health": health
+    }
+    
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 レポートを保存しました: {output}")
+    
+    if compare:
+        with open(compare, encoding="utf-8") as f:
+            print_comparison(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,36 +6,131 @@ sqlite-vecベクトル検索MCPサーバー
 - FastMCPを使用したMCPツールサーバー
 - sqlite-vecによるベクトル検索API
 - JSON形式での検索結果返却
+- 同時に到着したクエリのマイクロバッチ処理
+- 複数クエリをまとめて検索するバッチAPI
+- 起動時のバックグラウンド初期化（DB接続・モデルロード・クエリログからのキャッシュ投入）
+- 初期化状態を返すhealthツールと/healthエンドポイント
+- 処理段階ごとのレイテンシ・キャッシュ・キュー長のメトリクス（/metricsエンドポイントとstatsツール）
 
 使用方法:
     python search_server.py [オプション]
-    
+
 オプション:
     --port: HTTPポート番号（デフォルト: 8080）
     --transport: トランスポート種別（stdio/streamable-http）
     --host: バインドホスト（デフォルト: 0.0.0.0）
     --stateless: ステートレスモードで実行
+    --batch-window-ms: クエリを集約する時間窓（ミリ秒、デフォルト: 10）
+    --max-batch-size: 1バッチの最大クエリ数（デフォルト: 16）
+    --query-log: 検索クエリを記録するJSON Linesファイル（起動時のキャッシュ投入にも使用）
+    --prepopulate-queries: 起動時にキャッシュへ投入する頻出クエリ数（デフォルト: 1000）
 """
 
 import json
-from typing import Optional
+import time
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple, Callable
 
 import anyio
 import click
 import mcp.types as types
 from mcp.server.fastmcp import FastMCP, Context
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
+
+from lib.metrics import REGISTRY, SEARCH_STAGE_SECONDS, SIZE_BUCKETS
+from lib.query_batcher import QueryBatcher
+from lib.query_log import QueryLog, frequent_queries
+from lib.vector_utils import (
+    get_vector_search_service, reset_vector_search_service, ConfigManager, VectorSearchService
+)
 
-from lib.vector_utils import get_vector_search_service
+# search_batchで1回に受け付けるクエリ数の上限
+MAX_BATCH_QUERIES = 100
+
+# 初期化に失敗した後、次の要求で再試行するまでの間隔（秒、失敗が続くと倍にする）
+INIT_RETRY_SECONDS = 5.0
+INIT_RETRY_MAX_SECONDS = 300.0
+
+# 要求単位のメトリクス
+REQUEST_SECONDS = REGISTRY.histogram(
+    "search_request_seconds",
+    "Time to handle a search tool request",
+    ["tool", "mode"]
+)
+REQUEST_ERRORS = REGISTRY.counter(
+    "search_request_errors_total",
+    "Search tool requests that returned an error",
+    ["tool"]
+)
+REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    "search_requests_in_flight",
+    "Search tool requests currently being handled"
+)
+EMBEDDING_BATCH_SIZE = REGISTRY.histogram(
+    "embedding_batch_queries",
+    "Number of distinct queries per embedding batch",
+    buckets=SIZE_BUCKETS
+)
+# バッチャーでの待ち時間を含むクエリ埋め込みの取得時間
+QUERY_EMBEDDING_SECONDS = SEARCH_STAGE_SECONDS.labels(stage="query_embedding")
 
 
 class SearchServer:
     """検索サーバークラス"""
     
-    def __init__(self, host: str, port: int, stateless: bool = False):
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        stateless: bool = False,
+        batch_window_ms: float = 10.0,
+        max_batch_size: int = 16,
+        query_log_path: Optional[str] = None,
+        prepopulate_queries: int = 1000
+    ):
         self.host = host
         self.port = port
         self.stateless = stateless
-        self.vector_service = get_vector_search_service()
+        self.max_batch_size = max_batch_size
+        # 検索サービスはバックグラウンド初期化で作成する
+        self.vector_service: Optional[VectorSearchService] = None
+        
+        # クエリログ（起動時のキャッシュ投入にも使用）
+        self.query_log_path = query_log_path
+        self.query_log = QueryLog(query_log_path) if query_log_path else None
+        self.prepopulate_queries = prepopulate_queries
+        
+        # モデル推論はイベントループ外の専用スレッドで1バッチずつ実行
+        self.embedding_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding")
+        # DB検索は接続プールの大きさまで並列に実行
+        self.search_executor = ThreadPoolExecutor(
+            max_workers=ConfigManager.get_database_config()["pool_size"],
+            thread_name_prefix="search"
+        )
+        self.batcher = QueryBatcher(
+            self._embed_queries,
+            executor=self.embedding_executor,
+            window_ms=batch_window_ms,
+            max_batch_size=max_batch_size
+        )
+        
+        # 初期化状態（DB接続とモデルロードの完了をそれぞれ通知する）
+        self.status = "starting"
+        self.init_error: Optional[str] = None
+        self.started_at = time.time()
+        self.stage_seconds: Dict[str, float] = {}
+        self.prepopulated = 0
+        self._database_ready = threading.Event()
+        self._model_ready = threading.Event()
+        self._state_lock = threading.Lock()
+        self._waiters: List[Tuple[threading.Event, asyncio.AbstractEventLoop, asyncio.Event]] = []
+        self._init_thread: Optional[threading.Thread] = None
+        self._init_failures = 0
+        self._retry_at = 0.0
         
         # FastMCPサーバーを作成
         self.app = FastMCP(
@@ -46,20 +141,250 @@ class SearchServer:
             stateless_http=stateless
         )
         
-        # ツールを登録
+        # ツールとHTTPエンドポイントを登録
         self._register_tools()
+        self._register_routes()
+        self._register_metrics()
+    
+    def start_initialization(self):
+        """
+        DB接続・モデルロード・キャッシュ投入をバックグラウンドで開始する
+        
+        初期化に失敗している場合は、再試行の間隔が過ぎていればやり直す
+        （起動後にDBが構築された場合や、一時的なネットワークエラーから復帰する）。
+        """
+        with self._state_lock:
+            if self._init_thread is not None:
+                if self.status != "failed" or time.time() < self._retry_at:
+                    return
+                self._database_ready.clear()
+                self._model_ready.clear()
+                self.init_error = None
+                self.status = "starting"
+                print(f"🔁 初期化を再試行します ({self._init_failures}回目)")
+            self._init_thread = threading.Thread(
+                target=self._initialize, name="warmup", daemon=True
+            )
+        self._init_thread.start()
+    
+    def _initialize(self):
+        """バックグラウンド初期化の本体"""
+        try:
+            self.status = "opening_database"
+            start = time.time()
+            self.vector_service = get_vector_search_service()
+            # 接続は遅延して開かれるため、ここで1本開いてDBの欠落・破損を検出する
+            database_info = self.vector_service.database.get_database_info()
+            print(f"🗄️  データベースを開きました ({database_info['doc_count']}件)")
+            self.stage_seconds["database"] = time.time() - start
+            self._signal(self._database_ready)
+            
+            # 推論スレッドで実行し、到着済みの検索要求のバッチと重ならないようにする
+            self.status = "loading_model"
+            start = time.time()
+            self.embedding_executor.submit(self.vector_service.warmup).result()
+            self.stage_seconds["model"] = time.time() - start
+            self._signal(self._model_ready)
+            
+            if self.query_log_path and self.prepopulate_queries > 0:
+                self.status = "prepopulating"
+                start = time.time()
+                self._prepopulate()
+                self.stage_seconds["prepopulate"] = time.time() - start
+            
+            self._init_failures = 0
+            self.status = "ready"
+            print(f"✅ サーバー準備完了 ({time.time() - self.started_at:.1f}秒)")
+        
+        except Exception as e:
+            if self.status == "opening_database":
+                # 再試行時にDBを開き直す（構築されたDBやシャード構成の変化を反映する）
+                self.vector_service = None
+                reset_vector_search_service()
+            self.init_error = str(e)
+            retry_seconds = min(INIT_RETRY_MAX_SECONDS, INIT_RETRY_SECONDS * 2 ** self._init_failures)
+            print(f"❌ 初期化エラー: {e}（{retry_seconds:.0f}秒後以降の要求で再試行します）")
+            # 待機中の要求を起こしてエラーを返す
+            self._signal(self._database_ready)
+            self._signal(self._model_ready)
+            # 待機中の要求を起こした後で失敗を記録する（再試行はこれ以降に始まる）
+            with self._state_lock:
+                self._init_failures += 1
+                self._retry_at = time.time() + retry_seconds
+                self.status = "failed"
+    
+    def _prepopulate(self):
+        """クエリログの頻出クエリの埋め込みをクエリキャッシュに投入する"""
+        queries = frequent_queries(self.query_log_path, self.prepopulate_queries)
+        # 検索要求のバッチと交互に実行されるよう、小分けにして推論スレッドに投入する
+        for start in range(0, len(queries), self.max_batch_size):
+            chunk = queries[start:start + self.max_batch_size]
+            self.embedding_executor.submit(self.vector_service.embed_queries, chunk).result()
+            self.prepopulated += len(chunk)
+        print(f"🗂️  クエリログから{len(queries)}件のクエリ埋め込みをキャッシュに投入しました")
+    
+    def _signal(self, event: threading.Event):
+        """初期化段階の完了を通知し、待機中のイベントループを起こす"""
+        with self._state_lock:
+            event.set()
+            waiters = [waiter for waiter in self._waiters if waiter[0] is event]
+            self._waiters = [waiter for waiter in self._waiters if waiter[0] is not event]
+        for _, loop, waiter in waiters:
+            loop.call_soon_threadsafe(waiter.set)
+    
+    async def _wait_ready(self, need_model: bool):
+        """
+        初期化の完了を待つ
+        
+        初期化中に到着した要求はすべて同じ初期化の完了を待つ。
+        初期化に失敗していれば、再試行の間隔が過ぎた後の要求で初期化をやり直す。
+        
+        Args:
+            need_model: Trueの場合はモデルのロードまで、FalseではDB接続まで待つ
+        """
+        if self.status == "failed":
+            self.start_initialization()
+        
+        event = self._model_ready if need_model else self._database_ready
+        if not event.is_set():
+            self.start_initialization()
+            waiter = asyncio.Event()
+            with self._state_lock:
+                registered = not event.is_set()
+                if registered:
+                    self._waiters.append((event, asyncio.get_running_loop(), waiter))
+            if registered:
+                await waiter.wait()
+        
+        ready = self.vector_service is not None and (
+            not need_model or self.vector_service.is_warmed_up
+        )
+        if not ready:
+            raise RuntimeError(f"サーバーの初期化に失敗しました: {self.init_error}")
+    
+    def _embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """バッチャーから推論スレッドで呼ばれる埋め込み関数"""
+        EMBEDDING_BATCH_SIZE.observe(len(queries))
+        return self.vector_service.embed_queries(queries)
+    
+    def _register_metrics(self):
+        """取得時に値を計算するメトリクス（キュー長・キャッシュ統計など）を登録する"""
+        def query_cache_stat(key: str) -> Callable[[], float]:
+            def value() -> float:
+                if self.vector_service is None:
+                    return 0
+                return self.vector_service.model_manager._embedding_cache.stats()[key]
+            return value
+        
+        REGISTRY.gauge_function(
+            "embedding_batch_queue_depth",
+            "Queries waiting to be added to an embedding batch",
+            lambda: self.batcher.queue_depth
+        )
+        REGISTRY.counter_function(
+            "embedding_batches_total",
+            "Embedding batches run by the query batcher",
+            lambda: self.batcher.batches
+        )
+        REGISTRY.counter_function(
+            "embedding_batched_queries_total",
+            "Queries embedded through the query batcher",
+            lambda: self.batcher.queries
+        )
+        REGISTRY.gauge_function(
+            "embedding_query_cache_entries",
+            "Entries in the in-memory query embedding cache",
+            query_cache_stat("entries")
+        )
+        REGISTRY.gauge_function(
+            "embedding_query_cache_bytes",
+            "Approximate size of the in-memory query embedding cache",
+            query_cache_stat("bytes")
+        )
+        REGISTRY.counter_function(
+            "embedding_query_cache_evictions_total",
+            "Entries evicted from the in-memory query embedding cache",
+            query_cache_stat("evictions")
+        )
+        REGISTRY.gauge_function(
+            "search_server_ready",
+            "Whether the server has finished initialization (1) or not (0)",
+            lambda: 1 if self.health()["ready"] else 0
+        )
+        REGISTRY.gauge_function(
+            "search_server_uptime_seconds",
+            "Seconds since the server started",
+            lambda: time.time() - self.started_at
+        )
+    
+    def stats(self) -> Dict[str, Any]:
+        """メトリクスの現在値（ヒストグラムは件数・平均・推定分位点）"""
+        return {"status": self.status, "metrics": REGISTRY.snapshot()}
+    
+    def health(self) -> Dict[str, Any]:
+        """初期化状態を取得する（初期化に失敗していれば、間隔を空けて再試行する）"""
+        if self.status == "failed":
+            self.start_initialization()
+        return {
+            "status": self.status,
+            "ready": self._model_ready.is_set() and self.init_error is None,
+            "database_ready": self._database_ready.is_set() and self.vector_service is not None,
+            "uptime": time.time() - self.started_at,
+            "stage_seconds": dict(self.stage_seconds),
+            "prepopulated_queries": self.prepopulated,
+            "error": self.init_error
+        }
+    
+    def _register_routes(self):
+        """HTTPエンドポイントを登録する（streamable-httpトランスポートのみ）"""
+        
+        @self.app.custom_route("/health", methods=["GET"])
+        async def health_check(request: Request) -> JSONResponse:
+            info = self.health()
+            return JSONResponse(info, status_code=200 if info["ready"] else 503)
+        
+        @self.app.custom_route("/metrics", methods=["GET"])
+        async def metrics(request: Request) -> PlainTextResponse:
+            return PlainTextResponse(
+                REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+            )
     
     def _register_tools(self):
         """MCPツールを登録する"""
         
-        @self.app.tool(description="sqlite-vecによるベクトル検索を行い、結果を返します。")
-        async def search(query: str, top_k: int = 5, ctx: Context = None) -> str:
+        @self.app.tool(
+            description=(
+                "sqlite-vecによるベクトル検索を行い、結果を返します。"
+                "modeにhybridを指定すると全文検索と統合し、lexicalでは全文検索のみを行います。"
+                "source / site / section / file_name / url_prefixで検索対象を絞り込めます。"
+                "collapse_byにfileまたはurlを指定すると文書ごとに最良のチャンクだけを返します。"
+            )
+        )
+        async def search(
+            query: str,
+            top_k: int = 5,
+            mode: Optional[str] = None,
+            source: Optional[str] = None,
+            site: Optional[str] = None,
+            section: Optional[str] = None,
+            file_name: Optional[str] = None,
+            url_prefix: Optional[str] = None,
+            collapse_by: Optional[str] = None,
+            ctx: Context = None
+        ) -> str:
             """
             ベクトル検索を実行します。
             
             Args:
                 query: 検索クエリ
                 top_k: 返す件数（デフォルト: 5）
+                mode: 検索モード（vector / hybrid / lexical、省略時はサーバー設定）
+                source: データソース（local / ftp）で絞り込む
+                site: サイト（ホスト名）で絞り込む
+                section: サイト内のセクション（先頭のパス階層）で絞り込む
+                file_name: ファイル名で絞り込む
+                url_prefix: URLの前方一致で絞り込む
+                collapse_by: 文書ごとにまとめる単位（file / url）
                 ctx: コンテキスト（自動注入）
             
             Returns:
@@ -68,9 +393,21 @@ class SearchServer:
             if ctx:
                 await ctx.info(f"検索クエリ: {query}, 件数: {top_k}")
             
+            filters = {
+                "source": source,
+                "site": site,
+                "section": section,
+                "file_name": file_name,
+                "url_prefix": url_prefix
+            }
+            
+            start = time.perf_counter()
+            REQUESTS_IN_FLIGHT.inc()
             try:
-                # ベクトル検索を実行
-                results = self.vector_service.search(query, top_k)
+                await self._wait_ready(need_model=False)
+                mode = self.vector_service.resolve_mode(mode)
+                results = await self._search_one(query, top_k, mode, filters, collapse_by)
+                REQUEST_SECONDS.labels(tool="search", mode=mode).observe(time.perf_counter() - start)
                 
                 if ctx:
                     await ctx.info(f"検索完了: {len(results)}件の結果")
@@ -80,8 +417,111 @@ class SearchServer:
                     ensure_ascii=False, 
                     indent=2
                 )
+            
+            except Exception as e:
+                REQUEST_ERRORS.labels(tool="search").inc()
+                error_msg = f"検索エラー: {str(e)}"
+                if ctx:
+                    await ctx.error(error_msg)
+                return json.dumps(
+                    {"error": error_msg, "results": []}, 
+                    ensure_ascii=False
+                )
+            finally:
+                REQUESTS_IN_FLIGHT.dec()
+        
+        @self.app.tool(
+            description=(
+                "複数のクエリをまとめて検索し、クエリごとの結果を1つの応答で返します。"
+                "埋め込みはまとめて生成され、DB検索は並列に実行されます。"
+                "引数はqueries以外searchと同じです。"
+            )
+        )
+        async def search_batch(
+            queries: List[str],
+            top_k: int = 5,
+            mode: Optional[str] = None,
+            source: Optional[str] = None,
+            site: Optional[str] = None,
+            section: Optional[str] = None,
+            file_name: Optional[str] = None,
+            url_prefix: Optional[str] = None,
+            collapse_by: Optional[str] = None,
+            ctx: Context = None
+        ) -> str:
+            """
+            複数クエリのベクトル検索を実行します。
+            
+            Args:
+                queries: 検索クエリのリスト（最大MAX_BATCH_QUERIES件）
+                top_k: クエリごとに返す件数（デフォルト: 5）
+                その他: searchと同じ
+                ctx: コンテキスト（自動注入）
+            
+            Returns:
+                クエリごとの検索結果のJSON文字列
+            """
+            if ctx:
+                await ctx.info(f"バッチ検索: {len(queries)}件のクエリ, 件数: {top_k}")
+            
+            filters = {
+                "source": source,
+                "site": site,
+                "section": section,
+                "file_name": file_name,
+                "url_prefix": url_prefix
+            }
+            
+            start = time.perf_counter()
+            REQUESTS_IN_FLIGHT.inc()
+            try:
+                if len(queries) > MAX_BATCH_QUERIES:
+                    raise ValueError(f"クエリ数が上限（{MAX_BATCH_QUERIES}件）を超えています")
+                
+                await self._wait_ready(need_model=False)
+                mode = self.vector_service.resolve_mode(mode)
+                if mode == "lexical":
+                    # 全文検索のみの場合は埋め込みを生成しない
+                    result_sets = await asyncio.gather(*[
+                        self._search_one(query, top_k, mode, filters, collapse_by)
+                        for query in queries
+                    ])
+                else:
+                    if self.query_log:
+                        for query in queries:
+                            self.query_log.append(query, mode, top_k, filters, collapse_by)
+                    await self._wait_ready(need_model=True)
+                    # 全クエリの埋め込みを推論スレッドで1回の順伝播で生成する
+                    # （推論スレッドはDB検索を待たず、次のバッチの処理に戻る）
+                    with QUERY_EMBEDDING_SECONDS.time():
+                        embeddings = await asyncio.get_running_loop().run_in_executor(
+                            self.embedding_executor, self._embed_queries, queries
+                        )
+                    # DB検索は検索用スレッドで並列に実行する
+                    result_sets = await asyncio.gather(*[
+                        self._search_by_embedding(query, embedding, top_k, mode, filters, collapse_by)
+                        for query, embedding in zip(queries, embeddings)
+                    ])
+                REQUEST_SECONDS.labels(tool="search_batch", mode=mode).observe(
+                    time.perf_counter() - start
+                )
                 
+                if ctx:
+                    await ctx.info(f"バッチ検索完了: {len(result_sets)}件のクエリ")
+                
+                return json.dumps(
+                    {
+                        "results": [
+                            {"query": query, "results": results}
+                            for query, results in zip(queries, result_sets)
+                        ]
+                    },
+                    ensure_ascii=False,
+                    indent=2
+                )
+            
             except Exception as e:
+                REQUEST_ERRORS.labels(tool="search_batch").inc()
                 error_msg = f"検索エラー: {str(e)}"
                 if ctx:
                     await ctx.error(error_msg)
@@ -89,9 +529,104 @@ class SearchServer:
                     {"error": error_msg, "results": []}, 
                     ensure_ascii=False
                 )
+            finally:
+                REQUESTS_IN_FLIGHT.dec()
+        
+        @self.app.tool(
+            description=(
+                "サーバーの初期化状態（DB接続・モデルロード・キャッシュ投入）を返します。"
+                "readyがtrueになるまでの検索要求は初期化の完了を待ってから処理されます。"
+            )
+        )
+        async def health() -> str:
+            """
+            サーバーの初期化状態を返します。
+            
+            Returns:
+                初期化状態のJSON文字列
+            """
+            return json.dumps(self.health(), ensure_ascii=False, indent=2)
+        
+        @self.app.tool(
+            description=(
+                "検索の処理段階（トークン化・順伝播・KNN・全文検索・統合・整形）ごとのレイテンシ、"
+                "埋め込みキャッシュのヒット・ミス、バッチ待ちのキュー長、処理中の要求数を返します。"
+            )
+        )
+        async def stats() -> str:
+            """
+            サーバーのメトリクスを返します。
+            
+            Returns:
+                メトリクスのJSON文字列（ヒストグラムは件数・平均・推定分位点、単位は秒）
+            """
+            return json.dumps(self.stats(), ensure_ascii=False, indent=2)
+    
+    async def _search_one(
+        self,
+        query: str,
+        top_k: int,
+        mode: str,
+        filters: Dict[str, Optional[str]],
+        collapse_by: Optional[str]
+    ) -> List[Dict[str, Any]]:
+        """1クエリを検索する（埋め込みはバッチャー経由、DB検索は検索用スレッドで実行）"""
+        loop = asyncio.get_running_loop()
+        if self.query_log:
+            self.query_log.append(query, mode, top_k, filters, collapse_by)
+        
+        # ウォームアップ中に到着した要求は初期化の完了を待つ
+        await self._wait_ready(need_model=mode != "lexical")
+        
+        if mode == "lexical":
+            # 全文検索のみの場合は埋め込みを生成しない
+            return await loop.run_in_executor(
+                self.search_executor,
+                functools.partial(
+                    self.vector_service.search,
+                    query,
+                    top_k,
+                    mode=mode,
+                    filters=filters,
+                    collapse_by=collapse_by
+                )
+            )
+        
+        # 同時に到着したクエリとまとめて埋め込みを生成
+        with QUERY_EMBEDDING_SECONDS.time():
+            query_embedding = await self.batcher.embed(query)
+        
+        return await self._search_by_embedding(
+            query, query_embedding, top_k, mode, filters, collapse_by
+        )
+    
+    async def _search_by_embedding(
+        self,
+        query: str,
+        query_embedding: List[float],
+        top_k: int,
+        mode: str,
+        filters: Dict[str, Optional[str]],
+        collapse_by: Optional[str]
+    ) -> List[Dict[str, Any]]:
+        """ベクトル検索（hybridでは全文検索との統合）を検索用スレッドで実行する"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.search_executor,
+            functools.partial(
+                self.vector_service.search_by_embedding,
+                query_embedding,
+                top_k,
+                query=query,
+                mode=mode,
+                filters=filters,
+                collapse_by=collapse_by
+            )
+        )
     
     def run(self, transport: str = "stdio"):
-        """サーバーを実行する"""
+        """サーバーを実行する（初期化はバックグラウンドで並行して行う）"""
+        self.start_initialization()
         if transport == "streamable-http":
             self.app.run(transport="streamable-http")
         else:
@@ -108,10 +643,26 @@ class SearchServer:
 )
 @click.option("--host", default="0.0.0.0", help="Host to bind to")
 @click.option("--stateless", is_flag=True, help="Run in stateless mode")
-def main(port: int, transport: str, host: str, stateless: bool) -> int:
+@click.option("--batch-window-ms", default=10.0, help="Window for coalescing concurrent queries (ms)")
+@click.option("--max-batch-size", default=16, help="Maximum number of queries per embedding batch")
+@click.option("--query-log", default=None, help="JSON Lines file to record queries and prepopulate the cache from")
+@click.option("--prepopulate-queries", default=1000, help="Number of frequent logged queries to embed at startup")
+def main(
+    port: int,
+    transport: str,
+    host: str,
+    stateless: bool,
+    batch_window_ms: float,
+    max_batch_size: int,
+    query_log: Optional[str],
+    prepopulate_queries: int
+) -> int:
     """メイン関数"""
     try:
-        server = SearchServer(host, port, stateless)
+        server = SearchServer(
+            host, port, stateless, batch_window_ms, max_batch_size,
+            query_log, prepopulate_queries
+        )
         server.run(transport)
         return 0
     except KeyboardInterrupt:
@@ -8,6 +8,9 @@ PID_FILE="search_server.pid"
 DEFAULT_TRANSPORT="streamable-http"
 DEFAULT_PORT="8080"
 DEFAULT_HOST="0.0.0.0"
+DEFAULT_BATCH_WINDOW_MS="10"
+DEFAULT_MAX_BATCH_SIZE="16"
+DEFAULT_PREPOPULATE_QUERIES="1000"
 
 # 設定ファイルから読み込み（存在する場合）
 CONFIG_FILE=".server_config"
@@ -20,6 +23,10 @@ TRANSPORT=${TRANSPORT:-$DEFAULT_TRANSPORT}
 PORT=${PORT:-$DEFAULT_PORT}
 HOST=${HOST:-$DEFAULT_HOST}
 STATELESS=${STATELESS:-false}
+BATCH_WINDOW_MS=${BATCH_WINDOW_MS:-$DEFAULT_BATCH_WINDOW_MS}
+MAX_BATCH_SIZE=${MAX_BATCH_SIZE:-$DEFAULT_MAX_BATCH_SIZE}
+QUERY_LOG_PATH=${QUERY_LOG_PATH:-}
+PREPOPULATE_QUERIES=${PREPOPULATE_QUERIES:-$DEFAULT_PREPOPULATE_QUERIES}
 
 start_server() {
     if [ -f "$PID_FILE" ]; then
@@ -34,7 +41,10 @@ start_server() {
     fi
     
     # コマンドライン引数を構築
-    CMD_ARGS="--transport $TRANSPORT"
+    CMD_ARGS="--transport $TRANSPORT --batch-window-ms $BATCH_WINDOW_MS --max-batch-size $MAX_BATCH_SIZE"
+    if [ -n "$QUERY_LOG_PATH" ]; then
+        CMD_ARGS="$CMD_ARGS --query-log $QUERY_LOG_PATH --prepopulate-queries $PREPOPULATE_QUERIES"
+    fi
     
     if [ "$TRANSPORT" = "streamable-http" ]; then
         CMD_ARGS="$CMD_ARGS --port $PORT --host $HOST"
@@ -81,6 +91,9 @@ status_server() {
         echo "設定: Transport=$TRANSPORT, Port=$PORT, Host=$HOST, Stateless=$STATELESS"
         if [ "$TRANSPORT" = "streamable-http" ]; then
             echo "URL: http://$HOST:$PORT"
+            # 初期化状態（準備完了前は503を返す）
+            HEALTH_HOST=$([ "$HOST" = "0.0.0.0" ] && echo "127.0.0.1" || echo "$HOST")
+            echo "ヘルス: $(curl -s "http://$HEALTH_HOST:$PORT/health" || echo "取得できません")"
         fi
     else
         echo "PIDファイルは存在しますが、プロセス (PID: $PID) は実行されていません。"
@@ -94,12 +107,17 @@ show_config() {
     echo "  Port: $PORT"
     echo "  Host: $HOST"
     echo "  Stateless: $STATELESS"
+    echo "  Batch window: ${BATCH_WINDOW_MS}ms"
+    echo "  Max batch size: $MAX_BATCH_SIZE"
+    echo "  Query log: ${QUERY_LOG_PATH:-(無効)}"
+    echo "  Prepopulate queries: $PREPOPULATE_QUERIES"
     echo ""
     echo "設定を変更するには、環境変数を設定するか、.server_configファイルを作成してください。"
     echo "例:"
     echo "  export TRANSPORT=stdio"
     echo "  export PORT=9000"
     echo "  export STATELESS=true"
+    echo "  export BATCH_WINDOW_MS=5"
 }
 
 case "$1" in
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+FTPデータソースの動作確認プログラム
+
+ローカルのディレクトリをpyftpdlibのFTPサーバーで公開し、FTPDataSourceの走査・
+読み込み結果が同じディレクトリに対するLocalDataSourceの結果と一致することを確認します。
+MLSDに対応したサーバーと、MLSDを無効にした（LISTで走査する）サーバーの両方で、
+以下を確認します。
+
+- 走査: Markdownファイルのパスの一覧（MLSDではサイズ・更新日時も）
+- 読み込み: read_filesが指定した順に、ローカルと同じ内容を返すこと
+- 接続の再利用: ログイン回数が接続数を超えないこと
+- 存在しないファイル: エラーとして返し、接続を捨てずに再利用すること
+- 一時エラー（421）・サーバー側での切断: 新しい接続で再試行して読み込めること
+
+使用方法:
+    uv run --with pyftpdlib test_ftp.py                  # sample_docs/convertedで確認
+    uv run --with pyftpdlib test_ftp.py --data-dir ./data --connections 8
+    uv run --with pyftpdlib test_ftp.py --delay-ms 20     # 1コマンドごとの遅延（RTTの模擬）
+"""
+
+import os
+import sys
+import time
+import shutil
+import logging
+import tempfile
+import threading
+from typing import Dict
+
+import click
+
+from lib.data_processing import FTPDataSource, LocalDataSource
+
+try:
+    from pyftpdlib.authorizers import DummyAuthorizer
+    from pyftpdlib.handlers import FTPHandler
+    from pyftpdlib.servers import ThreadedFTPServer
+    from pyftpdlib.ioloop import IOLoop
+    from pyftpdlib.log import config_logging
+except ImportError:
+    print("❌ pyftpdlibがインストールされていません（uv run --with pyftpdlib test_ftp.py で実行してください）")
+    sys.exit(1)
+
+
+# 一時エラー・切断を起こすファイル（テスト用に作成する）
+FLAKY_FILE = "flaky.md"
+DROPPED_FILE = "dropped.md"
+
+
+class RecordingHandler(FTPHandler):
+    """ログイン回数・コマンド回数を記録し、一部のファイルで一時エラーや切断を起こすハンドラ"""
+    
+    logins = 0
+    commands: Dict[str, int] = {}
+    faults: Dict[str, int] = {}  # ファイル名ごとの残りの失敗回数
+    delay = 0.0
+    lock = threading.Lock()
+    
+    def on_login(self, username):
+        with self.lock:
+            type(self).logins += 1
+    
+    def pre_process_command(self, line, cmd, arg):
+        with self.lock:
+            self.commands[cmd] = self.commands.get(cmd, 0) + 1
+            name = os.path.basename(arg or "")
+            fault = cmd == "RETR" and self.faults.get(name, 0) > 0
+            if fault:
+                self.faults[name] -= 1
+        if self.delay:
+            time.sleep(self.delay)
+        
+        if fault and name == FLAKY_FILE:
+            self.respond("421 Service not available, closing control connection.")
+            self.close_when_done()
+            return
+        if fault and name == DROPPED_FILE:
+            self.close()
+            return
+        super().pre_process_command(line, cmd, arg)
+    
+    @classmethod
+    def reset(cls):
+        cls.logins = 0
+        cls.commands = {}
+        cls.faults = {FLAKY_FILE: 1, DROPPED_FILE: 1}
+
+
+class ListOnlyHandler(RecordingHandler):
+    """MLSDに対応していないサーバーを模擬するハンドラ"""
+    
+    proto_cmds = {name: spec for name, spec in FTPHandler.proto_cmds.items() if name != "MLSD"}
+
+
+def prepare_tree(data_dir: str, root: str) -> str:
+    """公開するディレクトリを作成する（深い階層・空の階層・Markdown以外のファイルを追加）"""
+    tree = os.path.join(root, "data")
+    shutil.copytree(data_dir, tree)
+    os.makedirs(os.path.join(tree, "empty"), exist_ok=True)
+    nested = os.path.join(tree, "nested", "level2", "level3")
+    os.makedirs(nested, exist_ok=True)
+    body = "---\nurl: https://example.com/nested/page\n---\n# 見出し\n本文テキスト。\n"
+    for name in ("page.md", "日本語のファイル名.md", FLAKY_FILE, DROPPED_FILE):
+        with open(os.path.join(nested, name), "w", encoding="utf-8") as f:
+            f.write(body * 20)
+    with open(os.path.join(nested, "notes.txt"), "w", encoding="utf-8") as f:
+        f.write("Markdown以外のファイルは対象外")
+    return tree
+
+
+class CheckRunner:
+    """確認結果を表示・集計する"""
+    
+    def __init__(self):
+        self.failures = 0
+    
+    def check(self, name: str, passed: bool, detail: str = ""):
+        if not passed:
+            self.failures += 1
+        mark = "✅" if passed else "❌"
+        print(f"   {mark} {name}" + (f": {detail}" if detail else ""))
+
+
+def run_checks(
+    runner: CheckRunner,
+    handler: type,
+    tree: str,
+    root: str,
+    connections: int,
+    mirror_dir: str
+):
+    """1種類のFTPサーバーに対して確認を行う"""
+    handler.reset()
+    # サーバーごとに別のIOLoopを使う（既定の共有IOLoopでは前のサーバーのスレッドと競合する）
+    server = ThreadedFTPServer(("127.0.0.1", 0), handler, ioloop=IOLoop())
+    server_thread = threading.Thread(target=server.serve_forever, name="ftp-server", daemon=True)
+    server_thread.start()
+    port = server.address[1]
+    
+    local = LocalDataSource(tree)
+    local_files = {
+        os.path.relpath(file_info["path"], tree).replace(os.sep, "/"): file_info
+        for file_info in local.list_files()
+    }
+    
+    def to_remote(relative: str) -> str:
+        return "/data/" + relative
+    
+    source = FTPDataSource("127.0.0.1", port=port, connections=connections, timeout=10)
+    try:
+        # 走査
+        start = time.perf_counter()
+        remote_files = {
+            file_info["path"][len("/data/"):]: file_info for file_info in source.list_files("/data")
+        }
+        list_seconds = time.perf_counter() - start
+        runner.check(
+            "走査結果のパスがローカルと一致",
+            sorted(remote_files) == sorted(local_files),
+            f"{len(remote_files)}件, {list_seconds:.2f}秒"
+        )
+        runner.check(
+            "list_md_filesがlist_filesのパスと一致",
+            sorted(source.list_md_files("/data")) == sorted(to_remote(path) for path in local_files)
+        )
+        if handler is ListOnlyHandler:
+            runner.check(
+                "MLSD未対応のためLISTで走査",
+                not source._use_mlsd and handler.commands.get("LIST", 0) > 0
+            )
+        else:
+            mismatched = [
+                path for path, file_info in remote_files.items()
+                if path in local_files and (
+                    file_info["size"] != local_files[path]["size"]
+                    or file_info["mtime"] is None
+                    or abs(file_info["mtime"] - local_files[path]["mtime"]) > 1
+                )
+            ]
+            runner.check(
+                "MLSDのサイズ・更新日時がローカルと一致",
+                source._use_mlsd and not mismatched,
+                ", ".join(mismatched[:3])
+            )
+        
+        # 読み込み（指定した順に返ること、内容が一致すること）
+        paths = sorted(local_files, reverse=True)
+        start = time.perf_counter()
+        results = list(source.read_files([to_remote(path) for path in paths]))
+        read_seconds = time.perf_counter() - start
+        runner.check(
+            "read_filesが指定した順に返す",
+            [path for path, _, _ in results] == [to_remote(path) for path in paths]
+        )
+        errors = [(path, error) for path, _, error in results if error is not None]
+        different = [
+            path for path, (_, content, error) in zip(paths, results)
+            if error is None and content != local.read_file(local_files[path]["path"])
+        ]
+        runner.check(
+            "内容がローカルと一致",
+            not errors and not different,
+            f"{len(results)}件, {read_seconds:.2f}秒" + (f", エラー: {errors[:2]}" if errors else "")
+        )
+        # 失敗した2回のRETRは新しい接続で再試行される
+        runner.check(
+            "一時エラー（421）と切断から再試行して読み込める",
+            all(count == 0 for count in handler.faults.values())
+            and handler.commands.get("RETR", 0) == len(paths) + 2,
+            f"RETR {handler.commands.get('RETR', 0)}回"
+        )
+        
+        # 存在しないファイルは接続を捨てずにエラーを返す
+        logins = handler.logins
+        missing = list(source.read_files(["/data/does-not-exist.md"]))
+        runner.check(
+            "存在しないファイルはエラーとして返す",
+            missing[0][1] is None and missing[0][2] is not None,
+            str(missing[0][2])
+        )
+        runner.check("存在しないファイルの後も接続を再利用", handler.logins == logins)
+        # 再試行で捨てた接続の分（2回）を除き、ログインは接続ごとに1回
+        runner.check(
+            "接続を再利用（ログイン回数が接続数+再接続数以下）",
+            handler.logins <= connections + 2,
+            f"ログイン {handler.logins}回, 接続数 {connections}"
+        )
+        
+        # ミラー: 2回目の読み込みではダウンロードしない
+        mirrored = FTPDataSource(
+            "127.0.0.1", port=port, connections=connections, timeout=10, mirror_dir=mirror_dir
+        )
+        try:
+            for _ in range(2):
+                retrieved = handler.commands.get("RETR", 0)
+                mirrored.list_files("/data")
+                contents = {
+                    path: content
+                    for path, content, _ in mirrored.read_files([to_remote(path) for path in paths])
+                }
+            runner.check(
+                "ミラーから読み込み（2回目はダウンロードなし）",
+                handler.commands.get("RETR", 0) == retrieved
+                and contents == {to_remote(path): content for path, (_, content, _) in zip(paths, results)}
+            )
+        finally:
+            mirrored.close()
+    finally:
+        source.close()
+        server.close_all()
+        server_thread.join()
+    
+    shutil.rmtree(mirror_dir, ignore_errors=True)
+
+
+@click.command()
+@click.option("--data-dir", default="sample_docs/converted", show_default=True,
+              help="Directory to serve over FTP")
+@click.option("--connections", default=4, show_default=True, type=int,
+              help="FTP connections used by the data source")
+@click.option("--delay-ms", default=0.0, show_default=True, type=float,
+              help="Delay added to every FTP command (simulated round trip)")
+def main(data_dir: str, connections: int, delay_ms: float):
+    """Check FTPDataSource against a local pyftpdlib server and LocalDataSource."""
+    if not os.path.isdir(data_dir):
+        print(f"❌ ディレクトリが存在しません: {data_dir}")
+        sys.exit(1)
+    config_logging(level=logging.WARNING)
+    RecordingHandler.delay = delay_ms / 1000
+    
+    runner = CheckRunner()
+    with tempfile.TemporaryDirectory(prefix="ftp-check-") as root:
+        tree = prepare_tree(data_dir, root)
+        authorizer = DummyAuthorizer()
+        authorizer.add_anonymous(root)
+        
+        for label, handler in (("MLSD対応サーバー", RecordingHandler), ("MLSD未対応サーバー（LIST）", ListOnlyHandler)):
+            handler.authorizer = authorizer
+            print(f"\n🔌 {label}")
+            run_checks(runner, handler, tree, root, connections, os.path.join(root, "mirror"))
+    
+    if runner.failures:
+        print(f"\n❌ {runner.failures}件の確認に失敗しました")
+        sys.exit(1)
+    print("\n✅ すべての確認に成功しました")
+
+
+if __name__ == "__main__":
+    main()
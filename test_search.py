@@ -38,7 +38,12 @@ def search_and_display(query: str):
     
     for i, result in enumerate(results, 1):
         print(f"\n{i}. {result['file']}")
-        print(f"   距離: {result['distance']:.4f}")
+        if "score" in result:
+            print(f"   スコア: {result['score']:.4f}")
+        elif "bm25" in result:
+            print(f"   BM25: {result['bm25']:.4f}")
+        else:
+            print(f"   距離: {result['distance']:.4f}")
         print(f"   内容: {result['text'][:100]}...")
 
 
@@ -60,7 +65,7 @@ def interactive_mode():
                 continue
             
             search_and_display(query)
-            
+        
         except KeyboardInterrupt:
             print("\n👋 終了")
             break